@@ -1,4 +0,0 @@
-from django.contrib import admin
-from .models import Follower
-
-admin.site.register(Follower)
\ No newline at end of file
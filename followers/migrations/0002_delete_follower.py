@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('followers', '0001_initial'),
+        # Rows are copied into users.Follow first
+        ('users', '0004_copy_legacy_followers'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='Follower',
+        ),
+    ]
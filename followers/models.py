@@ -1,12 +1,3 @@
-from django.db import models
-from django.contrib.auth.models import User
-
-class Follower(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
-    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
-
-    class Meta:
-        unique_together = ('user', 'follower') # Prevent duplicate relationships
-
-    def __str__(self):
-        return f"{self.follower.username} follows {self.user.username}"
\ No newline at end of file
+# The legacy Follower model was folded into users.Follow (users/migrations/0004).
+# This app only remains installed so its migration that drops the old table runs;
+# remove it from INSTALLED_APPS once every database has applied followers.0002.
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        import posts.signals
+        from social_media_api.deployment import require_shared_broker, require_shared_cache
+
+        # Version bumps, rate-limit counters and stream events must reach every worker
+        require_shared_cache('POST_CACHE_ALIAS')
+        require_shared_cache('THROTTLE_CACHE_ALIAS')
+        require_shared_broker()
@@ -0,0 +1,88 @@
+from asgiref.sync import sync_to_async
+from rest_framework import permissions
+from rest_framework.exceptions import NotFound, ValidationError
+
+from social_media_api.async_views import AsyncAPIView
+from social_media_api.pagination import KeysetPagination
+from .models import Post, Comment, Notification
+from .reposts import aload_originals
+from .serializers import PostSerializer, CommentSerializer, NotificationSerializer
+from .timeline import HybridFeed
+from .views import filter_posts
+
+
+# Async twins of the read-heavy endpoints, served under /api/async/ by an ASGI
+# worker. Lists always use keyset pagination ({next, results}).
+
+
+async def serialize_posts(posts, request, many=True):
+    # PostSerializer reads and fills the fragment cache, which is blocking I/O,
+    # so the whole response is serialized in one trip off the event loop
+    return await sync_to_async(lambda: PostSerializer(posts, many=many, context={'request': request}).data)()
+
+
+# ============ Post Views =============
+
+class AsyncFeedView(AsyncAPIView):
+    # Plus one for the originals of any reposts on the page (posts.reposts.load_originals)
+    query_budget = 7
+
+    async def get(self, request):
+        feed = await HybridFeed.afor_user(request.user)
+        paginator = KeysetPagination()
+        posts = await aload_originals(await paginator.apaginate_queryset(feed, request))
+        return paginator.get_paginated_data(await serialize_posts(posts, request))
+
+
+class AsyncPostListView(AsyncAPIView):
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    # Plus one for the originals of any reposts on the page (posts.reposts.load_originals)
+    query_budget = 4
+
+    async def get(self, request):
+        if request.query_params.get('search') or request.query_params.get('ordering'):
+            raise ValidationError("'search' and 'ordering' are only available on the sync post list.")
+        queryset = filter_posts(Post.objects.select_related('author'), request.query_params)
+        paginator = KeysetPagination()
+        posts = await aload_originals(await paginator.apaginate_queryset(queryset, request))
+        return paginator.get_paginated_data(await serialize_posts(posts, request))
+
+
+class AsyncPostDetailView(AsyncAPIView):
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    # Plus one for the original when the post is a repost
+    query_budget = 3
+
+    async def get(self, request, pk):
+        post = await Post.objects.select_related('author').filter(pk=pk).afirst()
+        if post is None:
+            raise NotFound("Post not found.")
+        await aload_originals([post])
+        return await serialize_posts(post, request, many=False)
+
+
+class AsyncPostCommentsView(AsyncAPIView):
+    query_budget = 2
+
+    async def get(self, request, post_id):
+        comments = Comment.objects.filter(post_id=post_id).select_related('user')
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(comments, request)
+        return paginator.get_paginated_data(CommentSerializer(page, many=True).data)
+
+
+# ============ Notification Views =============
+
+class AsyncNotificationListView(AsyncAPIView):
+    query_budget = 3
+
+    async def get(self, request):
+        notifications = Notification.objects.filter(user=request.user).select_related('sender')
+        if request.query_params.get('unread', '').lower() in ('1', 'true', 'yes'):
+            notifications = notifications.filter(is_read=False)
+
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(notifications, request)
+        names = await NotificationSerializer.aactor_names(page)
+        serializer = NotificationSerializer(page, many=True, context={'actor_names': names})
+        return paginator.get_paginated_data(serializer.data)
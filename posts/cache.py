@@ -0,0 +1,227 @@
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from social_media_api.media import MediaStatus
+from .models import Post
+
+
+# Bump when the shape of PostSerializer output changes so old fragments are ignored
+FRAGMENT_SCHEMA = 3
+
+
+# ============ Local LRU tier =============
+
+class LocalLRU:
+    """Small thread-safe in-process LRU map that sits in front of the shared cache."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ============ Post fragment cache =============
+
+class PostFragmentCache:
+    """Versioned cache of serialized posts: local LRU -> shared Django cache -> render.
+
+    Every post has a version token in the shared tier. Fragments are stored under
+    (post id, version), so bumping the token invalidates the post in every process
+    without having to reach their local tiers. Each lookup costs one multi-get of
+    versions plus, for local misses, one multi-get of fragments.
+
+    That only holds if POST_CACHE_ALIAS is shared by every worker. A per-process
+    cache is refused at startup when there are several (social_media_api.deployment).
+    """
+
+    def __init__(self):
+        self.local = LocalLRU(getattr(settings, 'POST_CACHE_LOCAL_SIZE', 1024))
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def shared(self):
+        return caches[getattr(settings, 'POST_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'POST_CACHE_TIMEOUT', 3600)
+
+    @staticmethod
+    def _version_key(post_id):
+        return f'post:{post_id}:version'
+
+    @staticmethod
+    def _fragment_key(post_id, version):
+        return f'post:{post_id}:s{FRAGMENT_SCHEMA}:{version}'
+
+    @staticmethod
+    def _shared_post_key(post_id):
+        return f'post:{post_id}:shared_post'
+
+    @staticmethod
+    def _collection_key():
+        return 'post:collection:version'
+
+    def version(self, post_id):
+        """The post's current version token; changes whenever its serialized form may have."""
+        return self._versions({post_id})[post_id]
+
+    def versions(self, post_ids):
+        """{post id: version token} for several posts in one round trip."""
+        return self._versions(set(post_ids))
+
+    def shared_post_id(self, post_id):
+        """Id of the post that `post_id` reposts, or None.
+
+        What a post reposts never changes, so the answer is cached without a
+        version. A miss costs one query.
+        """
+        cached = self.shared.get(self._shared_post_key(post_id))
+        if cached is None:
+            row = Post.objects.filter(id=post_id).values_list('shared_post_id', flat=True)
+            if not row:
+                return None
+            cached = row[0] or 0
+            self.shared.set(self._shared_post_key(post_id), cached, self.timeout)
+        return cached or None
+
+    def collection_version(self):
+        """A token that changes whenever any post is created, edited, deleted or recounted."""
+        version = self.shared.get(self._collection_key())
+        if version is None:
+            self.shared.add(self._collection_key(), uuid.uuid4().hex, self.timeout)
+            version = self.shared.get(self._collection_key())
+        return version
+
+    def _versions(self, post_ids):
+        keys = {self._version_key(post_id): post_id for post_id in post_ids}
+        found = self.shared.get_many(keys.keys())
+        versions = {keys[key]: version for key, version in found.items()}
+        missing = {post_id: uuid.uuid4().hex for post_id in post_ids if post_id not in versions}
+        if missing:
+            self.shared.set_many({self._version_key(post_id): version for post_id, version in missing.items()}, self.timeout)
+            versions.update(missing)
+        return versions
+
+    def get_many(self, posts, render):
+        """Serialized fragments for `posts`, in order; `render(posts)` builds the misses."""
+        post_ids = [post.id for post in posts]
+        versions = self._versions(set(post_ids))
+        fragments = {}
+
+        pending = []
+        for post_id in set(post_ids):
+            fragment = self.local.get((post_id, versions[post_id]))
+            if fragment is not None:
+                fragments[post_id] = fragment
+            else:
+                pending.append(post_id)
+        local_hits = len(fragments)
+
+        shared_hits = 0
+        if pending:
+            keys = {self._fragment_key(post_id, versions[post_id]): post_id for post_id in pending}
+            for key, fragment in self.shared.get_many(keys.keys()).items():
+                post_id = keys[key]
+                fragments[post_id] = fragment
+                self.local.set((post_id, versions[post_id]), fragment)
+                shared_hits += 1
+
+        misses = [post for post in posts if post.id not in fragments]
+        if misses:
+            rendered = {}
+            for post, fragment in zip(misses, render(misses)):
+                fragments[post.id] = fragment
+                # Media still being processed may turn ready (and bump the version) before this
+                # render finishes, so such fragments aren't stored
+                if fragment.get('media_status') != MediaStatus.PENDING:
+                    rendered[post.id] = fragment
+                    self.local.set((post.id, versions[post.id]), fragment)
+            self.shared.set_many(
+                {self._fragment_key(post_id, versions[post_id]): fragment for post_id, fragment in rendered.items()},
+                self.timeout,
+            )
+
+        self._record(local_hits, shared_hits, len({post.id for post in misses}))
+        # Hand out copies so callers can't mutate what's cached
+        return [dict(fragments[post_id]) for post_id in post_ids]
+
+    @property
+    def invalidate_batch_size(self):
+        return getattr(settings, 'POST_CACHE_INVALIDATE_BATCH', 1000)
+
+    def invalidate(self, post_ids):
+        """Give `post_ids` fresh versions now and again once the current transaction commits.
+
+        The second bump closes the window where another request re-caches the
+        pre-commit row between the first bump and the commit. Versions are
+        written POST_CACHE_INVALIDATE_BATCH at a time, so invalidating all of a
+        prolific user's posts is never one huge multi-set.
+        """
+        post_ids = list(post_ids)
+        if not post_ids:
+            return
+        self._bump(post_ids)
+        transaction.on_commit(lambda: self._bump(post_ids))
+
+    def _bump(self, post_ids):
+        batch_size = self.invalidate_batch_size
+        for start in range(0, len(post_ids), batch_size):
+            versions = {self._version_key(post_id): uuid.uuid4().hex for post_id in post_ids[start:start + batch_size]}
+            if start + batch_size >= len(post_ids):
+                # The collection token rides along with the last batch
+                versions[self._collection_key()] = uuid.uuid4().hex
+            self.shared.set_many(versions, self.timeout)
+
+    def _record(self, local_hits, shared_hits, misses):
+        with self._stats_lock:
+            self._stats['local_hits'] += local_hits
+            self._stats['shared_hits'] += shared_hits
+            self._stats['misses'] += misses
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['lookups'] = lookups
+        stats['hit_ratio'] = round((lookups - stats['misses']) / lookups, 4) if lookups else None
+        stats['local_entries'] = len(self.local)
+        return stats
+
+
+post_cache = PostFragmentCache()
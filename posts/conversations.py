@@ -0,0 +1,94 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, When
+from django.db.models.functions import Greatest
+
+from social_media_api.pubsub import publish_to_user
+from .models import Conversation, ConversationParticipant, DirectMessage
+
+
+def conversation_pair(user_a_id, user_b_id):
+    return (user_a_id, user_b_id) if user_a_id < user_b_id else (user_b_id, user_a_id)
+
+
+def get_or_create_conversation(user_a, user_b):
+    user_low_id, user_high_id = conversation_pair(user_a.id, user_b.id)
+    conversation = Conversation.objects.filter(user_low_id=user_low_id, user_high_id=user_high_id).first()
+    if conversation is not None:
+        return conversation
+    try:
+        with transaction.atomic():
+            conversation = Conversation.objects.create(user_low_id=user_low_id, user_high_id=user_high_id)
+            ConversationParticipant.objects.bulk_create([
+                ConversationParticipant(conversation=conversation, user_id=user_low_id),
+                ConversationParticipant(conversation=conversation, user_id=user_high_id),
+            ])
+    except IntegrityError:
+        # Both users opened the thread at the same moment; use the one that won
+        conversation = Conversation.objects.get(user_low_id=user_low_id, user_high_id=user_high_id)
+    return conversation
+
+
+def send_direct_message(sender, recipient, content):
+    """Store a message in the pair's conversation and move both participants' rows forward."""
+    with transaction.atomic():
+        conversation = get_or_create_conversation(sender, recipient)
+        message = DirectMessage.objects.create(
+            sender=sender, recipient=recipient, conversation=conversation, content=content
+        )
+        Conversation.objects.filter(id=conversation.id).update(
+            last_message=message, last_message_at=message.timestamp
+        )
+        ConversationParticipant.objects.filter(conversation=conversation).update(
+            last_message_at=message.timestamp,
+            unread_count=Case(
+                When(user=recipient, then=F('unread_count') + 1),
+                default=F('unread_count'),
+                output_field=PositiveIntegerField(),
+            ),
+        )
+        transaction.on_commit(lambda: publish_to_user(recipient.id, {
+            'type': 'direct_message',
+            'id': message.id,
+            'conversation': conversation.id,
+            'sender': sender.username,
+            'content': message.content,
+            'timestamp': message.timestamp.isoformat(),
+        }))
+    return message
+
+
+def mark_conversation_read(participant):
+    if not participant.unread_count:
+        return
+    with transaction.atomic():
+        DirectMessage.objects.filter(
+            conversation_id=participant.conversation_id, recipient_id=participant.user_id, is_read=False
+        ).update(is_read=True)
+        ConversationParticipant.objects.filter(id=participant.id).update(unread_count=0)
+    participant.unread_count = 0
+
+
+def message_read(message):
+    # A single message was opened outside its thread (MessageDetailView)
+    if message.conversation_id is not None:
+        ConversationParticipant.objects.filter(
+            conversation_id=message.conversation_id, user_id=message.recipient_id
+        ).update(unread_count=Greatest(F('unread_count') - 1, 0))
+
+
+def delete_direct_message(message):
+    """Delete `message`, keeping the unread counter and last-message pointer right."""
+    with transaction.atomic():
+        message.delete()
+        if message.conversation_id is None:
+            return
+        if not message.is_read:
+            message_read(message)
+        conversation = Conversation.objects.select_for_update().get(id=message.conversation_id)
+        if conversation.last_message_id is None:
+            # SET_NULL cleared the pointer: fall back to the newest message left
+            latest = conversation.messages.order_by('-timestamp', '-id').first()
+            conversation.last_message = latest
+            conversation.last_message_at = latest.timestamp if latest else None
+            conversation.save(update_fields=['last_message', 'last_message_at'])
+            conversation.participants.update(last_message_at=conversation.last_message_at)
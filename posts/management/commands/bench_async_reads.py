@@ -0,0 +1,113 @@
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Post
+from posts.timeline import rebuild_timeline
+from users.models import Follow
+from users.tokens import ClaimsRefreshToken
+
+
+# name -> (sync path, async path); {username} and {post} are filled in from the seeded data
+ENDPOINTS = {
+    'feed': ('/api/posts/feed/?cursor=', '/api/async/posts/feed/'),
+    'posts': ('/?cursor=', '/api/async/posts/'),
+    'detail': ('/api/posts/{post}/', '/api/async/posts/{post}/'),
+    'comments': ('/api/posts/{post}/comments/?cursor=', '/api/async/posts/{post}/comments/'),
+    'followers': ('/api/users/followers/{username}/?cursor=', '/api/async/users/followers/{username}/'),
+    'notifications': ('/api/posts/notifications/?cursor=', '/api/async/notifications/'),
+}
+
+
+class Command(BaseCommand):
+    help = ("Load a running server's sync and async read endpoints with concurrent clients and compare "
+            "throughput and p99 latency. Seeds a reader with followed authors on first use.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help="Server for the async endpoints.")
+        parser.add_argument('--sync-base-url', help="Server for the sync endpoints (default: --base-url), "
+                                                    "e.g. a gunicorn sync worker on another port.")
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help="Comma separated subset of: " + ', '.join(ENDPOINTS))
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--duration', type=float, default=10, help="Seconds per endpoint and mode.")
+        parser.add_argument('--username', default='bench_reader')
+        parser.add_argument('--authors', type=int, default=100, help="Authors the seeded reader follows.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        reader, post = self.seed(options['username'], options['authors'])
+        self.headers = {'Authorization': f'Bearer {ClaimsRefreshToken.for_user(reader).access_token}'}
+
+        self.stdout.write(f"{'endpoint':>14} {'mode':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for name in options['endpoints'].split(','):
+            sync_path, async_path = ENDPOINTS[name]
+            for mode, base, path in (('sync', options['sync_base_url'] or options['base_url'], sync_path),
+                                     ('async', options['base_url'], async_path)):
+                path = path.format(username=reader.username, post=post.id)
+                self.report(name, mode, *self.load(base, path))
+
+    def seed(self, username, authors):
+        reader, created = User.objects.get_or_create(username=username)
+        if created:
+            accounts = User.objects.bulk_create([User(username=f'{username}_author{i}') for i in range(authors)])
+            Follow.objects.bulk_create([Follow(follower=reader, following=author) for author in accounts])
+            Follow.objects.bulk_create([Follow(follower=author, following=reader) for author in accounts])
+            Post.objects.bulk_create([
+                Post(author=author, content=f'bench post {i} by {author.username}') for author in accounts for i in range(10)
+            ])
+            first = Post.objects.filter(author__in=accounts).first()
+            Comment.objects.bulk_create([Comment(user=author, post=first, content='bench') for author in accounts])
+            rebuild_timeline(reader)
+        post = Post.objects.filter(author__username__startswith=f'{username}_author').order_by('id').first()
+        return reader, post
+
+    def load(self, base, path):
+        url = urlsplit(base)
+        deadline = time.monotonic() + self.options['duration']
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def client():
+            connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            mine, failed = [], 0
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    connection.request('GET', path, headers=self.headers)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        failed += 1
+                        continue
+                except (OSError, http.client.HTTPException):
+                    failed += 1
+                    connection.close()
+                    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+                    continue
+                mine.append((time.perf_counter() - start) * 1000)
+            connection.close()
+            with lock:
+                latencies.extend(mine)
+                errors.append(failed)
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=client) for _ in range(self.options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, sum(errors), time.monotonic() - started
+
+    def report(self, name, mode, latencies, errors, elapsed):
+        if not latencies:
+            self.stdout.write(f"{name:>14} {mode:>6} {'-':>8} {'-':>8} {'-':>8} {errors:>7}")
+            return
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(f"{name:>14} {mode:>6} {len(latencies) / elapsed:>8.1f} "
+                          f"{statistics.median(latencies):>8.1f} {p99:>8.1f} {errors:>7}")
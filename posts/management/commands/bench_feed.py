@@ -0,0 +1,108 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts.models import Post, TimelineEntry
+from posts.timeline import HybridFeed, rebuild_timeline
+from users.models import Follow
+
+
+# (following count, share of followed accounts that are celebrities)
+SCENARIOS = [
+    (10, 0.0),
+    (100, 0.0),
+    (100, 0.2),
+    (1000, 0.0),
+    (1000, 0.05),
+    (1000, 0.5),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark feed latency (pull, push and hybrid) over synthetic follow distributions. Nothing is persisted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts-per-author', type=int, default=20)
+        parser.add_argument('--celebrity-followers', type=int, default=50,
+                            help="Synthetic followers given to each celebrity author.")
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeats', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stdout.write(f"{'following':>9} {'celebs':>6} {'pull ms':>9} {'push ms':>9} {'hybrid ms':>10}   (median / p95)")
+        try:
+            with transaction.atomic():
+                self.run()
+                raise Rollback()
+        except Rollback:
+            pass
+        cache.clear()
+
+    def run(self):
+        opts = self.options
+        max_following = max(following for following, _ in SCENARIOS)
+        authors = self.make_users('bench_author', max_following)
+        fans = self.make_users('bench_fan', opts['celebrity_followers'])
+
+        posts = [Post(author=author, content=f"post {i} by {author.username}")
+                 for author in authors for i in range(opts['posts_per_author'])]
+        Post.objects.bulk_create(posts, batch_size=2000)
+
+        for index, (following, celebrity_share) in enumerate(SCENARIOS):
+            followed = authors[:following]
+            celebrities = followed[:int(following * celebrity_share)]
+
+            pull_reader, push_reader, hybrid_reader = self.make_users(f'bench_reader{index}_', 3)
+            Follow.objects.bulk_create(
+                [Follow(follower=reader, following=author)
+                 for reader in (pull_reader, push_reader, hybrid_reader) for author in followed],
+                ignore_conflicts=True,
+            )
+            # Celebrities are only "celebrities" because of their follower counts
+            Follow.objects.bulk_create(
+                [Follow(follower=fan, following=author) for fan in fans for author in celebrities],
+                ignore_conflicts=True,
+            )
+            cache.clear()
+
+            with override_settings(FEED_CELEBRITY_FOLLOWER_THRESHOLD=10 ** 9):
+                rebuild_timeline(push_reader)
+            with override_settings(FEED_CELEBRITY_FOLLOWER_THRESHOLD=opts['celebrity_followers'] - 1):
+                rebuild_timeline(hybrid_reader)
+                hybrid = self.measure(lambda: HybridFeed(hybrid_reader)[:opts['page_size']])
+
+            pull = self.measure(lambda: self.pull_page(pull_reader))
+            push = self.measure(lambda: [entry.post for entry in TimelineEntry.objects.filter(user=push_reader)
+                                         .select_related('post__author').order_by('-timestamp', '-post_id')[:opts['page_size']]])
+
+            self.stdout.write(f"{following:>9} {len(celebrities):>6} {pull:>9} {push:>9} {hybrid:>10}")
+
+    def make_users(self, prefix, count):
+        User.objects.bulk_create([User(username=f'{prefix}{i}') for i in range(count)], batch_size=2000)
+        return list(User.objects.filter(username__startswith=prefix).order_by('id'))
+
+    def pull_page(self, reader):
+        following = Follow.objects.filter(follower=reader).values_list('following', flat=True)
+        posts = Post.objects.filter(author__in=following).select_related('author').order_by('-timestamp')
+        posts.count()
+        return list(posts[:self.options['page_size']])
+
+    def measure(self, fn):
+        timings = []
+        for _ in range(self.options['repeats']):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        return f"{statistics.median(timings):.1f}/{p95:.1f}"
@@ -0,0 +1,109 @@
+import io
+import shutil
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from posts.models import Post
+from posts.views import PostCreateView
+from social_media_api.media import media_processor
+
+
+class Command(BaseCommand):
+    help = ("Upload synthetic camera photos through PostCreateView without the media pipeline, with renditions "
+            "rendered inline and with the background process pool; report upload latency and bytes per image served.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=20, help="Uploads per mode.")
+        parser.add_argument('--width', type=int, default=4032)
+        parser.add_argument('--height', type=int, default=3024)
+        parser.add_argument('--workers', type=int, default=2, help="MEDIA_WORKERS for the async mode.")
+        parser.add_argument('--username', default='bench_media')
+
+    def handle(self, *args, **options):
+        self.user, _ = User.objects.get_or_create(username=options['username'])
+        photo = self.photo(options['width'], options['height'])
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root, MEDIA_WORKERS=options['workers']):
+                self.run(photo, options['uploads'])
+        finally:
+            media_processor.shutdown()
+            Post.objects.filter(author=self.user).delete()
+            shutil.rmtree(media_root)
+
+    def run(self, photo, uploads):
+        self.stdout.write(f"upload: {len(photo) / 1024:,.0f} KiB JPEG")
+        self.stdout.write(f"{'mode':>10} {'p50 ms':>8} {'p95 ms':>8} {'ready after s':>14}")
+
+        with mock.patch.object(media_processor, 'schedule'):
+            self.report('none', self.upload(photo, uploads), None)
+
+        with override_settings(MEDIA_PROCESSING_MODE='sync'):
+            self.report('sync', self.upload(photo, uploads), None)
+
+        with override_settings(MEDIA_PROCESSING_MODE='async'):
+            # Start the process pool outside the timed uploads, as a running server would have
+            media_processor.render(photo)
+            started = time.perf_counter()
+            latencies = self.upload(photo, uploads)
+            media_processor.flush()
+            self.report('async', latencies, time.perf_counter() - started)
+
+        post = Post.objects.filter(author=self.user, media_status='ready').latest('id')
+        self.stdout.write("")
+        self.stdout.write(f"{'served':>10} {'size':>11} {'KiB':>8} {'vs original':>12}")
+        self.stdout.write(f"{'original':>10} {dimensions(Image.open(io.BytesIO(photo)).size):>11} "
+                          f"{len(photo) / 1024:>8.1f} {'100.0%':>12}")
+        for name, rendition in post.media_renditions.items():
+            self.stdout.write(f"{name:>10} {dimensions((rendition['width'], rendition['height'])):>11} "
+                              f"{rendition['bytes'] / 1024:>8.1f} {rendition['bytes'] / len(photo):>12.1%}")
+
+    def upload(self, photo, uploads):
+        view = PostCreateView.as_view()
+        latencies = []
+        for i in range(uploads):
+            request = APIRequestFactory().post('/api/posts/create/', {
+                'content': f'bench photo {i}',
+                'media': SimpleUploadedFile(f'photo{i}.jpg', photo, content_type='image/jpeg'),
+            }, format='multipart')
+            force_authenticate(request, user=self.user)
+            started = time.perf_counter()
+            response = view(request)
+            latencies.append((time.perf_counter() - started) * 1000)
+            # What the request handler does after the response: release the spooled upload
+            request.close()
+            if response.status_code != 201:
+                raise RuntimeError(f"Upload failed: {response.status_code} {response.data}")
+        return latencies
+
+    def report(self, mode, latencies, ready_after):
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        ready = f"{ready_after:.2f}" if ready_after is not None else '-'
+        self.stdout.write(f"{mode:>10} {statistics.median(latencies):>8.1f} {p95:>8.1f} {ready:>14}")
+
+    @staticmethod
+    def photo(width, height):
+        # Fractal detail, a gradient, coarse texture and fine grain: compresses roughly like a camera photo
+        detail = Image.effect_mandelbrot((width, height), (-2.2, -1.2, 1.0, 1.2), 200)
+        gradient = Image.linear_gradient('L').resize((width, height))
+        texture = Image.effect_noise((width // 8, height // 8), 40).resize((width, height), Image.Resampling.BICUBIC)
+        grain = Image.effect_noise((width, height), 20)
+        image = Image.merge('RGB', [Image.blend(channel, texture, 0.5) for channel in (detail, gradient, grain)])
+        exif = Image.Exif()
+        exif[0x010F] = 'Bench camera'
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=90, exif=exif.tobytes())
+        return buffer.getvalue()
+
+
+def dimensions(size):
+    return f"{size[0]}x{size[1]}"
@@ -0,0 +1,64 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from posts.models import Notification, Post
+from posts.notifications import NotificationDispatcher, NotificationEvent
+from posts.serializers import NotificationSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Simulate a like storm on a few posts and compare notification table growth with and without coalescing. Nothing is persisted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--likes', type=int, default=10000, help="Likes per post.")
+        parser.add_argument('--posts', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=500, help="Events per dispatcher batch.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stdout.write(f"{'mode':>10} {'rows':>8} {'write s':>8} {'read ms':>8}")
+        for label, coalesce_types in (('plain', []), ('coalesced', ['like', 'comment'])):
+            with override_settings(NOTIFICATION_COALESCE_TYPES=coalesce_types):
+                try:
+                    with transaction.atomic():
+                        self.run(label)
+                        raise Rollback()
+                except Rollback:
+                    pass
+
+    def run(self, label):
+        opts = self.options
+        author = User.objects.create(username='bench_storm_author')
+        fans = User.objects.bulk_create(
+            [User(username=f'bench_storm_fan{i}') for i in range(opts['likes'])], batch_size=2000
+        )
+        posts = Post.objects.bulk_create([Post(author=author, content=f'viral {i}') for i in range(opts['posts'])])
+
+        # The same interleaved stream the workers would see while every post goes viral at once
+        now = timezone.now()
+        events = [
+            NotificationEvent(author.id, fan.id, post.id, 'like', f'{fan.username} liked your post.', now)
+            for fan in fans for post in posts
+        ]
+        dispatcher = NotificationDispatcher()
+        start = time.perf_counter()
+        for i in range(0, len(events), opts['batch_size']):
+            dispatcher.write_batch(events[i:i + opts['batch_size']])
+        write_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        page = list(Notification.objects.filter(user=author).select_related('sender').order_by('-timestamp')[:20])
+        NotificationSerializer(page, many=True, context={'actor_names': NotificationSerializer.actor_names(page)}).data
+        read_ms = (time.perf_counter() - start) * 1000
+
+        rows = Notification.objects.filter(user=author).count()
+        self.stdout.write(f"{label:>10} {rows:>8} {write_seconds:>8.2f} {read_ms:>8.2f}")
@@ -0,0 +1,80 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.search import get_search_backend
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark post search (icontains scan vs the configured backend) over synthetic posts. Nothing is persisted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--vocabulary', type=int, default=50_000)
+        parser.add_argument('--words-per-post', type=int, default=12)
+        parser.add_argument('--repeats', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.options = options
+        try:
+            with transaction.atomic():
+                self.run()
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self):
+        opts = self.options
+        rng = random.Random(opts['seed'])
+        backend = get_search_backend()
+        # Zipf-like vocabulary so a few words are very common and most are rare
+        vocabulary = [f'w{i}' for i in range(opts['vocabulary'])]
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+        author = User.objects.create(username='bench_search_author')
+        start = time.perf_counter()
+        for offset in range(0, opts['posts'], opts['batch_size']):
+            size = min(opts['batch_size'], opts['posts'] - offset)
+            posts = Post.objects.bulk_create([
+                Post(author=author, content=' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=opts['words_per_post'])))
+                for _ in range(size)
+            ])
+            backend.index_posts(posts, created=True)
+        self.stdout.write(f"Loaded and indexed {opts['posts']} posts in {time.perf_counter() - start:.1f}s "
+                          f"({type(backend).__name__})")
+
+        queries = {
+            'common word': 'w1',
+            'mid word': 'w500',
+            'rare word': f"w{opts['vocabulary'] - 10}",
+            'two words': 'w3 w40',
+        }
+        page = 20
+        self.stdout.write(f"{'query':<12} {'icontains ms':>14} {'backend ms':>12} {'hits':>8}")
+        for label, text in queries.items():
+            posts = Post.objects.select_related('author')
+            scan = self.measure(lambda: (list(posts.filter(content__icontains=text.split()[0]).order_by('-timestamp')[:page]),
+                                         posts.filter(content__icontains=text.split()[0]).count()))
+            ranked = backend.search(posts, text)
+            indexed = self.measure(lambda: (list(ranked[:page]), ranked.count()))
+            self.stdout.write(f"{label:<12} {scan:>14} {indexed:>12} {ranked.count():>8}")
+
+    def measure(self, fn):
+        timings = []
+        for _ in range(self.options['repeats']):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        return f"{statistics.median(timings):.1f}"
@@ -0,0 +1,212 @@
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.client import MULTIPART_CONTENT, encode_multipart, BOUNDARY
+from django.test.utils import override_settings
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from posts.models import MediaUpload, Post
+from posts.uploads import create_upload
+from posts.views import MediaUploadDetailView, PostCreateView
+from social_media_api.media import media_processor
+
+
+class CountingStream(io.RawIOBase):
+    # The request body as the WSGI server would hand it over, counting what the view reads
+    def __init__(self, path, offset=0):
+        self.file = open(path, 'rb')
+        self.file.seek(offset)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+class Command(BaseCommand):
+    help = ("Send concurrent large image uploads through the multipart PostCreateView and through the chunked "
+            "upload endpoint, each in a fresh process; report peak RSS growth, time and bytes read to reject "
+            "a file that is not an image.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=8, help="Uploads in flight at once.")
+        parser.add_argument('--sizes', default='2,16', help="Comma separated upload sizes in MiB.")
+        parser.add_argument('--chunk', type=int, default=4, help="Chunk size in MiB for the chunked upload.")
+        parser.add_argument('--username', default='bench_uploads')
+        parser.add_argument('--child', choices=['multipart', 'chunked'], help=MODE_HELP)
+        parser.add_argument('--workdir', help=MODE_HELP)
+
+    def handle(self, *args, **options):
+        self.user, _ = User.objects.get_or_create(username=options['username'])
+        if options['child']:
+            return self.child(options)
+
+        workdir = tempfile.mkdtemp()
+        try:
+            self.stdout.write(f"{options['concurrency']} concurrent uploads, chunks of {options['chunk']} MiB")
+            self.stdout.write(f"{'MiB':>5} {'path':>10} {'peak RSS growth MiB':>20} {'per upload MiB':>15} "
+                              f"{'s':>6} {'read to reject non-image':>25}")
+            for size in [int(value) for value in options['sizes'].split(',')]:
+                self.write_bodies(workdir, size * 1024 * 1024)
+                for mode in ['multipart', 'chunked']:
+                    output = subprocess.run([
+                        sys.executable, sys.argv[0], 'bench_uploads', '--child', mode, '--workdir', workdir,
+                        '--concurrency', str(options['concurrency']), '--chunk', str(options['chunk']),
+                        '--username', options['username'],
+                    ], check=True, capture_output=True, text=True).stdout.split()
+                    growth, seconds, rejected = int(output[0]), float(output[1]), int(output[2])
+                    self.stdout.write(f"{size:>5} {mode:>10} {growth / 1024:>20.1f} "
+                                      f"{growth / 1024 / options['concurrency']:>15.1f} {seconds:>6.2f} "
+                                      f"{rejected / 1024:>21,.0f} KiB")
+        finally:
+            shutil.rmtree(workdir)
+            Post.objects.filter(author=self.user).delete()
+            MediaUpload.objects.filter(owner=self.user).delete()
+
+    def write_bodies(self, workdir, size):
+        # A real JPEG header and image, padded out to the size of a large camera file
+        buffer = io.BytesIO()
+        Image.effect_noise((1200, 900), 60).convert('RGB').save(buffer, 'JPEG', quality=90)
+        photo = buffer.getvalue()
+        photo += os.urandom(size - len(photo))
+        junk = os.urandom(size)
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64)).save(buffer, 'JPEG')
+        tiny = buffer.getvalue()
+        for name, content in [('photo', photo), ('junk', junk), ('tiny', tiny)]:
+            with open(os.path.join(workdir, name), 'wb') as raw:
+                raw.write(content)
+            body = encode_multipart(BOUNDARY, {'content': 'bench', 'media': NamedBytes(f'{name}.jpg', content)})
+            with open(os.path.join(workdir, f'{name}.multipart'), 'wb') as multipart:
+                multipart.write(body)
+
+    # ============ Child process =============
+
+    def child(self, options):
+        workdir, mode = options['workdir'], options['child']
+        upload = self.upload_multipart if mode == 'multipart' else self.upload_chunked
+        chunk = options['chunk'] * 1024 * 1024
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root), mock.patch.object(media_processor, 'schedule'):
+                # Load lazily imported code with a tiny upload so it doesn't count as upload memory
+                upload(workdir, 'tiny', chunk)
+                baseline = current_rss()
+                sampler = RSSSampler()
+                sampler.start()
+                threads = [threading.Thread(target=self.run_upload, args=(upload, workdir, chunk))
+                           for _ in range(options['concurrency'])]
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+                growth = sampler.stop() - baseline
+                rejected = upload(workdir, 'junk', chunk)
+        finally:
+            shutil.rmtree(media_root)
+        self.stdout.write(f"{growth} {elapsed:.3f} {rejected}")
+
+    def run_upload(self, upload, workdir, chunk):
+        try:
+            upload(workdir, 'photo', chunk)
+        finally:
+            connection.close()
+
+    def request(self, method, path, source, length, content_type, **headers):
+        stream = CountingStream(*source)
+        request = WSGIRequest({
+            'REQUEST_METHOD': method, 'PATH_INFO': path, 'SERVER_NAME': 'testserver', 'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http', 'wsgi.input': stream, 'CONTENT_TYPE': content_type,
+            'CONTENT_LENGTH': str(length), **headers,
+        })
+        force_authenticate(request, user=self.user)
+        return request, stream
+
+    def upload_multipart(self, workdir, name, chunk):
+        path = os.path.join(workdir, f'{name}.multipart')
+        request, stream = self.request('POST', '/api/posts/create/', (path,), os.path.getsize(path), MULTIPART_CONTENT)
+        response = PostCreateView.as_view()(request)
+        request.close()
+        stream.close()
+        expect(response, 400 if name == 'junk' else 201)
+        return stream.bytes_read
+
+    def upload_chunked(self, workdir, name, chunk):
+        path = os.path.join(workdir, name)
+        size = os.path.getsize(path)
+        upload = create_upload(self.user, MediaUpload.Target.POST_MEDIA, f'{name}.jpg', size)
+        bytes_read, view = 0, MediaUploadDetailView.as_view()
+        for offset in range(0, size, chunk):
+            length = min(chunk, size - offset)
+            request, stream = self.request('PATCH', f'/api/posts/uploads/{upload.id}/', (path, offset), length,
+                                           'application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+            response = view(request, upload_id=upload.id)
+            stream.close()
+            bytes_read += stream.bytes_read
+            if name == 'junk':
+                expect(response, 422)
+                return bytes_read
+            expect(response, 200)
+
+        request = APIRequestFactory().post('/api/posts/create/', {'content': 'bench', 'media_upload': str(upload.id)},
+                                           format='json')
+        force_authenticate(request, user=self.user)
+        expect(PostCreateView.as_view()(request), 201)
+        return bytes_read
+
+
+def current_rss():
+    # Resident set size in KiB, Linux only
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+class RSSSampler(threading.Thread):
+    # Highest resident set size seen while the uploads run; ru_maxrss can't be reset between modes
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = current_rss()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(0.002):
+            self.peak = max(self.peak, current_rss())
+
+    def stop(self):
+        self.done.set()
+        self.join()
+        return max(self.peak, current_rss())
+
+
+MODE_HELP = "Internal: run one mode in this process and print its measurements."
+
+
+class NamedBytes(io.BytesIO):
+    # What encode_multipart needs to send `content` as a file called `name`
+    def __init__(self, name, content):
+        super().__init__(content)
+        self.name = name
+
+
+def expect(response, status_code):
+    if response.status_code != status_code:
+        raise RuntimeError(f"Expected {status_code}, got {response.status_code}: {getattr(response, 'data', '')}")
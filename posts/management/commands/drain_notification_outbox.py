@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import NotificationOutbox
+from posts.notifications import dispatcher
+
+
+class Command(BaseCommand):
+    help = "Deliver notifications the dispatcher spilled to the outbox table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Outbox rows written per bulk insert.")
+
+    def handle(self, *args, **options):
+        delivered = dispatcher.drain_outbox(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Delivered {delivered} notifications from the outbox."))
+        dead = NotificationOutbox.objects.filter(dead_lettered=True).count()
+        if dead:
+            self.stdout.write(self.style.WARNING(f"{dead} dead-lettered notifications are no longer retried."))
@@ -0,0 +1,112 @@
+import asyncio
+import resource
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from users.tokens import ClaimsRefreshToken
+
+
+class Command(BaseCommand):
+    help = "Hold many idle connections to /api/posts/stream/ on a running ASGI server and report how it copes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/posts/stream/')
+        parser.add_argument('--connections', type=int, default=2000)
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to hold the connections open.")
+        parser.add_argument('--ramp', type=int, default=200, help="Connections opened concurrently while ramping up.")
+        parser.add_argument('--username', default='loadtest_stream', help="User the connections authenticate as (created if missing).")
+        parser.add_argument('--server-pid', type=int, help="Report this worker's resident memory before and after.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        user, _ = User.objects.get_or_create(username=options['username'])
+        self.token = str(ClaimsRefreshToken.for_user(user).access_token)
+
+        # Each connection is a file descriptor on this side too
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = options['connections'] + 100
+        if soft < wanted:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+        asyncio.run(self.run())
+
+    async def run(self):
+        opts = self.options
+        url = urlsplit(opts['url'])
+        self.host, self.port = url.hostname, url.port or 80
+        self.request = (
+            f"GET {url.path}?token={self.token} HTTP/1.1\r\n"
+            f"Host: {url.netloc}\r\nAccept: text/event-stream\r\n\r\n"
+        ).encode()
+
+        rss_before = self.peak_rss = self.server_rss()
+        self.connect_times, self.errors, self.heartbeats = [], [], 0
+        semaphore = asyncio.Semaphore(opts['ramp'])
+        started = time.perf_counter()
+        results = await asyncio.gather(*[self.hold(semaphore) for _ in range(opts['connections'])])
+        connected = sum(results)
+
+        self.stdout.write(f"connections      {connected}/{opts['connections']} held for {opts['duration']}s "
+                          f"(total {time.perf_counter() - started:.1f}s)")
+        if self.connect_times:
+            times = sorted(self.connect_times)
+            self.stdout.write(f"connect ms       median {statistics.median(times):.1f}  "
+                              f"p95 {times[int(len(times) * 0.95) - 1]:.1f}  max {times[-1]:.1f}")
+        self.stdout.write(f"keepalives seen  {self.heartbeats}")
+        if rss_before is not None:
+            self.stdout.write(f"server RSS MiB   {rss_before:.1f} -> {self.peak_rss:.1f} while holding")
+        for error in sorted(set(self.errors))[:5]:
+            self.stdout.write(self.style.WARNING(f"error: {error} (x{self.errors.count(error)})"))
+
+    async def hold(self, semaphore):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                writer.write(self.request)
+                status = await reader.readline()
+                if b' 200 ' not in status:
+                    raise ConnectionError(status.decode().strip() or 'no status line')
+                while (await reader.readline()) not in (b'\r\n', b''):
+                    pass
+            except (OSError, ConnectionError) as exc:
+                self.errors.append(str(exc))
+                return False
+            self.connect_times.append((time.perf_counter() - start) * 1000)
+
+        # Idle: count keepalives until the hold period is over
+        deadline = time.monotonic() + self.options['duration']
+        try:
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if not line:
+                    raise ConnectionError('server closed the stream')
+                if b'keepalive' in line:
+                    self.heartbeats += 1
+        except (OSError, ConnectionError) as exc:
+            self.errors.append(str(exc))
+            return False
+        finally:
+            if self.peak_rss is not None:
+                self.peak_rss = max(self.peak_rss, self.server_rss() or 0)
+            writer.close()
+        return True
+
+    def server_rss(self):
+        pid = self.options['server_pid']
+        if pid is None:
+            return None
+        try:
+            with open(f'/proc/{pid}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            return None
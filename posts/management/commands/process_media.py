@@ -0,0 +1,23 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from social_media_api.media import MEDIA_FIELDS, MediaStatus, media_processor
+
+
+class Command(BaseCommand):
+    help = ("Build renditions for images still marked pending (uploads from before the media pipeline, "
+            "jobs lost to a restart) and, with --retry-failed, for failed ones.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true')
+
+    def handle(self, *args, **options):
+        statuses = [MediaStatus.PENDING] + ([MediaStatus.FAILED] if options['retry_failed'] else [])
+        for label, field_name in MEDIA_FIELDS:
+            model = apps.get_model(label)
+            rows = list(model.objects.filter(**{f'{field_name}_status__in': statuses}).values_list('pk', field_name))
+            for pk, name in rows:
+                media_processor.submit(label, pk, field_name, name)
+            media_processor.flush()
+            left = model.objects.filter(**{f'{field_name}_status__in': statuses}).count()
+            self.stdout.write(f"{label}.{field_name}: {len(rows)} processed, {left} still {' or '.join(statuses)}")
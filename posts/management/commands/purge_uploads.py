@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.models import MediaUpload
+from posts.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = "Delete resumable uploads that expired before being finished and attached, along with their files."
+
+    def handle(self, *args, **options):
+        expired = MediaUpload.objects.filter(expires_at__lte=timezone.now())
+        count = 0
+        for upload in expired.iterator():
+            discard_upload(upload)
+            count += 1
+        self.stdout.write(f"{count} expired uploads deleted")
@@ -0,0 +1,28 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home timelines from the Follow graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help="Only rebuild these users (default: everyone).")
+        parser.add_argument('--batch-size', type=int, default=500, help="Users loaded per query.")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id').only('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+            missing = set(options['usernames']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+
+        rebuilt = 0
+        entries = 0
+        for user in users.iterator(chunk_size=options['batch_size']):
+            entries += rebuild_timeline(user)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} timelines ({entries} entries)."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from posts.models import Post
+from posts.utils import reconcile_post_counters
+
+
+class Command(BaseCommand):
+    help = "Repair drift in the denormalized Post.like_count / comment_count / repost_count columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Posts checked per id range.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+
+        repaired = 0
+        for start in range(0, last_id + 1, batch_size):
+            # Each batch is its own short statement pair, so no long-running lock is held
+            repaired += reconcile_post_counters(Post.objects.filter(id__gte=start, id__lt=start + batch_size))
+
+        self.stdout.write(self.style.SUCCESS(f"Checked posts up to id {last_id}; repaired {repaired}."))
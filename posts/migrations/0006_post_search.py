@@ -0,0 +1,86 @@
+# Generated by Django 5.1.4 on 2026-10-18 02:32
+
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# posts.search.tokenize as it stood when this migration was written. Frozen here so replaying the
+# migration never depends on, or changes with, the live app code.
+_TOKEN = re.compile(r'\w+')
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have i if in into is it its of on or so '
+    'that the their then there these they this to was we were will with you your'.split()
+)
+MAX_TERM_LENGTH = 64
+
+
+def tokenize(text):
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in _TOKEN.findall((text or '').lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def add_search_vector(apps, schema_editor):
+    # Postgres only: a generated tsvector column keeps itself current on every save
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "ALTER TABLE posts_post ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED"
+    )
+    schema_editor.execute("CREATE INDEX posts_post_search_vector_idx ON posts_post USING GIN (search_vector)")
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS posts_post_search_vector_idx")
+    schema_editor.execute("ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector")
+
+
+def index_existing_posts(apps, schema_editor):
+    # Everywhere but Postgres, search reads the PostSearchTerm postings: write them for existing posts
+    if schema_editor.connection.vendor == 'postgresql':
+        return
+    Post = apps.get_model('posts', 'Post')
+    PostSearchTerm = apps.get_model('posts', 'PostSearchTerm')
+    last_id = 0
+    while True:
+        batch = list(Post.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'content')[:1000])
+        if not batch:
+            return
+        PostSearchTerm.objects.bulk_create([
+            PostSearchTerm(post_id=post_id, term=term, frequency=min(frequency, 32767))
+            for post_id, content in batch
+            for term, frequency in Counter(tokenize(content)).items()
+        ], batch_size=5000)
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('frequency', models.PositiveSmallIntegerField(default=1)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.post')),
+            ],
+            options={
+                'unique_together': {('term', 'post')},
+            },
+        ),
+        migrations.RunPython(add_search_vector, drop_search_vector),
+        migrations.RunPython(index_existing_posts, migrations.RunPython.noop),
+    ]
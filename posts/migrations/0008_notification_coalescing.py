@@ -0,0 +1,86 @@
+# Generated by Django 5.1.4 on 2026-10-18 02:39
+
+from datetime import timedelta
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+# The coalescing rules as they stood when this migration was written. Frozen here rather than read
+# from settings, so replaying the migration folds history the same way whatever settings are live.
+COALESCE_TYPES = ['like', 'comment']
+COALESCE_WINDOW = timedelta(seconds=86400)
+SAMPLE_ACTORS = 3
+
+
+def coalesce_existing(apps, schema_editor):
+    # Fold historical likes/comments into the aggregates the dispatcher now writes:
+    # one row per (user, post, type, read state) and coalescing window.
+    Notification = apps.get_model('posts', 'Notification')
+    Notification.objects.update(started_at=F('timestamp'))
+
+    window = COALESCE_WINDOW
+    sample_size = SAMPLE_ACTORS
+    rows = (
+        Notification.objects
+        .filter(notification_type__in=COALESCE_TYPES, post__isnull=False)
+        .order_by('user_id', 'post_id', 'notification_type', 'is_read', 'timestamp', 'id')
+        .values_list('id', 'user_id', 'post_id', 'notification_type', 'is_read', 'timestamp', 'sender_id')
+        .iterator(chunk_size=2000)
+    )
+
+    aggregates, redundant = [], []
+
+    def flush(group):
+        # The newest row of the group becomes the aggregate; the rest are deleted
+        if len(group) == 1:
+            return
+        actors = []
+        for sender_id in reversed([row[6] for row in group]):
+            if sender_id not in actors:
+                actors.append(sender_id)
+        aggregates.append(Notification(
+            id=group[-1][0], actor_count=len(actors), sample_actor_ids=actors[:sample_size], started_at=group[0][5],
+        ))
+        redundant.extend(row[0] for row in group[:-1])
+
+    # Writes wait until the scan is done; SQLite doesn't isolate a cursor from them
+    group = []
+    for row in rows:
+        if group and (row[1:5] != group[0][1:5] or row[5] - group[0][5] > window):
+            flush(group)
+            group = []
+        group.append(row)
+    if group:
+        flush(group)
+
+    Notification.objects.bulk_update(aggregates, ['actor_count', 'sample_actor_ids', 'started_at'], batch_size=1000)
+    for start in range(0, len(redundant), 1000):
+        Notification.objects.filter(id__in=redundant[start:start + 1000]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='sample_actor_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='started_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(coalesce_existing, migrations.RunPython.noop),
+    ]
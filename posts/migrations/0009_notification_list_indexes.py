@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-18 02:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_notification_coalescing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='posts_notif_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', '-timestamp', '-id'], name='posts_notif_user_unread_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='posts_notif_user_id_1d818e_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='posts_notif_is_read_47d55d_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='posts_notif_timesta_654b15_idx',
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def backfill_conversations(apps, schema_editor):
+    # Thread existing direct messages into one conversation per pair of users
+    DirectMessage = apps.get_model('posts', 'DirectMessage')
+    Conversation = apps.get_model('posts', 'Conversation')
+    ConversationParticipant = apps.get_model('posts', 'ConversationParticipant')
+
+    pairs = {
+        (min(sender_id, recipient_id), max(sender_id, recipient_id))
+        for sender_id, recipient_id in DirectMessage.objects.values_list('sender_id', 'recipient_id').distinct()
+    }
+    for user_low_id, user_high_id in sorted(pairs):
+        conversation, _ = Conversation.objects.get_or_create(user_low_id=user_low_id, user_high_id=user_high_id)
+        messages = DirectMessage.objects.filter(
+            sender_id__in=(user_low_id, user_high_id), recipient_id__in=(user_low_id, user_high_id)
+        )
+        messages.update(conversation=conversation)
+
+        last_message = messages.order_by('-timestamp', '-id').first()
+        conversation.last_message = last_message
+        conversation.last_message_at = last_message.timestamp
+        conversation.save(update_fields=['last_message', 'last_message_at'])
+
+        unread = dict(
+            messages.filter(is_read=False).values_list('recipient_id').annotate(total=Count('id')).order_by()
+        )
+        for user_id in (user_low_id, user_high_id):
+            ConversationParticipant.objects.update_or_create(
+                conversation=conversation, user_id=user_id,
+                defaults={'unread_count': unread.get(user_id, 0), 'last_message_at': last_message.timestamp},
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_conversations'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
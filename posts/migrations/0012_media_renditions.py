@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 03:23
+
+from django.db import migrations, models
+
+
+def mark_existing_media_pending(apps, schema_editor):
+    # Existing uploads get renditions from `manage.py process_media`
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.exclude(media__isnull=True).exclude(media='').update(media_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_backfill_conversations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='media_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='media_status',
+            field=models.CharField(choices=[('none', 'No image'), ('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', max_length=10),
+        ),
+        migrations.RunPython(mark_existing_media_pending, migrations.RunPython.noop),
+    ]
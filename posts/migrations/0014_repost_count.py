@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-18 03:37
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing_reposts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    reposts = Post.objects.filter(shared_post=OuterRef('pk')).order_by().values('shared_post').annotate(total=Count('id')).values('total')
+    Post.objects.filter(id__in=Post.objects.filter(shared_post__isnull=False).values('shared_post')).update(
+        repost_count=Coalesce(Subquery(reposts), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_media_uploads'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='repost_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_reposts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='post',
+            constraint=models.UniqueConstraint(condition=models.Q(('shared_post__isnull', False)), fields=('author', 'shared_post'), name='posts_post_one_repost_per_author'),
+        ),
+    ]
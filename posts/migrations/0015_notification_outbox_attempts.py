@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_repost_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='dead_lettered',
+            field=models.BooleanField(default=False),
+        ),
+    ]
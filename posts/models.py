@@ -1,6 +1,11 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
+from social_media_api.media import MediaStatus
+
 
 # ============ Post model =============
 
@@ -9,24 +14,35 @@ class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     timestamp = models.DateTimeField(auto_now_add=True)
     media = models.ImageField(upload_to='post_media/', blank=True, null=True)
+    # Resized WebP copies of `media`, built by social_media_api.media.media_processor
+    media_status = models.CharField(max_length=10, choices=MediaStatus.choices, default=MediaStatus.NONE)
+    media_renditions = models.JSONField(default=dict, blank=True)
     shared_post = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True)
 
-    def like_count(self):
-        return self.likes.count()
-    
-    def comment_counts(self):
-        return self.comments.count()
+    # Denormalized counters, kept current with F() updates by the like/comment/repost views
+    # and repaired by `manage.py reconcile_post_counters`
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    repost_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         indexes = [
             models.Index(fields=['author']),
             models.Index(fields=['timestamp']),
-            models.Index(fields=['shared_post'])
+            models.Index(fields=['shared_post']),
+            models.Index(fields=['author', '-timestamp', '-id'], name='posts_post_author_ts_idx'),
+            models.Index(fields=['-timestamp', '-id'], name='posts_post_ts_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['author', 'shared_post'], condition=models.Q(shared_post__isnull=False),
+                name='posts_post_one_repost_per_author',
+            ),
         ]
 
     def __str__(self):
-        if self.shared_post:
-            return f"Repost by {self.author.username} of {self.shared_post.author.username}'s post"
+        if self.shared_post_id:
+            return f"Repost by {self.author.username} of post {self.shared_post_id}"
         return f"Post by {self.author.username}"
     
 # ============ Like model =============
@@ -60,6 +76,7 @@ class Comment(models.Model):
             models.Index(fields=['user']),
             models.Index(fields=['post']),
             models.Index(fields=['timestamp']),
+            models.Index(fields=['post', '-timestamp', '-id'], name='posts_comment_post_ts_idx'),
         ]
 
     def __str__(self):
@@ -71,6 +88,7 @@ class Comment(models.Model):
 class DirectMessage(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_messages')
+    conversation = models.ForeignKey('Conversation', on_delete=models.CASCADE, related_name='messages', null=True, blank=True)
     content = models.TextField()
     is_read = models.BooleanField(default=False)
     timestamp = models.DateTimeField(auto_now_add=True)
@@ -81,12 +99,49 @@ class DirectMessage(models.Model):
             models.Index(fields=['recipient']),
             models.Index(fields=['is_read']),
             models.Index(fields=['timestamp']),
+            models.Index(fields=['conversation', '-timestamp', '-id'], name='posts_dm_conversation_ts_idx'),
         ]
 
     def __str__(self):
         return f"Message from {self.sender.username} to {self.recipient.username}"
 
 
+# ============ Conversation models =============
+
+class Conversation(models.Model):
+    # One thread per pair of users, stored with the lower user id first so the
+    # pair is unique whoever wrote first
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    last_message = models.ForeignKey(DirectMessage, on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user_low', 'user_high')
+
+    def __str__(self):
+        return f"Conversation between {self.user_low_id} and {self.user_high_id}"
+
+
+class ConversationParticipant(models.Model):
+    # Per-user view of a conversation. `last_message_at` is copied from the
+    # conversation so a user's chat list is one range scan of this table.
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='participants')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
+    unread_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('conversation', 'user')
+        indexes = [
+            models.Index(fields=['user', '-last_message_at', '-id'], name='posts_participant_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"User {self.user_id} in conversation {self.conversation_id}"
+
+
 # ============ Notification model =============
 
 class Notification(models.Model):
@@ -96,17 +151,108 @@ class Notification(models.Model):
     notification_type = models.CharField(max_length=20)  # e.g., "like", "comment"
     message = models.TextField()
     is_read = models.BooleanField(default=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event happened, not when the dispatcher got round to writing it
+    timestamp = models.DateTimeField(default=timezone.now)
+    # Coalesced likes/comments on one post: how many actors, a few recent ones and
+    # when the aggregate was opened (see posts.notifications)
+    actor_count = models.PositiveIntegerField(default=1)
+    sample_actor_ids = models.JSONField(default=list, blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
+        # Keyset pages of a user's notifications, all or unread only; both also
+        # cover plain `user` lookups, so no single-column user index is needed
         indexes = [
-            models.Index(fields=['user']),
+            models.Index(fields=['user', '-timestamp', '-id'], name='posts_notif_user_ts_idx'),
+            models.Index(fields=['user', 'is_read', '-timestamp', '-id'], name='posts_notif_user_unread_idx'),
             models.Index(fields=['sender']),
             models.Index(fields=['post']),
-            models.Index(fields=['is_read']),
-            models.Index(fields=['timestamp']),
         ]
 
     def __str__(self):
         return f"Notification for {self.user.username}: {self.message}"
 
+
+# ============ Notification Outbox model =============
+
+class NotificationOutbox(models.Model):
+    # Notifications the dispatcher couldn't queue or write, waiting to be replayed
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+', null=True, blank=True)
+    notification_type = models.CharField(max_length=20)
+    message = models.TextField()
+    timestamp = models.DateTimeField()
+    # Failed replays; at NOTIFICATION_OUTBOX_MAX_ATTEMPTS the row is dead-lettered and no longer replayed
+    attempts = models.PositiveIntegerField(default=0)
+    dead_lettered = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"Pending {self.notification_type} notification for user {self.user_id}"
+
+
+# ============ Timeline Entry model =============
+
+class TimelineEntry(models.Model):
+    # Materialized home timeline row: one per (reader, post). `author` and
+    # `timestamp` are copied from the post so feed reads and unfollow pruning
+    # never have to join back to posts_post.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-timestamp', '-post'], name='posts_timeline_user_ts_idx'),
+            models.Index(fields=['user', 'author'], name='posts_timeline_user_auth_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in {self.user_id}'s timeline"
+
+
+
+# ============ Media Upload model =============
+
+class MediaUpload(models.Model):
+    # An image sent in chunks (posts.uploads), written straight to the storage name it will keep
+    class Target(models.TextChoices):
+        POST_MEDIA = 'post_media', 'Post media'
+        PROFILE_PICTURE = 'profile_picture', 'Profile picture'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='media_uploads')
+    target = models.CharField(max_length=20, choices=Target.choices)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # Read from the image header as soon as the first chunks are in
+    format = models.CharField(max_length=10, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    @property
+    def complete(self):
+        return self.offset == self.size and self.width is not None
+
+    def __str__(self):
+        return f"Upload {self.id} of {self.name} ({self.offset}/{self.size} bytes)"
+
+
+# ============ Post Search Term model =============
+
+class PostSearchTerm(models.Model):
+    # Inverted index posting used by InvertedIndexSearchBackend (SQLite / development)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    frequency = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('term', 'post')
+
+    def __str__(self):
+        return f"'{self.term}' in post {self.post_id}"
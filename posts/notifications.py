@@ -0,0 +1,371 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from social_media_api.pubsub import publish_to_user
+from .models import Notification, NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+
+# A notification waiting to be written; ids only, so events are cheap to queue and spill
+NotificationEvent = namedtuple(
+    'NotificationEvent', ['user_id', 'sender_id', 'post_id', 'notification_type', 'message', 'timestamp']
+)
+
+_STOP = object()
+
+
+def dispatch_mode():
+    return getattr(settings, 'NOTIFICATION_DISPATCH_MODE', 'async')
+
+
+# ============ Notification Dispatcher =============
+
+class NotificationDispatcher:
+    """Moves notification writes off the request path.
+
+    `dispatch()` puts the event on a bounded in-process queue and returns. Worker
+    threads, started on first use, drain the queue and write whatever has piled
+    up in one transaction, coalescing likes/comments on the same post (see
+    `_coalesce`). Events that can't be queued (queue full, shutdown)
+    or written (database error) are spilled to the NotificationOutbox table and
+    replayed by `drain_outbox()` / `manage.py drain_notification_outbox`.
+
+    Delivery is best-effort: a queued event lives only in memory until it is
+    written, so events still queued when the process is killed are lost.
+
+    With NOTIFICATION_DISPATCH_MODE = 'sync' every event is written immediately
+    on the calling thread, which is what tests rely on.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._workers = []
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self.reset_metrics()
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500)
+
+    @property
+    def batch_wait(self):
+        # Seconds a worker lingers for more events once it has picked one up
+        return getattr(settings, 'NOTIFICATION_BATCH_WAIT_MS', 50) / 1000
+
+    def dispatch(self, user, sender, post, notification_type, message):
+        self.dispatch_many([(user, sender, post, notification_type, message)])
+
+    def dispatch_many(self, notifications):
+        """`dispatch` for several (user, sender, post, type, message) tuples at once.
+
+        In sync mode they are written as one batch instead of one write each.
+        """
+        timestamp = timezone.now()
+        events = [
+            NotificationEvent(
+                user_id=user.id,
+                sender_id=sender.id,
+                post_id=post.id if post is not None else None,
+                notification_type=notification_type,
+                message=message,
+                timestamp=timestamp,
+            )
+            for user, sender, post, notification_type, message in notifications
+        ]
+        if not events:
+            return
+        # A notification must never fail the action that triggered it
+        try:
+            if dispatch_mode() == 'sync':
+                self._count('enqueued', len(events))
+                self._write(events)
+            else:
+                for event in events:
+                    self._enqueue(event)
+        except Exception:
+            logger.exception("Could not dispatch %d notification(s), first for user %s", len(events), events[0].user_id)
+
+    def _enqueue(self, event):
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._spill([event])
+            return
+        self._count('enqueued')
+
+    def _ensure_workers(self):
+        if self._workers and all(worker.is_alive() for worker in self._workers):
+            return
+        with self._lock:
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=getattr(settings, 'NOTIFICATION_QUEUE_SIZE', 10000))
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            for i in range(len(self._workers), getattr(settings, 'NOTIFICATION_WORKERS', 2)):
+                worker = threading.Thread(target=self._run, name=f'notification-worker-{i}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is _STOP:
+                self._queue.task_done()
+                return
+
+            batch = [event]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    event = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if event is _STOP:
+                    # Put the sentinel back; this batch still gets written first
+                    self._queue.task_done()
+                    self._queue.put(_STOP)
+                    break
+                batch.append(event)
+
+            close_old_connections()
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception("Notification worker failed on a batch of %d", len(batch))
+            finally:
+                close_old_connections()
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, events):
+        try:
+            self.write_batch(events)
+        except Exception:
+            logger.exception("Writing %d notifications failed; spilling them to the outbox", len(events))
+            self._spill(events)
+            return
+        for event in events:
+            publish_to_user(event.user_id, {
+                'type': 'notification',
+                'notification_type': event.notification_type,
+                'post': event.post_id,
+                'sender_id': event.sender_id,
+                'message': event.message,
+                'timestamp': event.timestamp.isoformat(),
+            })
+        with self._metrics_lock:
+            self._metrics['written'] += len(events)
+            self._metrics['batches'] += 1
+            self._metrics['last_batch_size'] = len(events)
+            self._metrics['max_batch_size'] = max(self._metrics['max_batch_size'], len(events))
+
+    def write_batch(self, events):
+        coalesce_types = set(getattr(settings, 'NOTIFICATION_COALESCE_TYPES', ()))
+        groups = {}
+        plain = []
+        for event in events:
+            if event.post_id is not None and event.notification_type in coalesce_types:
+                groups.setdefault((event.user_id, event.post_id, event.notification_type), []).append(event)
+            else:
+                plain.append(event)
+
+        with transaction.atomic():
+            if groups:
+                self._coalesce(groups)
+            if plain:
+                Notification.objects.bulk_create([
+                    Notification(
+                        user_id=event.user_id,
+                        sender_id=event.sender_id,
+                        post_id=event.post_id,
+                        notification_type=event.notification_type,
+                        message=event.message,
+                        sample_actor_ids=[event.sender_id],
+                        timestamp=event.timestamp,
+                        started_at=event.timestamp,
+                    )
+                    for event in plain
+                ], batch_size=self.batch_size)
+
+    def _coalesce(self, groups):
+        """Fold each (user, post, type) group into that user's open aggregate, or open one.
+
+        An aggregate stays open while it is unread and younger than
+        NOTIFICATION_COALESCE_WINDOW. The latest event supplies sender, message and
+        timestamp, so the row moves back to the top of the list.
+        """
+        window = timedelta(seconds=getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 86400))
+        sample_size = getattr(settings, 'NOTIFICATION_SAMPLE_ACTORS', 3)
+        candidates = Notification.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _, _ in groups},
+            post_id__in={post_id for _, post_id, _ in groups},
+            notification_type__in={notification_type for _, _, notification_type in groups},
+            is_read=False,
+            started_at__gte=timezone.now() - window,
+        ).order_by('started_at')
+        # Later aggregates win if a race ever opened two for the same key
+        open_aggregates = {(row.user_id, row.post_id, row.notification_type): row for row in candidates}
+
+        created, updated = [], []
+        for (user_id, post_id, notification_type), events in groups.items():
+            aggregate = open_aggregates.get((user_id, post_id, notification_type))
+            if aggregate is None:
+                aggregate = Notification(
+                    user_id=user_id, post_id=post_id, notification_type=notification_type,
+                    actor_count=0, sample_actor_ids=[], started_at=events[0].timestamp,
+                )
+                created.append(aggregate)
+            else:
+                updated.append(aggregate)
+
+            for event in events:
+                # Someone still in the sample (e.g. a second comment) isn't counted twice
+                if event.sender_id in aggregate.sample_actor_ids:
+                    aggregate.sample_actor_ids.remove(event.sender_id)
+                else:
+                    aggregate.actor_count += 1
+                aggregate.sample_actor_ids = [event.sender_id] + aggregate.sample_actor_ids[:sample_size - 1]
+                aggregate.sender_id = event.sender_id
+                aggregate.message = event.message
+                aggregate.timestamp = event.timestamp
+
+        if updated:
+            Notification.objects.bulk_update(
+                updated, ['actor_count', 'sample_actor_ids', 'sender', 'message', 'timestamp'], batch_size=self.batch_size
+            )
+        if created:
+            Notification.objects.bulk_create(created, batch_size=self.batch_size)
+
+    def _spill(self, events):
+        NotificationOutbox.objects.bulk_create([
+            NotificationOutbox(
+                user_id=event.user_id,
+                sender_id=event.sender_id,
+                post_id=event.post_id,
+                notification_type=event.notification_type,
+                message=event.message,
+                timestamp=event.timestamp,
+            )
+            for event in events
+        ], batch_size=self.batch_size)
+        self._count('spilled', len(events))
+
+    def drain_outbox(self, batch_size=None):
+        """Write spilled events in id order; returns how many were delivered.
+
+        A batch that fails is retried one row at a time, so one bad row can't
+        hold back the rows after it. Each failure bumps the row's `attempts`;
+        at NOTIFICATION_OUTBOX_MAX_ATTEMPTS it is dead-lettered, kept for
+        inspection but skipped by later runs.
+        """
+        batch_size = batch_size or self.batch_size
+        max_attempts = getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 5)
+        delivered = 0
+        last_id = 0
+        while True:
+            rows = list(NotificationOutbox.objects.filter(dead_lettered=False, id__gt=last_id).order_by('id')[:batch_size])
+            if not rows:
+                return delivered
+            last_id = rows[-1].id
+            try:
+                self._replay(rows)
+                delivered += len(rows)
+                continue
+            except Exception:
+                logger.warning("Replaying %d outbox rows failed; retrying them one at a time", len(rows))
+            for row in rows:
+                try:
+                    self._replay([row])
+                    delivered += 1
+                except Exception:
+                    row.attempts += 1
+                    row.dead_lettered = row.attempts >= max_attempts
+                    row.save(update_fields=['attempts', 'dead_lettered'])
+                    logger.exception(
+                        "Outbox row %s failed (attempt %d)%s", row.id, row.attempts,
+                        "; dead-lettered" if row.dead_lettered else "",
+                    )
+
+    def _replay(self, rows):
+        events = [
+            NotificationEvent(row.user_id, row.sender_id, row.post_id, row.notification_type, row.message, row.timestamp)
+            for row in rows
+        ]
+        # Write and delete together; a failure leaves the rows for the next run
+        with transaction.atomic():
+            self.write_batch(events)
+            NotificationOutbox.objects.filter(id__in=[row.id for row in rows]).delete()
+
+    def flush(self, timeout=None):
+        """Block until every queued event has been written (or spilled)."""
+        if self._queue is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def shutdown(self, timeout=5):
+        """Stop the workers; events they don't get to in time go to the outbox."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+            if self._queue is None:
+                return
+            for _ in workers:
+                self._queue.put(_STOP)
+        for worker in workers:
+            worker.join(timeout)
+
+        leftover = []
+        while True:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            if event is not _STOP:
+                leftover.append(event)
+        if leftover:
+            try:
+                self._spill(leftover)
+            except Exception:
+                logger.exception("Lost %d notifications at shutdown", len(leftover))
+
+    def _count(self, name, amount=1):
+        with self._metrics_lock:
+            self._metrics[name] += amount
+
+    def reset_metrics(self):
+        with self._metrics_lock:
+            self._metrics = {
+                'enqueued': 0, 'written': 0, 'spilled': 0, 'batches': 0, 'last_batch_size': 0, 'max_batch_size': 0,
+            }
+
+    def metrics(self):
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics['mode'] = dispatch_mode()
+        metrics['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        metrics['workers_alive'] = sum(worker.is_alive() for worker in self._workers)
+        metrics['avg_batch_size'] = round(metrics['written'] / metrics['batches'], 2) if metrics['batches'] else None
+        metrics['outbox_depth'] = NotificationOutbox.objects.filter(dead_lettered=False).count()
+        metrics['outbox_dead_lettered'] = NotificationOutbox.objects.filter(dead_lettered=True).count()
+        return metrics
+
+
+dispatcher = NotificationDispatcher()
+atexit.register(dispatcher.shutdown)
@@ -0,0 +1,93 @@
+from django.db import IntegrityError, transaction
+
+from .cache import post_cache
+from .models import Post
+from .timeline import fan_out_post
+from .utils import create_notification, update_post_counter
+
+
+class AlreadyReposted(Exception):
+    pass
+
+
+def original_of(post):
+    """The post a repost points at; reposting a repost shares the original it points at."""
+    if post.shared_post_id is None:
+        return post
+    return Post.objects.select_related('author').get(id=post.shared_post_id)
+
+
+def create_repost(user, post, content=''):
+    """Repost `post` (or the original behind it) to `user`'s followers, with an optional comment."""
+    original = original_of(post)
+    try:
+        with transaction.atomic():
+            repost = Post.objects.create(author=user, content=content, shared_post=original)
+            update_post_counter(original.id, 'repost_count', 1)
+    except IntegrityError:
+        # posts_post_one_repost_per_author
+        raise AlreadyReposted()
+
+    # Match the F() increment, so the original embedded in the response (and cached) isn't stale
+    original.repost_count += 1
+    repost.shared_post = original
+    fan_out_post(repost)
+    # New post: list ETags must change
+    post_cache.invalidate([repost.id])
+    if original.author_id != user.id:
+        create_notification(
+            user=original.author,
+            sender=user,
+            post=original,
+            notification_type="repost",
+            message=f"{user.username} reposted your post."
+        )
+    return repost
+
+
+def delete_repost(repost):
+    with transaction.atomic():
+        repost.delete()
+        update_post_counter(repost.shared_post_id, 'repost_count', -1)
+
+
+# ============ Original post resolution =============
+
+def _originals_to_load(posts):
+    # Reposts on the page whose original isn't attached yet, and the originals not on the page themselves
+    shared_post = Post._meta.get_field('shared_post')
+    pending = [post for post in posts if post.shared_post_id is not None and not shared_post.is_cached(post)]
+    on_page = {post.id: post for post in posts}
+    return pending, on_page, {post.shared_post_id for post in pending} - on_page.keys()
+
+
+def _attach_originals(pending, originals):
+    for post in pending:
+        original = originals.get(post.shared_post_id)
+        if original is not None:
+            post.shared_post = original
+
+
+def load_originals(posts):
+    """Attach the original of every repost in `posts`, fetched in one query for all of them.
+
+    Each original is fetched once, however many reposts of it are in `posts`.
+    Originals that are in `posts` themselves aren't fetched at all.
+    PostSerializer embeds what is attached here.
+    """
+    posts = list(posts)
+    pending, originals, missing = _originals_to_load(posts)
+    if missing:
+        originals = originals | Post.objects.select_related('author').in_bulk(missing)
+    _attach_originals(pending, originals)
+    return posts
+
+
+async def aload_originals(posts):
+    """`load_originals` through the async ORM, for the async views."""
+    posts = list(posts)
+    pending, originals, missing = _originals_to_load(posts)
+    if missing:
+        originals = originals | await Post.objects.select_related('author').ain_bulk(missing)
+    _attach_originals(pending, originals)
+    return posts
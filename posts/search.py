@@ -0,0 +1,155 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Post, PostSearchTerm
+
+
+_TOKEN = re.compile(r'\w+')
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have i if in into is it its of on or so '
+    'that the their then there these they this to was we were will with you your'.split()
+)
+MAX_TERM_LENGTH = 64
+# idf only needs the number of posts roughly, so it is counted at most this often (seconds)
+DOCUMENT_COUNT_TIMEOUT = 300
+
+
+def tokenize(text):
+    """Lowercased word tokens without stop words, the unit of the inverted index."""
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in _TOKEN.findall((text or '').lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+# ============ Search Backends =============
+
+class SearchBackend:
+    """Ranked full-text search over posts.
+
+    `search()` narrows an already filtered Post queryset to the matching posts,
+    annotates a `rank` and orders by it, so author/date filters and pagination
+    compose with the search unchanged.
+    """
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def index_posts(self, posts, created=False):
+        """Bring the index up to date for `posts` after they were saved.
+
+        `created` tells the backend the posts were never indexed before.
+        """
+
+    def rebuild(self, batch_size=1000):
+        """Reindex every post; returns the number of posts processed."""
+        return 0
+
+
+class PostgresSearchBackend(SearchBackend):
+    """`posts_post.search_vector`, a generated tsvector column behind a GIN index.
+
+    Postgres recomputes the column on every INSERT/UPDATE, so there is nothing to
+    index from Python. The column only exists on Postgres (see migration 0006).
+    """
+    config = 'english'
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+
+        search_query = SearchQuery(query, config=self.config, search_type='websearch')
+        vector = RawSQL(f'{connection.ops.quote_name(Post._meta.db_table)}."search_vector"', [], output_field=SearchVectorField())
+        return (
+            queryset.annotate(search_vector=vector)
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', '-timestamp', '-id')
+        )
+
+
+class InvertedIndexSearchBackend(SearchBackend):
+    """Term -> post postings in PostSearchTerm, ranked by tf-idf.
+
+    Used for SQLite development and tests. Every query term must match (AND).
+    """
+
+    def search(self, queryset, query):
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return queryset.none()
+
+        document_frequency = dict(
+            PostSearchTerm.objects.filter(term__in=terms).values_list('term').annotate(total=Count('id'))
+        )
+        if len(document_frequency) < len(terms):
+            return queryset.none()
+
+        documents = max(self.document_count(), 1)
+        weights = [
+            When(search_terms__term=term, then=F('search_terms__frequency') * Value(math.log(1 + documents / total)))
+            for term, total in document_frequency.items()
+        ]
+        return (
+            queryset.filter(search_terms__term__in=terms)
+            .annotate(
+                matched_terms=Count('search_terms'),
+                rank=Sum(Case(*weights, default=Value(0.0), output_field=FloatField())),
+            )
+            .filter(matched_terms=len(terms))
+            .order_by('-rank', '-timestamp', '-id')
+        )
+
+    def document_count(self):
+        """Number of posts, for idf; cached rather than counted on every search."""
+        return cache.get_or_set('search:document-count', Post.objects.count, DOCUMENT_COUNT_TIMEOUT)
+
+    def index_posts(self, posts, created=False):
+        posts = list(posts)
+        postings = [
+            PostSearchTerm(post_id=post.id, term=term, frequency=min(frequency, 32767))
+            for post in posts
+            for term, frequency in Counter(tokenize(post.content)).items()
+        ]
+        if created:
+            PostSearchTerm.objects.bulk_create(postings, batch_size=5000)
+            return
+        with transaction.atomic():
+            PostSearchTerm.objects.filter(post_id__in=[post.id for post in posts]).delete()
+            PostSearchTerm.objects.bulk_create(postings, batch_size=5000)
+
+    def rebuild(self, batch_size=1000):
+        total = 0
+        last_id = 0
+        while True:
+            batch = list(Post.objects.filter(id__gt=last_id).order_by('id').only('id', 'content')[:batch_size])
+            if not batch:
+                return total
+            self.index_posts(batch)
+            total += len(batch)
+            last_id = batch[-1].id
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_search_backend():
+    """settings.POST_SEARCH_BACKEND, defaulting to Postgres full-text search when available."""
+    path = getattr(settings, 'POST_SEARCH_BACKEND', None)
+    if not path:
+        if connection.vendor == 'postgresql':
+            path = 'posts.search.PostgresSearchBackend'
+        else:
+            path = 'posts.search.InvertedIndexSearchBackend'
+    return _load_backend(path)
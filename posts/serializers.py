@@ -1,24 +1,122 @@
 from rest_framework import serializers
-from .models import Post, Like, Comment, Notification, DirectMessage
+from django.contrib.auth.models import User
+from .models import Post, Like, Comment, Notification, DirectMessage, ConversationParticipant, MediaUpload
+from .cache import post_cache
+from .reposts import load_originals
+from .uploads import CompletedUploadField, claim_upload
+from social_media_api.media import RenditionsField
 
 
 
 # ============ Post Serializer =============
 
+def _render_fragments(serializer_class, posts):
+    # Fragments are request-independent so they can be shared; media stays a relative URL
+    fragment_serializer = serializer_class(context={})
+    return [fragment_serializer.serialize_fragment(post) for post in posts]
+
+
+def _absolute_media(data, context):
+    request = context.get('request')
+    if request is None:
+        return data
+    if data.get('media') and data['media'].startswith('/'):
+        data['media'] = request.build_absolute_uri(data['media'])
+    renditions = data.get('media_renditions')
+    if renditions:
+        data['media_renditions'] = {
+            size_name: request.build_absolute_uri(url) if url.startswith('/') else url
+            for size_name, url in renditions.items()
+        }
+    return data
+
+
+def _assemble(serializer_class, posts, context):
+    """Fragments for `posts` with each repost's original embedded as `original_post`.
+
+    Fragments hold only the original's id, so likes on an original never
+    invalidate its reposts. The originals are resolved for the whole page by
+    load_originals (async callers run aload_originals first). Their fragments
+    come from the same cache.
+    """
+    render = lambda misses: _render_fragments(serializer_class, misses)
+    posts = load_originals(posts)
+    fragments = post_cache.get_many(posts, render)
+
+    shared_post = Post._meta.get_field('shared_post')
+    originals = {post.shared_post_id: post.shared_post for post in posts
+                 if post.shared_post_id is not None and shared_post.is_cached(post)}
+    embedded = dict(zip(originals, post_cache.get_many(list(originals.values()), render))) if originals else {}
+    for fragment in fragments:
+        if fragment.get('shared_post') is not None:
+            original = embedded.get(fragment['shared_post'])
+            fragment['original_post'] = _absolute_media(dict(original), context) if original else None
+        else:
+            fragment['original_post'] = None
+    return [_absolute_media(fragment, context) for fragment in fragments]
+
+
+class PostListSerializer(serializers.ListSerializer):
+    # Assemble a page from cached fragments with one multi-get instead of re-serializing every post
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        return _assemble(type(self.child), posts, self.context)
+
+
 class PostSerializer(serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username') # Display the username of the author
+    comment_counts = serializers.IntegerField(source='comment_count', read_only=True)
+    # {size name: URL} once media_status is 'ready'
+    media_renditions = RenditionsField('media')
+    # Id of a finished resumable upload (api/posts/uploads/), instead of sending `media` inline
+    media_upload = CompletedUploadField(MediaUpload.Target.POST_MEDIA)
+    # `shared_post` is the id of the post this one reposts. The original itself is
+    # added as `original_post` when the page is assembled (see _assemble)
 
     class Meta:
         model = Post
-        fields = ['id', 'author', 'content', 'media', 'like_count', 'comment_counts', 'timestamp' ]
-        read_only_fields = ['id', 'author','like_count', 'comment_counts', 'timestamp']
+        fields = ['id', 'author', 'content', 'media', 'media_upload', 'media_status', 'media_renditions', 'shared_post', 'like_count', 'comment_counts', 'repost_count', 'timestamp' ]
+        read_only_fields = ['id', 'author', 'media_status', 'shared_post', 'like_count', 'comment_counts', 'repost_count', 'timestamp']
+        list_serializer_class = PostListSerializer
+
+    def validate(self, attrs):
+        upload = attrs.pop('media_upload', None)
+        if upload is not None:
+            if attrs.get('media'):
+                raise serializers.ValidationError("Send either media or media_upload, not both.")
+            attrs['media'] = claim_upload(upload)
+        return attrs
+
+    def serialize_fragment(self, instance):
+        return super().to_representation(instance)
+
+    def to_representation(self, instance):
+        fragment, = _assemble(type(self), [instance], self.context)
+        return fragment
+
+
+# ============ Media Upload Serializers =============
+
+class MediaUploadCreateSerializer(serializers.Serializer):
+    target = serializers.ChoiceField(choices=MediaUpload.Target.choices)
+    filename = serializers.CharField(max_length=100)
+    size = serializers.IntegerField(min_value=1)
+
+
+class MediaUploadSerializer(serializers.ModelSerializer):
+    complete = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = MediaUpload
+        fields = ['id', 'target', 'size', 'offset', 'complete', 'format', 'width', 'height', 'expires_at']
+        read_only_fields = fields
 
 
 # ============ Like Serializer =============
 
 class LikeSerializer(serializers.ModelSerializer):
     user = serializers.ReadOnlyField(source='user.username')
-    post = serializers.ReadOnlyField(source='post.id')
+    post = serializers.ReadOnlyField(source='post_id')
 
     class Meta:
         model = Like
@@ -29,7 +127,7 @@ class LikeSerializer(serializers.ModelSerializer):
 
 class CommentSerializer(serializers.ModelSerializer):
     user = serializers.ReadOnlyField(source='user.username')
-    post = serializers.ReadOnlyField(source='post.id')
+    post = serializers.ReadOnlyField(source='post_id')
 
     class Meta:
         model = Comment
@@ -64,11 +162,82 @@ class SentMessageSerializer(serializers.ModelSerializer):
         model = DirectMessage
         fields = ['id', 'recipient', 'is_read', 'timestamp']
 
+# ============ Conversation Serializer =============
+
+class ConversationSerializer(serializers.ModelSerializer):
+    # One row of a user's chat list; expects conversation__user_low/user_high and
+    # conversation__last_message to be select_related
+    id = serializers.ReadOnlyField(source='conversation_id')
+    participant = serializers.SerializerMethodField()
+    last_message = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ConversationParticipant
+        fields = ['id', 'participant', 'unread_count', 'last_message_at', 'last_message']
+
+    def _usernames(self, obj):
+        conversation = obj.conversation
+        return {conversation.user_low_id: conversation.user_low.username, conversation.user_high_id: conversation.user_high.username}
+
+    def get_participant(self, obj):
+        conversation = obj.conversation
+        other = conversation.user_high if conversation.user_low_id == obj.user_id else conversation.user_low
+        return other.username
+
+    def get_last_message(self, obj):
+        message = obj.conversation.last_message
+        if message is None:
+            return None
+        return {
+            'id': message.id,
+            'sender': self._usernames(obj)[message.sender_id],
+            'content': message.content,
+            'timestamp': serializers.DateTimeField().to_representation(message.timestamp),
+        }
+
 # ============ Notification Serializer =============
 
+NOTIFICATION_VERBS = {
+    'like': 'liked your post',
+    'comment': 'commented on your post',
+    'repost': 'reposted your post',
+}
+
+
 class NotificationSerializer(serializers.ModelSerializer):
+    # Coalesced rows are rendered as "alice and 41 others liked your post". Pass
+    # context={'actor_names': {id: username}} to resolve the sample actors in bulk.
     sender = serializers.ReadOnlyField(source='sender.username')
+    sample_actors = serializers.SerializerMethodField()
+    summary = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
-        fields = ['id', 'sender', 'post', 'notification_type', 'message', 'is_read', 'timestamp']
+        fields = ['id', 'sender', 'post', 'notification_type', 'message', 'actor_count', 'sample_actors', 'summary',
+                  'is_read', 'timestamp']
+
+    def get_sample_actors(self, obj):
+        names = self.context.get('actor_names', {})
+        if not obj.sample_actor_ids:
+            return [obj.sender.username]
+        return [names[actor_id] for actor_id in obj.sample_actor_ids if actor_id in names]
+
+    def get_summary(self, obj):
+        verb = NOTIFICATION_VERBS.get(obj.notification_type)
+        if verb is None or obj.actor_count <= 1:
+            return obj.message
+        others = obj.actor_count - 1
+        return f"{obj.sender.username} and {others} other{'s' if others > 1 else ''} {verb}."
+
+    @staticmethod
+    def actor_names(notifications):
+        # One query for every sample actor on the page
+        actor_ids = {actor_id for notification in notifications for actor_id in notification.sample_actor_ids}
+        return dict(User.objects.filter(id__in=actor_ids).values_list('id', 'username')) if actor_ids else {}
+
+    @staticmethod
+    async def aactor_names(notifications):
+        actor_ids = {actor_id for notification in notifications for actor_id in notification.sample_actor_ids}
+        if not actor_ids:
+            return {}
+        return {pk: username async for pk, username in User.objects.filter(id__in=actor_ids).values_list('id', 'username')}
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from social_media_api.media import renditions_ready
+from .cache import post_cache
+from .models import Post
+from .search import get_search_backend
+
+@receiver(post_save, sender=Post)
+def index_post_for_search(sender, instance, created, update_fields=None, **kwargs):
+    # Counter updates don't touch the content, so skip reindexing them
+    if update_fields is not None and 'content' not in update_fields:
+        return
+    get_search_backend().index_posts([instance], created=created)
+
+@receiver(renditions_ready, sender=Post)
+def invalidate_post_media(sender, instance, **kwargs):
+    # Cached fragments still say 'pending'
+    post_cache.invalidate([instance.pk])
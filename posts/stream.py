@@ -0,0 +1,79 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from social_media_api.pubsub import get_broker, user_channel
+from users.authentication import ClaimsJWTAuthentication
+
+
+def _authenticate(request):
+    # EventSource can't send headers, so the access token may also come as ?token=
+    authentication = ClaimsJWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else request.GET.get('token', '').encode() or None
+    if raw_token is None:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    finally:
+        # Runs on a pool thread (thread_sensitive=False), outside the request's connection handling
+        close_old_connections()
+
+
+def format_event(event, name=None):
+    lines = []
+    if name:
+        lines.append(f'event: {name}')
+    lines.append(f'data: {json.dumps(event, default=str)}')
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+async def event_stream(channel):
+    # Subscribing here rather than in the view ties the subscription's lifetime
+    # to the generator, so a client that disconnects early can't leak it
+    heartbeat = getattr(settings, 'REALTIME_HEARTBEAT_SECONDS', 15)
+    subscription = get_broker().subscribe(channel)
+    try:
+        yield b'retry: 5000\n\n'
+        while True:
+            try:
+                event = await subscription.get(timeout=heartbeat)
+            except subscription.Overflow:
+                # We dropped events for this client; it should refetch over REST
+                yield format_event({'type': 'resync'}, name='resync')
+                continue
+            if event is None:
+                # Comment line: keeps proxies from closing an idle connection
+                yield b': keepalive\n\n'
+            else:
+                yield format_event(event, name=event.get('type'))
+    finally:
+        subscription.close()
+
+
+# ============ Activity Stream View =============
+
+@require_GET
+async def activity_stream(request):
+    """Server-Sent Events stream of the user's new notifications and direct messages.
+
+    Each connection is one idle coroutine under an ASGI server (see Procfile).
+    Under WSGI it would hold a whole worker thread.
+    """
+    user = await sync_to_async(_authenticate, thread_sensitive=False)(request)
+    if user is None:
+        user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    response = StreamingHttpResponse(event_stream(user_channel(user.id)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
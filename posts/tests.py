@@ -1,3 +1,1209 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import shutil
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.settings import api_settings
+from rest_framework.test import APITestCase
+from PIL import Image
+
+from social_media_api.querybudget import QueryBudgetExceeded, QueryBudgetTestMixin
+from social_media_api.throttling import SlidingWindowThrottle, parse_rate
+from social_media_api.pubsub import InProcessBroker, publish_to_user
+from social_media_api.media import media_processor
+from social_media_api.deployment import require_shared_broker, require_shared_cache
+from rest_framework_simplejwt.tokens import AccessToken
+from users.models import Follow
+from .models import (
+    Post, Comment, Like, DirectMessage, Notification, NotificationOutbox, ConversationParticipant, MediaUpload, PostSearchTerm,
+    TimelineEntry,
+)
+from .cache import post_cache
+from .conversations import send_direct_message
+from .notifications import NotificationDispatcher
+from .reposts import create_repost
+from .search import InvertedIndexSearchBackend, PostgresSearchBackend, get_search_backend
+from .timeline import HybridFeed, backfill_timeline, fan_out_post, rebuild_timeline, timeline_posts
+from .uploads import write_chunk
+from .utils import reconcile_post_counters, update_post_counter, update_post_counters
+from .views import (
+    PostListView, PostCreateView, PostRetrieveUpdateDestroyView, FeedView, LikePostView, UnlikePostView,
+    CommentPostView, PostCommentsView, SendMessageView, InboxView, SentMessagesView, MessageDetailView,
+    DeleteMessageView, ConversationListView, ConversationMessagesView, NotificationListView, UnreadNotificationCountView, MarkNotificationsReadView,
+    BulkPostFetchView, BulkLikeView, BulkUnlikeView, MediaUploadCreateView, MediaUploadDetailView, RepostView,
+)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+)
+class PostsQueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+    # Every list is seeded with several rows so an N+1 shows up as a repeated query
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', password='pass')
+        self.authors = [User.objects.create_user(f'author{i}', password='pass') for i in range(5)]
+        for author in self.authors:
+            Follow.objects.create(follower=self.user, following=author)
+            Follow.objects.create(follower=author, following=self.user)
+            for i in range(2):
+                post = Post.objects.create(author=author, content=f'{author.username} post {i}')
+                Comment.objects.create(user=author, post=post, content='first')
+                Comment.objects.create(user=self.user, post=post, content='second')
+            send_direct_message(author, self.user, 'hi')
+            send_direct_message(author, self.user, 'hi again')
+            Notification.objects.create(user=self.user, sender=author, notification_type='like', message='liked')
+        rebuild_timeline(self.user)
+        self.post = Post.objects.filter(author=self.authors[0]).first()
+        self.own_post = Post.objects.create(author=self.user, content='mine')
+        self.client.force_authenticate(self.user)
+
+    def test_post_list(self):
+        with self.assertWithinQueryBudget(PostListView):
+            response = self.client.get('/', {'page_size': 50})
+        self.assertEqual(response.status_code, 200)
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(ids, list(Post.objects.order_by('-timestamp', '-id').values_list('id', flat=True)[:len(ids)]))
+
+    def test_post_list_cursor(self):
+        with self.assertWithinQueryBudget(PostListView):
+            response = self.client.get('/', {'cursor': '', 'page_size': 50})
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_create(self):
+        with self.assertWithinQueryBudget(PostCreateView, 'post'):
+            response = self.client.post('/api/posts/create/', {'content': 'new'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_post_detail(self):
+        with self.assertWithinQueryBudget(PostRetrieveUpdateDestroyView, 'get'):
+            response = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_update(self):
+        with self.assertWithinQueryBudget(PostRetrieveUpdateDestroyView, 'put'):
+            response = self.client.put(f'/api/posts/{self.own_post.id}/', {'content': 'edited'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_delete(self):
+        with self.assertWithinQueryBudget(PostRetrieveUpdateDestroyView, 'delete'):
+            response = self.client.delete(f'/api/posts/{self.own_post.id}/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_feed(self):
+        with self.assertWithinQueryBudget(FeedView):
+            response = self.client.get('/api/posts/feed/', {'page_size': 50})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 10)
+
+    def test_feed_cursor(self):
+        with self.assertWithinQueryBudget(FeedView):
+            response = self.client.get('/api/posts/feed/', {'cursor': '', 'page_size': 50})
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_like_and_unlike(self):
+        with self.assertWithinQueryBudget(LikePostView, 'post'):
+            response = self.client.post(f'/api/posts/like/{self.post.id}/')
+        self.assertEqual(response.status_code, 201)
+        with self.assertWithinQueryBudget(UnlikePostView, 'delete'):
+            response = self.client.delete(f'/api/posts/unlike/{self.post.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_create_edit_delete(self):
+        with self.assertWithinQueryBudget(CommentPostView, 'post'):
+            response = self.client.post(f'/api/posts/{self.post.id}/comment/', {'content': 'nice'})
+        self.assertEqual(response.status_code, 201)
+        comment = Comment.objects.filter(user=self.user, post=self.post).latest('id')
+        with self.assertWithinQueryBudget(CommentPostView, 'put'):
+            response = self.client.put(f'/api/posts/{self.post.id}/comments/{comment.id}/', {'content': 'edited'})
+        self.assertEqual(response.status_code, 200)
+        with self.assertWithinQueryBudget(CommentPostView, 'delete'):
+            response = self.client.delete(f'/api/posts/{self.post.id}/comments/{comment.id}/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_post_comments(self):
+        with self.assertWithinQueryBudget(PostCommentsView):
+            response = self.client.get(f'/api/posts/{self.post.id}/comments/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_send_message(self):
+        with self.assertWithinQueryBudget(SendMessageView, 'post'):
+            response = self.client.post('/api/posts/messages/send/', {
+                'recipient': self.authors[0].username, 'content': 'hey', 'post_id': self.post.id,
+            })
+        self.assertEqual(response.status_code, 201)
+
+    def test_first_message_opens_conversation(self):
+        newcomer = User.objects.create_user('newcomer', password='pass')
+        with self.assertWithinQueryBudget(SendMessageView, 'post'):
+            response = self.client.post('/api/posts/messages/send/', {'recipient': 'newcomer', 'content': 'welcome'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ConversationParticipant.objects.get(user=newcomer).unread_count, 1)
+
+    def test_inbox_and_sent(self):
+        with self.assertWithinQueryBudget(InboxView):
+            response = self.client.get('/api/posts/messages/inbox/')
+        self.assertEqual(len(response.data), 10)
+        DirectMessage.objects.bulk_create([
+            DirectMessage(sender=self.user, recipient=author, content='hello') for author in self.authors
+        ])
+        with self.assertWithinQueryBudget(SentMessagesView):
+            response = self.client.get('/api/posts/messages/sent/')
+        self.assertEqual(len(response.data), 5)
+
+    def test_message_detail_and_delete(self):
+        message = DirectMessage.objects.filter(recipient=self.user).first()
+        with self.assertWithinQueryBudget(MessageDetailView):
+            response = self.client.get(f'/api/posts/messages/{message.id}/detail/')
+        self.assertEqual(response.status_code, 200)
+        with self.assertWithinQueryBudget(DeleteMessageView, 'delete'):
+            response = self.client.delete(f'/api/posts/messages/{message.id}/delete/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_conversation_list(self):
+        with self.assertWithinQueryBudget(ConversationListView):
+            response = self.client.get('/api/posts/conversations/', {'page_size': 3})
+        self.assertEqual([row['participant'] for row in response.data['results']], ['author4', 'author3', 'author2'])
+        self.assertEqual(response.data['results'][0]['unread_count'], 2)
+        self.assertEqual(response.data['results'][0]['last_message']['content'], 'hi again')
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_conversation_messages_marks_thread_read(self):
+        participant = ConversationParticipant.objects.get(user=self.user, conversation__user_low=self.user,
+                                                          conversation__user_high=self.authors[0])
+        with self.assertWithinQueryBudget(ConversationMessagesView):
+            response = self.client.get(f'/api/posts/conversations/{participant.conversation_id}/messages/', {'page_size': 1})
+        self.assertEqual([message['content'] for message in response.data['results']], ['hi again'])
+        participant.refresh_from_db()
+        self.assertEqual(participant.unread_count, 0)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([message['content'] for message in response.data['results']], ['hi'])
+
+        stranger = User.objects.create_user('stranger', password='pass')
+        self.client.force_authenticate(stranger)
+        response = self.client.get(f'/api/posts/conversations/{participant.conversation_id}/messages/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_deleting_last_message_moves_conversation_pointer(self):
+        participant = ConversationParticipant.objects.get(user=self.user, conversation__user_high=self.authors[0])
+        last = participant.conversation.last_message
+        with self.assertWithinQueryBudget(DeleteMessageView, 'delete'):
+            self.client.delete(f'/api/posts/messages/{last.id}/delete/')
+        participant.refresh_from_db()
+        self.assertEqual(participant.conversation.last_message.content, 'hi')
+        self.assertEqual(participant.unread_count, 1)
+
+    def test_notifications(self):
+        with self.assertWithinQueryBudget(NotificationListView):
+            response = self.client.get('/api/posts/notifications/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_notifications_cursor_unread(self):
+        Notification.objects.filter(user=self.user, sender=self.authors[0]).update(is_read=True)
+        with self.assertWithinQueryBudget(NotificationListView):
+            response = self.client.get('/api/posts/notifications/', {'cursor': '', 'unread': 'true', 'page_size': 3})
+        self.assertEqual(len(response.data['results']), 3)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_unread_count_and_mark_read(self):
+        with self.assertWithinQueryBudget(UnreadNotificationCountView):
+            response = self.client.get('/api/posts/notifications/unread-count/')
+        self.assertEqual(response.data['unread_count'], 5)
+
+        first = Notification.objects.filter(user=self.user).first()
+        with self.assertWithinQueryBudget(MarkNotificationsReadView, 'post'):
+            response = self.client.post('/api/posts/notifications/mark-read/', {'ids': [first.id]}, format='json')
+        self.assertEqual(response.data['marked_read'], 1)
+        response = self.client.post('/api/posts/notifications/mark-read/', {}, format='json')
+        self.assertEqual(response.data['marked_read'], 4)
+        self.assertEqual(self.client.get('/api/posts/notifications/unread-count/').data['unread_count'], 0)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+@modify_settings(MIDDLEWARE={'prepend': 'social_media_api.querybudget.QueryBudgetMiddleware'})
+class QueryBudgetMiddlewareTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pass')
+        self.client.force_authenticate(self.user)
+
+    def test_reports_query_count_and_budget(self):
+        response = self.client.get('/api/posts/notifications/')
+        self.assertEqual(response['X-Query-Budget'], str(NotificationListView.query_budget))
+        self.assertLessEqual(int(response['X-Query-Count']), NotificationListView.query_budget)
+        self.assertIn('X-Query-Time-Ms', response)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_strict_mode_rejects_requests_over_budget(self):
+        with mock.patch.object(NotificationListView, 'query_budget', 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/posts/notifications/')
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+)
+@modify_settings(MIDDLEWARE={'prepend': 'social_media_api.querybudget.QueryBudgetMiddleware'})
+class AsyncReadViewTests(APITestCase):
+    # The async endpoints must return what their sync twins return. The ORM runs
+    # off the test's context here, so budgets are read from the middleware headers.
+    setUp = PostsQueryBudgetTests.setUp
+
+    async def get(self, path, params=None, **kwargs):
+        response = await self.async_client.get(path, params or {}, headers={
+            'Authorization': f'Bearer {AccessToken.for_user(self.user)}',
+        }, **kwargs)
+        if 'X-Query-Budget' in response:
+            self.assertLessEqual(int(response['X-Query-Count']), int(response['X-Query-Budget']))
+        return response
+
+    async def assertMatchesSync(self, async_path, sync_path, params=None):
+        params = {'cursor': '', 'page_size': 50, **(params or {})}
+        response = await self.get(async_path, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Query-Budget', response)
+        expected = await sync_to_async(self.client.get)(sync_path, params)
+        self.assertEqual(response.json(), expected.json())
+        return response.json()
+
+    async def test_feed(self):
+        data = await self.assertMatchesSync('/api/async/posts/feed/', '/api/posts/feed/')
+        self.assertEqual(len(data['results']), 10)
+
+    async def test_post_list(self):
+        await self.assertMatchesSync('/api/async/posts/', '/', {'author': 'author1'})
+
+    async def test_post_detail(self):
+        response = await self.get(f'/api/async/posts/{self.post.id}/')
+        self.assertEqual(response.json()['content'], self.post.content)
+        response = await self.get('/api/async/posts/0/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_reposts_embed_their_original(self):
+        repost = await sync_to_async(create_repost)(self.user, self.post)
+        response = await self.get(f'/api/async/posts/{repost.id}/')
+        self.assertEqual(response.json()['original_post']['id'], self.post.id)
+        await self.assertMatchesSync('/api/async/posts/', '/', {'author': 'reader'})
+
+    async def test_comments(self):
+        await self.assertMatchesSync(f'/api/async/posts/{self.post.id}/comments/', f'/api/posts/{self.post.id}/comments/')
+
+    async def test_notifications(self):
+        await self.assertMatchesSync('/api/async/notifications/', '/api/posts/notifications/')
+
+    async def test_follow_lists(self):
+        await self.assertMatchesSync('/api/async/users/followers/reader/', '/api/users/followers/reader/')
+        await self.assertMatchesSync('/api/async/users/following/reader/', '/api/users/following/reader/')
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get('/api/async/notifications/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_fragment_cache_is_read_off_the_event_loop(self):
+        loops = []
+        get_many = post_cache.get_many
+
+        def recording_get_many(*args, **kwargs):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+            return get_many(*args, **kwargs)
+
+        with mock.patch.object(post_cache, 'get_many', recording_get_many):
+            await self.get('/api/async/posts/feed/', {'cursor': ''})
+            await self.get(f'/api/async/posts/{self.post.id}/')
+        self.assertTrue(loops)
+        self.assertEqual(set(loops), {None})
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+)
+class TimelineTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass')
+        self.readers = [User.objects.create_user(f'reader{i}', password='pass') for i in range(3)]
+        for reader in self.readers:
+            Follow.objects.create(follower=reader, following=self.author)
+
+    def timeline_ids(self, user):
+        return list(timeline_posts(user).values_list('post_id', flat=True))
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.post('/api/posts/create/', {'content': 'hello'})
+        for reader in self.readers:
+            self.assertEqual(self.timeline_ids(reader), [response.data['id']])
+        self.assertEqual(self.timeline_ids(self.author), [])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        posts = [Post.objects.create(author=self.author, content=f'post {i}') for i in range(3)]
+        other = Post.objects.create(author=self.readers[0], content='other')
+        newcomer = User.objects.create_user('newcomer', password='pass')
+        self.client.force_authenticate(newcomer)
+        self.client.post('/api/users/follow/author/')
+        self.client.post('/api/users/follow/reader0/')
+        self.assertEqual(self.timeline_ids(newcomer), [other.id] + [post.id for post in reversed(posts)])
+        self.client.delete('/api/users/unfollow/author/')
+        self.assertEqual(self.timeline_ids(newcomer), [other.id])
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_timelines_are_trimmed_to_the_newest_posts(self):
+        posts = [Post.objects.create(author=self.author, content=f'post {i}') for i in range(4)]
+        for post in posts:
+            fan_out_post(post)
+        self.assertEqual(self.timeline_ids(self.readers[0]), [posts[3].id, posts[2].id])
+
+        newcomer = User.objects.create_user('newcomer', password='pass')
+        Follow.objects.create(follower=newcomer, following=self.author)
+        backfill_timeline(newcomer, self.author)
+        self.assertEqual(self.timeline_ids(newcomer), [posts[3].id, posts[2].id])
+
+    def test_rebuild_timelines_command(self):
+        posts = [Post.objects.create(author=self.author, content=f'post {i}') for i in range(2)]
+        TimelineEntry.objects.create(user=self.readers[0], post=posts[0], author=self.author, timestamp=posts[0].timestamp)
+        stranger = User.objects.create_user('stranger', password='pass')
+        stale = Post.objects.create(author=stranger, content='not followed')
+        TimelineEntry.objects.create(user=self.readers[0], post=stale, author=stranger, timestamp=stale.timestamp)
+
+        out = io.StringIO()
+        call_command('rebuild_timelines', 'reader0', stdout=out)
+        self.assertIn('Rebuilt 1 timelines (2 entries)', out.getvalue())
+        self.assertEqual(self.timeline_ids(self.readers[0]), [posts[1].id, posts[0].id])
+        self.assertEqual(self.timeline_ids(self.readers[1]), [])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_timelines', 'nobody', stdout=out)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+    FEED_CELEBRITY_FOLLOWER_THRESHOLD=2,
+)
+class HybridFeedTests(QueryBudgetTestMixin, APITestCase):
+    # `celebrity` has three followers, over the threshold of two; `friend` has one
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user('reader', password='pass')
+        self.friend = User.objects.create_user('friend', password='pass')
+        self.celebrity = User.objects.create_user('celebrity', password='pass')
+        Follow.objects.create(follower=self.reader, following=self.friend)
+        for fan in [self.reader] + [User.objects.create_user(f'fan{i}', password='pass') for i in range(2)]:
+            Follow.objects.create(follower=fan, following=self.celebrity)
+        self.client.force_authenticate(self.reader)
+
+    def post_as(self, user, content):
+        post = Post.objects.create(author=user, content=content)
+        fan_out_post(post)
+        return post
+
+    def feed(self, **params):
+        with self.assertWithinQueryBudget(FeedView):
+            response = self.client.get('/api/posts/feed/', params)
+        return response.data
+
+    def test_celebrity_posts_are_pulled_and_merged_in_order(self):
+        posts = [self.post_as(author, f'post {i}')
+                 for i, author in enumerate([self.friend, self.celebrity, self.friend, self.celebrity])]
+        self.assertEqual(list(timeline_posts(self.reader).values_list('post_id', flat=True)), [posts[2].id, posts[0].id])
+
+        data = self.feed(page_size=10)
+        self.assertEqual([item['id'] for item in data['results']], [post.id for post in reversed(posts)])
+        self.assertEqual(data['count'], 4)
+        cursor = self.feed(cursor='', page_size=3)
+        self.assertEqual([item['id'] for item in cursor['results']], [posts[3].id, posts[2].id, posts[1].id])
+        self.assertEqual([item['id'] for item in self.client.get(cursor['next']).data['results']], [posts[0].id])
+
+    def test_post_pushed_before_its_author_crossed_the_threshold_is_shown_once(self):
+        post = self.post_as(self.friend, 'pushed')
+        for i in range(2):
+            Follow.objects.create(follower=User.objects.create_user(f'late{i}', password='pass'), following=self.friend)
+        later = self.post_as(self.friend, 'pulled')
+        self.assertEqual(list(timeline_posts(self.reader).values_list('post_id', flat=True)), [post.id])
+
+        data = self.feed()
+        self.assertEqual([item['id'] for item in data['results']], [later.id, post.id])
+        self.assertEqual(data['count'], 2)
+
+    def test_reposts_across_sources_are_one_story(self):
+        original = self.post_as(self.celebrity, 'original')
+        repost = create_repost(self.friend, original)
+        own = self.post_as(self.friend, 'own')
+
+        data = self.feed(page_size=1)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([item['id'] for item in data['results']], [own.id])
+        self.assertEqual([item['id'] for item in self.client.get(data['next']).data['results']], [repost.id])
+        self.assertEqual(HybridFeed(self.reader).count(), 2)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+)
+class PostCounterTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass')
+        self.readers = [User.objects.create_user(f'reader{i}', password='pass') for i in range(2)]
+        self.post = Post.objects.create(author=self.author, content='counted')
+
+    def counts(self, post=None):
+        return Post.objects.values_list('like_count', 'comment_count').get(id=(post or self.post).id)
+
+    def test_views_increment_and_decrement(self):
+        for reader in self.readers:
+            self.client.force_authenticate(reader)
+            self.client.post(f'/api/posts/like/{self.post.id}/')
+            self.client.post(f'/api/posts/{self.post.id}/comment/', {'content': 'hi'})
+        self.assertEqual(self.counts(), (2, 2))
+
+        self.client.delete(f'/api/posts/unlike/{self.post.id}/')
+        comment = Comment.objects.filter(user=self.readers[1]).get()
+        self.client.delete(f'/api/posts/{self.post.id}/comments/{comment.id}/')
+        self.assertEqual(self.counts(), (1, 1))
+        # Refused requests leave the counters alone
+        self.client.post(f'/api/posts/like/{self.post.id}/')
+        self.client.delete(f'/api/posts/unlike/{self.post.id}/')
+        self.client.delete(f'/api/posts/unlike/{self.post.id}/')
+        self.assertEqual(self.counts(), (1, 1))
+
+    def test_counters_never_drop_below_zero(self):
+        update_post_counter(self.post.id, 'like_count', -1)
+        update_post_counters([self.post.id], 'comment_count', -3)
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_reconcile_command_repairs_drift(self):
+        other = Post.objects.create(author=self.author, content='in sync')
+        Like.objects.create(user=self.readers[0], post=self.post)
+        Comment.objects.create(user=self.readers[0], post=self.post, content='hi')
+        Post.objects.filter(id=self.post.id).update(like_count=7, comment_count=0)
+
+        out = io.StringIO()
+        call_command('reconcile_post_counters', '--batch-size', '1', stdout=out)
+        self.assertIn('repaired 1', out.getvalue())
+        self.assertEqual(self.counts(), (1, 1))
+        self.assertEqual(self.counts(other), (0, 0))
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+)
+class PostSearchTests(APITestCase):
+    # SQLite: the inverted-index backend
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('author', password='pass')
+        self.once = Post.objects.create(author=self.user, content='Django tips for the weekend')
+        self.twice = Post.objects.create(author=self.user, content='Django, Django everywhere')
+        self.both = Post.objects.create(author=self.user, content='Python and Django')
+        self.client.force_authenticate(self.user)
+
+    def search(self, query, **params):
+        response = self.client.get('/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_results_are_ranked_by_term_frequency(self):
+        # Equal ranks fall back to newest first
+        self.assertEqual(self.search('django'), [self.twice.id, self.both.id, self.once.id])
+        self.assertEqual(self.search('the'), [])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search('python django'), [self.both.id])
+        self.assertEqual(self.search('PYTHON weekend'), [])
+        self.assertEqual(self.search('django', author='nobody'), [])
+
+    def test_edits_and_deletes_are_reindexed(self):
+        self.client.put(f'/api/posts/{self.once.id}/', {'content': 'Flask tips'})
+        self.assertEqual(self.search('flask'), [self.once.id])
+        self.assertEqual(self.search('weekend'), [])
+        self.client.delete(f'/api/posts/{self.both.id}/')
+        self.assertEqual(self.search('python'), [])
+        self.assertEqual(PostSearchTerm.objects.filter(post_id=self.both.id).count(), 0)
+
+    def test_search_cannot_be_combined_with_cursor(self):
+        response = self.client.get('/', {'search': 'django', 'cursor': ''})
+        self.assertEqual(response.status_code, 400)
+
+    def test_document_count_is_cached(self):
+        backend = get_search_backend()
+        backend.search(Post.objects.all(), 'django')
+        # Only the document frequencies; the post count for idf isn't taken again
+        with self.assertNumQueries(1):
+            backend.search(Post.objects.all(), 'python')
+
+    def test_migration_indexes_existing_posts(self):
+        PostSearchTerm.objects.all().delete()
+        migration = importlib.import_module('posts.migrations.0006_post_search')
+        migration.index_existing_posts(django_apps, connection.schema_editor())
+        self.assertEqual(self.search('python django'), [self.both.id])
+        self.assertEqual(PostSearchTerm.objects.get(post=self.twice, term='django').frequency, 2)
+
+    def test_backend_selection(self):
+        self.assertIsInstance(get_search_backend(), InvertedIndexSearchBackend)
+        with override_settings(POST_SEARCH_BACKEND='posts.search.PostgresSearchBackend'):
+            self.assertIsInstance(get_search_backend(), PostgresSearchBackend)
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            self.assertIsInstance(get_search_backend(), PostgresSearchBackend)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+)
+class PostFragmentCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        post_cache.reset_stats()
+        self.user = User.objects.create_user('reader', password='pass')
+        self.post = Post.objects.create(author=self.user, content='cached')
+        self.client.force_authenticate(self.user)
+
+    def test_second_read_is_served_from_cache(self):
+        self.client.get(f'/api/posts/{self.post.id}/')
+        self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(post_cache.stats()['misses'], 1)
+        self.assertEqual(post_cache.stats()['local_hits'], 1)
+
+    def test_like_and_comment_invalidate_the_fragment(self):
+        self.client.get(f'/api/posts/{self.post.id}/')
+        self.client.post(f'/api/posts/like/{self.post.id}/')
+        self.client.post(f'/api/posts/{self.post.id}/comment/', {'content': 'hi'})
+        response = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(response.data['like_count'], 1)
+        self.assertEqual(response.data['comment_counts'], 1)
+
+    @override_settings(POST_CACHE_INVALIDATE_BATCH=2)
+    def test_username_change_invalidates_in_batches(self):
+        other = User.objects.create_user('other', password='pass')
+        for i in range(3):
+            Post.objects.create(author=self.user, content=f'more {i}')
+        Comment.objects.create(user=self.user, post=Post.objects.create(author=other, content='theirs'), content='hi')
+        Post.objects.create(author=other, content='untouched')
+        touched = list(Post.objects.exclude(content='untouched').values_list('id', flat=True))
+        before = post_cache.versions(Post.objects.values_list('id', flat=True))
+
+        with mock.patch.object(post_cache.shared, 'set_many', wraps=post_cache.shared.set_many) as set_many:
+            response = self.client.patch('/api/users/me/profile/', {'username': 'renamed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(max(len(call.args[0]) for call in set_many.call_args_list), 2)
+        after = post_cache.versions(before)
+        self.assertEqual({post_id for post_id in before if before[post_id] != after[post_id]}, set(touched))
+
+
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+)
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', password='pass')
+        self.post = Post.objects.create(author=self.user, content='validated')
+        self.comment = Comment.objects.create(user=self.user, post=self.post, content='first')
+        self.client.force_authenticate(self.user)
+
+    def assertRevalidates(self, path, params=None):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(path, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        return etag
+
+    def test_post_detail(self):
+        etag = self.assertRevalidates(f'/api/posts/{self.post.id}/')
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.id}/')['Cache-Control'], 'private, no-cache')
+        self.client.post(f'/api/posts/like/{self.post.id}/')
+        response = self.client.get(f'/api/posts/{self.post.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['like_count'], 1)
+
+    def test_post_list_varies_with_query_and_writes(self):
+        etag = self.assertRevalidates('/', {'author': 'reader'})
+        self.assertNotEqual(self.client.get('/', {'author': 'nobody'})['ETag'], etag)
+        self.assertIn('max-age=30', self.client.get('/')['Cache-Control'])
+        Post.objects.create(author=self.user, content='second')
+        self.client.post('/api/posts/create/', {'content': 'third'})
+        response = self.client.get('/', {'author': 'reader'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_comments_follow_edits(self):
+        path = f'/api/posts/{self.post.id}/comments/'
+        etag = self.assertRevalidates(path)
+        self.client.put(f'/api/posts/{self.post.id}/comments/{self.comment.id}/', {'content': 'edited'})
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['content'], 'edited')
+
+    def test_follow_list_follows_new_followers(self):
+        fan = User.objects.create_user('fan', password='pass')
+        etag = self.client.get('/api/users/followers/reader/')['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/users/followers/reader/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Follow.objects.create(follower=fan, following=self.user)
+        self.assertEqual(self.client.get('/api/users/followers/reader/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+)
+class BulkEndpointTests(QueryBudgetTestMixin, APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', password='pass')
+        self.authors = [User.objects.create_user(f'author{i}', password='pass') for i in range(3)]
+        self.posts = [Post.objects.create(author=author, content=f'post {i}') for i, author in enumerate(self.authors)]
+        Like.objects.create(user=self.user, post=self.posts[0])
+        Post.objects.filter(id=self.posts[0].id).update(like_count=1)
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_like(self):
+        ids = [post.id for post in self.posts]
+        with self.assertWithinQueryBudget(BulkLikeView, 'post'):
+            response = self.client.post('/api/posts/bulk/like/', {'post_ids': ids + [999999, ids[1]]}, format='json')
+        self.assertEqual([item['status'] for item in response.data['results']],
+                         ['already_liked', 'liked', 'liked', 'not_found'])
+        self.assertEqual(list(Post.objects.filter(id__in=ids).order_by('id').values_list('like_count', flat=True)), [1, 1, 1])
+        self.assertEqual(Notification.objects.filter(notification_type='like').count(), 2)
+
+    def test_bulk_unlike(self):
+        ids = [post.id for post in self.posts[:2]]
+        with self.assertWithinQueryBudget(BulkUnlikeView, 'post'):
+            response = self.client.post('/api/posts/bulk/unlike/', {'post_ids': ids + [999999]}, format='json')
+        self.assertEqual([item['status'] for item in response.data['results']], ['unliked', 'not_liked', 'not_found'])
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(Post.objects.get(id=ids[0]).like_count, 0)
+
+    def test_bulk_fetch(self):
+        with self.assertWithinQueryBudget(BulkPostFetchView):
+            response = self.client.get('/api/posts/bulk/', {'ids': f'{self.posts[2].id},999999,{self.posts[0].id}'})
+        results = response.data['results']
+        self.assertEqual([item['status'] for item in results], ['ok', 'not_found', 'ok'])
+        self.assertEqual(results[0]['post']['content'], 'post 2')
+        self.assertEqual(self.client.get('/api/posts/bulk/', {'ids': 'a,b'}).status_code, 400)
+
+    @override_settings(BULK_MAX_ITEMS=2)
+    def test_batch_size_is_capped(self):
+        response = self.client.post('/api/posts/bulk/like/', {'post_ids': [1, 2, 3]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_bodies_are_rejected(self):
+        ids = [post.id for post in self.posts]
+        for body in (ids, {'post_ids': [True, False]}, {'post_ids': [ids[0], True]}):
+            response = self.client.post('/api/posts/bulk/like/', body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(Like.objects.count(), 1)
+
+    def test_every_item_counts_against_the_throttle(self):
+        rates = {**api_settings.DEFAULT_THROTTLE_RATES, 'like': '3/h'}
+        with mock.patch.object(api_settings, 'DEFAULT_THROTTLE_RATES', rates):
+            ids = [post.id for post in self.posts]
+            self.assertEqual(self.client.post('/api/posts/bulk/like/', {'post_ids': ids}, format='json').status_code, 200)
+            self.assertEqual(self.client.post(f'/api/posts/like/{self.posts[0].id}/').status_code, 429)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+)
+class RepostTests(QueryBudgetTestMixin, APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass')
+        self.reader = User.objects.create_user('reader', password='pass')
+        self.fans = [User.objects.create_user(f'fan{i}', password='pass') for i in range(3)]
+        for fan in self.fans:
+            Follow.objects.create(follower=self.reader, following=fan)
+        self.post = Post.objects.create(author=self.author, content='original')
+        self.client.force_authenticate(self.fans[0])
+
+    def test_repost_and_undo(self):
+        with self.assertWithinQueryBudget(RepostView, 'post'):
+            response = self.client.post(f'/api/posts/{self.post.id}/repost/', {'content': 'look at this'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['shared_post'], self.post.id)
+        self.assertEqual((response.data['original_post']['author'], response.data['original_post']['repost_count']),
+                         ('author', 1))
+        self.assertTrue(Notification.objects.filter(user=self.author, notification_type='repost').exists())
+
+        # Once per original, also through a repost of it
+        repost_id = response.data['id']
+        self.assertEqual(self.client.post(f'/api/posts/{self.post.id}/repost/').status_code, 400)
+        self.assertEqual(self.client.post(f'/api/posts/{repost_id}/repost/').status_code, 400)
+        self.client.force_authenticate(self.fans[1])
+        self.assertEqual(self.client.post(f'/api/posts/{repost_id}/repost/').data['shared_post'], self.post.id)
+        self.assertEqual(Post.objects.get(id=self.post.id).repost_count, 2)
+
+        self.client.force_authenticate(self.fans[0])
+        with self.assertWithinQueryBudget(RepostView, 'delete'):
+            response = self.client.delete(f'/api/posts/{self.post.id}/repost/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Post.objects.get(id=self.post.id).repost_count, 1)
+
+        Post.objects.filter(id=self.post.id).update(repost_count=9)
+        self.assertEqual(reconcile_post_counters(Post.objects.all()), 1)
+        self.assertEqual(Post.objects.get(id=self.post.id).repost_count, 1)
+
+    def test_originals_are_loaded_in_one_query(self):
+        other = Post.objects.create(author=self.author, content='second original')
+        reposts = [create_repost(fan, original) for fan, original in zip(self.fans, [self.post, other, self.post])]
+        ids = ','.join(str(repost.id) for repost in reposts)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/bulk/', {'ids': ids})
+        embedded = [item['post']['original_post']['content'] for item in response.data['results']]
+        self.assertEqual(embedded, ['original', 'second original', 'original'])
+        self.assertEqual(sum('"posts_post"."id" IN' in query['sql'] for query in queries), 2)
+
+    def test_feed_shows_each_original_once(self):
+        for fan in self.fans:
+            create_repost(fan, self.post)
+        own = Post.objects.create(author=self.fans[0], content='own post')
+        rebuild_timeline(self.reader)
+        self.client.force_authenticate(self.reader)
+        with self.assertWithinQueryBudget(FeedView):
+            response = self.client.get('/api/posts/feed/')
+        results = response.data['results']
+        # fan2's repost is the newest of the three
+        self.assertEqual([(item['author'], item['shared_post']) for item in results],
+                         [('fan0', None), ('fan2', self.post.id)])
+        self.assertEqual(results[1]['original_post']['content'], 'original')
+        self.assertEqual(results[0]['id'], own.id)
+
+    def test_feed_pages_stay_full_when_reposts_are_folded(self):
+        for fan in self.fans:
+            create_repost(fan, self.post)
+            Post.objects.create(author=fan, content=f'{fan.username} post')
+        rebuild_timeline(self.reader)
+        self.client.force_authenticate(self.reader)
+        first = self.client.get('/api/posts/feed/', {'page_size': 2}).data
+        second = self.client.get('/api/posts/feed/', {'page_size': 2, 'page': 2}).data
+        self.assertEqual([len(first['results']), len(second['results'])], [2, 2])
+        self.assertEqual(len({item['id'] for item in first['results'] + second['results']}), 4)
+
+    def test_repost_detail_follows_its_original(self):
+        repost = create_repost(self.fans[0], self.post)
+        with self.assertWithinQueryBudget(PostRetrieveUpdateDestroyView, 'get'):
+            response = self.client.get(f'/api/posts/{repost.id}/')
+        self.assertEqual(response.data['original_post']['like_count'], 0)
+
+        self.client.post(f'/api/posts/like/{self.post.id}/')
+        response = self.client.get(f'/api/posts/{repost.id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['original_post']['like_count'], 1)
+
+    def test_deleting_a_repost_decrements_the_count(self):
+        repost = create_repost(self.fans[0], self.post)
+        with self.assertWithinQueryBudget(PostRetrieveUpdateDestroyView, 'delete'):
+            self.assertEqual(self.client.delete(f'/api/posts/{repost.id}/').status_code, 204)
+        self.assertEqual(Post.objects.get(id=self.post.id).repost_count, 0)
+
+    def test_str_does_not_load_the_original(self):
+        repost = Post.objects.select_related('author').get(id=create_repost(self.fans[0], self.post).id)
+        with self.assertNumQueries(0):
+            self.assertEqual(str(repost), f"Repost by fan0 of post {self.post.id}")
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+    MEDIA_PROCESSING_MODE='sync', MEDIA_RENDITION_SIZES={'thumb': 40, 'large': 200},
+)
+class MediaPipelineTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.user = User.objects.create_user('photographer', password='pass')
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def jpeg(name='photo.jpg', size=(600, 400)):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        exif[0x0112] = 6  # Rotated: stored landscape, shown portrait
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'teal').save(buffer, 'JPEG', exif=exif.tobytes())
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_post_media_renditions(self):
+        response = self.client.post('/api/posts/create/', {'content': 'look', 'media': self.jpeg()}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+
+        post = Post.objects.get()
+        self.assertEqual(post.media_status, 'ready')
+        self.assertEqual({name: (r['width'], r['height']) for name, r in post.media_renditions.items()},
+                         {'large': (133, 200), 'thumb': (27, 40)})
+        with default_storage.open(post.media_renditions['large']['name']) as rendition, Image.open(rendition) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(dict(image.getexif()), {})
+
+        data = self.client.get(f'/api/posts/{post.id}/').data
+        self.assertEqual(data['media_status'], 'ready')
+        self.assertTrue(data['media_renditions']['thumb'].startswith('http://testserver/media/post_media/'))
+
+    def test_unreadable_image_fails(self):
+        name = default_storage.save('post_media/broken.jpg', io.BytesIO(b'not an image'))
+        post = Post.objects.create(author=self.user, content='broken', media=name)
+        with self.assertLogs('social_media_api.media', 'ERROR'):
+            media_processor.schedule(post, 'media')
+        post.refresh_from_db()
+        self.assertEqual((post.media_status, post.media_renditions), ('failed', {}))
+
+    def test_async_mode_queues_after_commit(self):
+        post = Post.objects.create(author=self.user, content='later', media=self.jpeg())
+        with self.settings(MEDIA_PROCESSING_MODE='async'), mock.patch.object(media_processor, 'submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                media_processor.schedule(post, 'media')
+                self.assertEqual(Post.objects.get().media_status, 'pending')
+                submit.assert_not_called()
+        submit.assert_called_once_with('posts.Post', post.id, 'media', post.media.name)
+
+    def test_profile_picture_renditions(self):
+        response = self.client.patch('/api/users/me/profile/', {'profile_picture': self.jpeg('me.jpg')}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        profile = response.data['profile']
+        self.assertEqual(profile['profile_picture_status'], 'ready')
+        self.assertEqual(set(profile['profile_picture_renditions']), {'thumb', 'large'})
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+    MEDIA_PROCESSING_MODE='sync', MEDIA_RENDITION_SIZES={'thumb': 40},
+)
+class ResumableUploadTests(QueryBudgetTestMixin, APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.user = User.objects.create_user('uploader', password='pass')
+        self.client.force_authenticate(self.user)
+        buffer = io.BytesIO()
+        Image.effect_noise((300, 200), 60).convert('RGB').save(buffer, 'JPEG', quality=95)
+        self.photo = buffer.getvalue()
+
+    def start(self, target='post_media', size=None):
+        return self.client.post('/api/posts/uploads/', {
+            'target': target, 'filename': 'photo.jpg', 'size': len(self.photo) if size is None else size,
+        }, format='json')
+
+    def send(self, upload_id, offset, chunk):
+        return self.client.patch(f'/api/posts/uploads/{upload_id}/', chunk,
+                                 content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_chunked_upload_becomes_post_media(self):
+        with self.assertWithinQueryBudget(MediaUploadCreateView, 'post'):
+            response = self.start()
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.data['id']
+
+        middle = len(self.photo) // 2
+        with self.assertWithinQueryBudget(MediaUploadDetailView, 'patch'):
+            response = self.send(upload_id, 0, self.photo[:middle])
+        # The header was in the first chunk
+        self.assertEqual((response.data['offset'], response.data['format'], response.data['width']), (middle, 'JPEG', 300))
+        self.assertFalse(response.data['complete'])
+        with self.assertWithinQueryBudget(MediaUploadDetailView, 'get'):
+            self.assertEqual(self.client.get(f'/api/posts/uploads/{upload_id}/')['Upload-Offset'], str(middle))
+        self.assertTrue(self.send(upload_id, middle, self.photo[middle:]).data['complete'])
+
+        response = self.client.post('/api/posts/create/', {'content': 'chunked', 'media_upload': upload_id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get()
+        self.assertEqual(post.media_status, 'ready')
+        with post.media.open('rb') as media:
+            self.assertEqual(media.read(), self.photo)
+        # Used up: neither listed nor attachable again
+        self.assertFalse(MediaUpload.objects.exists())
+        response = self.client.post('/api/posts/create/', {'content': 'again', 'media_upload': upload_id}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_size_limits(self):
+        with self.settings(MEDIA_UPLOAD_MAX_BYTES=1000):
+            self.assertEqual(self.start().status_code, 413)
+        upload_id = self.start(size=10).data['id']
+        self.assertEqual(self.send(upload_id, 0, self.photo[:11]).status_code, 413)
+        self.assertEqual(self.send(upload_id, 5, self.photo[:5]).status_code, 409)
+
+    def test_non_image_is_rejected_from_the_first_chunk(self):
+        upload_id = self.start(size=100000).data['id']
+        name = MediaUpload.objects.get().name
+        response = self.send(upload_id, 0, b'MZ\x90\x00 definitely not a picture')
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(MediaUpload.objects.exists())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_oversized_dimensions_are_rejected_from_the_header(self):
+        upload_id = self.start().data['id']
+        with self.settings(MEDIA_UPLOAD_MAX_PIXELS=100 * 100):
+            response = self.send(upload_id, 0, self.photo[:4096])
+        self.assertEqual(response.status_code, 422)
+
+    def test_interrupted_chunk_resumes_from_what_was_stored(self):
+        upload = MediaUpload.objects.get(pk=self.start().data['id'])
+        # The client announces the whole file but the connection drops after 1000 bytes
+        write_chunk(upload, io.BytesIO(self.photo[:1000]), 0, len(self.photo))
+        offset = int(self.client.get(f'/api/posts/uploads/{upload.id}/')['Upload-Offset'])
+        self.assertEqual(offset, 1000)
+        self.assertTrue(self.send(upload.id, offset, self.photo[offset:]).data['complete'])
+
+    def test_profile_picture_upload(self):
+        upload_id = self.start('profile_picture').data['id']
+        self.send(upload_id, 0, self.photo)
+        other = User.objects.create_user('other', password='pass')
+        self.client.force_authenticate(other)
+        response = self.client.patch('/api/users/me/profile/', {'profile_picture_upload': upload_id}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.patch('/api/users/me/profile/', {'profile_picture_upload': upload_id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['profile']['profile_picture_status'], 'ready')
+
+
+class RecordingDispatcher(NotificationDispatcher):
+    # Keeps batches in memory so the worker threads never touch the test database
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def write_batch(self, events):
+        self.batches.append(list(events))
+
+
+@override_settings(NOTIFICATION_DISPATCH_MODE='sync')
+class NotificationDispatcherTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author', password='pass')
+        self.sender = User.objects.create_user('fan', password='pass')
+        self.post = Post.objects.create(author=self.user, content='hello')
+
+    def test_sync_mode_writes_immediately(self):
+        NotificationDispatcher().dispatch(self.user, self.sender, self.post, 'like', 'fan liked your post.')
+        self.assertEqual(Notification.objects.filter(user=self.user, notification_type='like').count(), 1)
+
+    @override_settings(NOTIFICATION_DISPATCH_MODE='async', NOTIFICATION_WORKERS=1, NOTIFICATION_BATCH_WAIT_MS=200)
+    def test_async_mode_batches_queued_events(self):
+        dispatcher = RecordingDispatcher()
+        for i in range(20):
+            dispatcher.dispatch(self.user, self.sender, self.post, 'like', f'like {i}')
+        self.assertTrue(dispatcher.flush(timeout=5))
+        dispatcher.shutdown()
+
+        self.assertEqual(sum(len(batch) for batch in dispatcher.batches), 20)
+        self.assertLess(len(dispatcher.batches), 20)
+        self.assertEqual(dispatcher.metrics()['written'], 20)
+
+    def test_likes_on_a_post_coalesce_until_read(self):
+        dispatcher = NotificationDispatcher()
+        fans = [User.objects.create_user(f'fan{i}', password='pass') for i in range(5)]
+        for fan in fans:
+            dispatcher.dispatch(self.user, fan, self.post, 'like', f'{fan.username} liked your post.')
+
+        notification = Notification.objects.get(user=self.user)
+        self.assertEqual(notification.actor_count, 5)
+        self.assertEqual(notification.sample_actor_ids, [fans[4].id, fans[3].id, fans[2].id])
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/posts/notifications/')
+        self.assertEqual(response.data[0]['summary'], 'fan4 and 4 others liked your post.')
+        self.assertEqual(response.data[0]['sample_actors'], ['fan4', 'fan3', 'fan2'])
+
+        Notification.objects.update(is_read=True)
+        dispatcher.dispatch(self.user, self.sender, self.post, 'like', 'fan liked your post.')
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 2)
+
+    def test_outbox_is_replayed(self):
+        NotificationOutbox.objects.create(
+            user=self.user, sender=self.sender, post=self.post, notification_type='comment',
+            message='fan commented on your post: hi', timestamp=self.post.timestamp,
+        )
+        self.assertEqual(NotificationDispatcher().drain_outbox(), 1)
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(Notification.objects.get(user=self.user).timestamp, self.post.timestamp)
+
+    @override_settings(NOTIFICATION_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failing_outbox_row_is_skipped_then_dead_lettered(self):
+        bad_sender = User.objects.create_user('broken', password='pass')
+
+        class FailingDispatcher(NotificationDispatcher):
+            def write_batch(self, events):
+                if any(event.sender_id == bad_sender.id for event in events):
+                    raise RuntimeError('cannot write')
+                super().write_batch(events)
+
+        for sender in (self.sender, bad_sender, self.sender):
+            NotificationOutbox.objects.create(
+                user=self.user, sender=sender, post=None, notification_type='message',
+                message='hi', timestamp=self.post.timestamp,
+            )
+        dispatcher = FailingDispatcher()
+
+        # The bad row sits between two good ones and doesn't hold back the last
+        self.assertEqual(dispatcher.drain_outbox(), 2)
+        bad_row = NotificationOutbox.objects.get()
+        self.assertEqual((bad_row.sender_id, bad_row.attempts, bad_row.dead_lettered), (bad_sender.id, 1, False))
+
+        self.assertEqual(dispatcher.drain_outbox(), 0)
+        bad_row.refresh_from_db()
+        self.assertEqual((bad_row.attempts, bad_row.dead_lettered), (2, True))
+
+        # Dead-lettered rows are no longer replayed
+        self.assertEqual(dispatcher.drain_outbox(), 0)
+        bad_row.refresh_from_db()
+        self.assertEqual(bad_row.attempts, 2)
+        self.assertEqual(dispatcher.metrics()['outbox_dead_lettered'], 1)
+
+
+class SharedStateConfigurationTests(SimpleTestCase):
+    shared_caches = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'social-media-api'},
+        'shared': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379'},
+    }
+
+    def test_per_process_cache_is_refused_with_several_workers(self):
+        require_shared_cache('POST_CACHE_ALIAS')
+        with override_settings(WEB_CONCURRENCY=2):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'POST_CACHE_ALIAS'):
+                require_shared_cache('POST_CACHE_ALIAS')
+        with override_settings(WEB_CONCURRENCY=2, CACHES=self.shared_caches, POST_CACHE_ALIAS='shared'):
+            require_shared_cache('POST_CACHE_ALIAS')
+
+    def test_per_process_throttle_cache_is_refused_with_several_workers(self):
+        with override_settings(WEB_CONCURRENCY=2):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'THROTTLE_CACHE_ALIAS'):
+                require_shared_cache('THROTTLE_CACHE_ALIAS')
+        with override_settings(WEB_CONCURRENCY=2, CACHES=self.shared_caches, THROTTLE_CACHE_ALIAS='shared'):
+            require_shared_cache('THROTTLE_CACHE_ALIAS')
+
+    def test_in_process_broker_warns_with_several_workers(self):
+        with self.assertNoLogs('social_media_api.deployment'):
+            require_shared_broker()
+        with override_settings(WEB_CONCURRENCY=2):
+            with self.assertLogs('social_media_api.deployment', 'WARNING') as logs:
+                require_shared_broker()
+        self.assertIn('REALTIME_BROKER', logs.output[0])
+        with override_settings(WEB_CONCURRENCY=2, REALTIME_BROKER='social_media_api.pubsub.RedisBroker'):
+            with self.assertNoLogs('social_media_api.deployment'):
+                require_shared_broker()
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], NOTIFICATION_DISPATCH_MODE='sync',
+)
+class SlidingWindowThrottleTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('sender', password='pass')
+        User.objects.create_user('friend', password='pass')
+        self.client.force_authenticate(self.user)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('5/30m'), (5, 1800))
+        self.assertEqual(parse_rate('100/hour'), (100, 3600))
+
+    def test_direct_messages_are_limited_per_user(self):
+        for i in range(5):
+            response = self.client.post('/api/posts/messages/send/', {'recipient': 'friend', 'content': f'hi {i}'})
+            self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/posts/messages/send/', {'recipient': 'friend', 'content': 'one more'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+        self.client.force_authenticate(User.objects.get(username='friend'))
+        response = self.client.post('/api/posts/messages/send/', {'recipient': 'sender', 'content': 'reply'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_previous_window_counts_by_overlap(self):
+        throttle = SlidingWindowThrottle()
+        request = mock.Mock(method='POST', user=self.user)
+        view = mock.Mock(spec=['throttle_scope'], throttle_scope='direct_message')
+
+        # 5 requests late in one window, then a quarter into the next only 5 * 0.75 of them still count
+        throttle.timer = lambda: 1800 * 10 + 1700
+        self.assertTrue(all(throttle.allow_request(request, view) for _ in range(5)))
+        throttle.timer = lambda: 1800 * 11 + 450
+        self.assertTrue(throttle.allow_request(request, view))
+        self.assertFalse(throttle.allow_request(request, view))
+        self.assertGreater(throttle.wait(), 0)
+
+
+@override_settings(REALTIME_MAX_PENDING=2)
+class InProcessBrokerTests(APITestCase):
+
+    def test_publish_from_another_thread_reaches_subscriber(self):
+        async def scenario():
+            broker = InProcessBroker()
+            subscription = broker.subscribe('user:1')
+            threading.Thread(target=broker.publish, args=('user:1', {'type': 'ping'})).start()
+            event = await subscription.get(timeout=2)
+            subscription.close()
+            return event, broker.subscriber_count()
+
+        self.assertEqual(asyncio.run(scenario()), ({'type': 'ping'}, 0))
+
+    def test_slow_subscriber_is_told_to_resync(self):
+        async def scenario():
+            broker = InProcessBroker()
+            subscription = broker.subscribe('user:1')
+            for i in range(3):
+                broker.publish('user:1', {'type': 'ping', 'n': i})
+            await asyncio.sleep(0)
+            with self.assertRaises(subscription.Overflow):
+                await subscription.get(timeout=1)
+            return await subscription.get(timeout=0.01)
+
+        self.assertIsNone(asyncio.run(scenario()))
+
+
+class ActivityStreamTests(TransactionTestCase):
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get('/api/posts/stream/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_streams_events_published_to_the_user(self):
+        user = await User.objects.acreate(username='listener')
+        response = await self.async_client.get('/api/posts/stream/', {'token': str(AccessToken.for_user(user))})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        next_chunk = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        publish_to_user(user.id, {'type': 'direct_message', 'content': 'hi'})
+        chunk = await asyncio.wait_for(next_chunk, 2)
+        self.assertEqual(chunk, b'event: direct_message\ndata: {"type": "direct_message", "content": "hi"}\n\n')
+        await stream.aclose()
@@ -0,0 +1,268 @@
+import heapq
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+from users.graph import follow_graph
+from .models import Post, TimelineEntry
+
+
+# ============ Timeline settings =============
+
+def timeline_max_length():
+    return getattr(settings, 'TIMELINE_MAX_LENGTH', 800)
+
+
+def fanout_batch_size():
+    return getattr(settings, 'TIMELINE_FANOUT_BATCH_SIZE', 1000)
+
+
+def celebrity_threshold():
+    return getattr(settings, 'FEED_CELEBRITY_FOLLOWER_THRESHOLD', 10000)
+
+
+def _batched(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _entry_for(user_id, post):
+    return TimelineEntry(user_id=user_id, post_id=post.id, author_id=post.author_id, timestamp=post.timestamp)
+
+
+# ============ Celebrity detection =============
+
+def follower_counts(author_ids):
+    """Follower counts for `author_ids`, from the follow-graph cache."""
+    return follow_graph.follower_counts(author_ids)
+
+
+def celebrity_ids(author_ids):
+    """The subset of `author_ids` whose posts are pulled at read time instead of pushed."""
+    threshold = celebrity_threshold()
+    return {author_id for author_id, total in follower_counts(author_ids).items() if total > threshold}
+
+
+def is_celebrity(author_id):
+    return bool(celebrity_ids([author_id]))
+
+
+# ============ Write path =============
+
+def fan_out_post(post):
+    """Push a freshly created post into the timeline of every follower of its author.
+
+    Posts by celebrity authors are not pushed; HybridFeed pulls them at read time.
+    """
+    if is_celebrity(post.author_id):
+        return 0
+    follower_ids = list(follow_graph.followers(post.author_id))
+    for batch in _batched(follower_ids, fanout_batch_size()):
+        TimelineEntry.objects.bulk_create(
+            [_entry_for(user_id, post) for user_id in batch],
+            ignore_conflicts=True,
+        )
+        trim_timelines(batch)
+    return len(follower_ids)
+
+
+def backfill_timeline(user, author):
+    """Copy the most recent posts of `author` into `user`'s timeline after a follow."""
+    backfill_timeline_from(user, [author])
+
+
+def backfill_timeline_from(user, authors):
+    """`backfill_timeline` for several newly followed authors in one pass.
+
+    Only the newest TIMELINE_MAX_LENGTH posts across all of them can survive
+    the trim, so that is all that is read.
+    """
+    author_ids = [author.id for author in authors]
+    author_ids = set(author_ids) - celebrity_ids(author_ids)
+    if not author_ids:
+        return
+    limit = timeline_max_length()
+    posts = Post.objects.filter(author__in=author_ids).only('id', 'author_id', 'timestamp').order_by('-timestamp', '-id')[:limit]
+    TimelineEntry.objects.bulk_create([_entry_for(user.id, post) for post in posts], ignore_conflicts=True)
+    trim_timelines([user.id])
+
+
+def prune_timeline(user, author):
+    """Drop every post by `author` from `user`'s timeline after an unfollow."""
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def trim_timelines(user_ids):
+    """Keep at most TIMELINE_MAX_LENGTH entries per user, discarding the oldest."""
+    if not user_ids:
+        return 0
+    ranked = TimelineEntry.objects.filter(user_id__in=user_ids).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('timestamp').desc(), F('post_id').desc()],
+        )
+    ).filter(position__gt=timeline_max_length()).values_list('id', flat=True)
+    stale_ids = list(ranked)
+    if not stale_ids:
+        return 0
+    deleted, _ = TimelineEntry.objects.filter(id__in=stale_ids).delete()
+    return deleted
+
+
+def rebuild_timeline(user):
+    """Recompute `user`'s timeline from scratch out of the Follow graph (celebrities excluded)."""
+    limit = timeline_max_length()
+    following_ids = list(follow_graph.following(user.id))
+    pushed_ids = set(following_ids) - celebrity_ids(following_ids)
+    posts = Post.objects.filter(author__in=pushed_ids).only('id', 'author_id', 'timestamp').order_by('-timestamp', '-id')[:limit]
+    entries = [_entry_for(user.id, post) for post in posts]
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user=user).delete()
+        TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+# ============ Read path =============
+
+def timeline_posts(user):
+    """Posts in `user`'s timeline, newest first, served from the (user, -timestamp) index."""
+    return (
+        TimelineEntry.objects.filter(user=user)
+        .select_related('post__author')
+        .order_by('-timestamp', '-post_id')
+    )
+
+
+def _feed_key(post):
+    return (post.timestamp, post.id)
+
+
+def _counting(rows, counts):
+    # Yields `rows`, then records in `counts` how many there were
+    total = 0
+    for total, row in enumerate(rows, 1):
+        yield row
+    counts.append(total)
+
+
+def _story_id(post):
+    # A post and its reposts are one story in the feed: only the newest of them is shown
+    return post.shared_post_id or post.id
+
+
+class HybridFeed:
+    """Home feed that merges the pushed timeline with posts pulled from celebrity authors.
+
+    Every source is already ordered newest first, so a page is produced by a lazy
+    k-way merge that reads at most `stop` rows per source instead of sorting the
+    whole candidate set. Supports `count()` and slicing so it can be handed to the
+    page-number paginators unchanged, and `seek()` for keyset pagination.
+
+    A post and its reposts are one story, shown once at the newest of them.
+    When that drops rows, the sources are read further so pages stay full, and
+    `count()` counts stories rather than rows so the last page isn't short.
+    """
+
+    def __init__(self, user, position=None, celebrities=None):
+        self.user = user
+        self.position = position
+        if celebrities is None:
+            celebrities = sorted(celebrity_ids(follow_graph.following(user.id)))
+        self.celebrity_ids = celebrities
+
+    def seek(self, position):
+        """The same feed restricted to posts strictly older than `position` = (timestamp, post id)."""
+        return HybridFeed(self.user, position=position, celebrities=self.celebrity_ids)
+
+    def _before(self, id_field):
+        if self.position is None:
+            return Q()
+        timestamp, pk = self.position
+        return Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, **{f'{id_field}__lt': pk})
+
+    def _sources(self, limit, counts):
+        timeline = timeline_posts(self.user).filter(self._before('post_id'))[:limit]
+        yield _counting((entry.post for entry in timeline), counts)
+        if self.celebrity_ids:
+            # A single ordered pull over the (author, -timestamp, -id) index; one query per
+            # celebrity was measurably slower once a reader follows more than a handful
+            pulled = Post.objects.filter(self._before('id'), author_id__in=self.celebrity_ids).select_related('author')
+            yield _counting(iter(pulled.order_by('-timestamp', '-id')[:limit]), counts)
+
+    def merge(self, limit, counts=None):
+        """Unique stories from the first `limit` rows of every source; `counts` collects the rows each had."""
+        seen = set()
+        merged = heapq.merge(*self._sources(limit, [] if counts is None else counts), key=_feed_key, reverse=True)
+        for post in merged:
+            # A post can sit in the timeline and be pulled if its author crossed the threshold,
+            # and several followed users can repost the same original
+            if _story_id(post) in seen:
+                continue
+            seen.add(_story_id(post))
+            yield post
+
+    @classmethod
+    async def afor_user(cls, user):
+        # The follow graph and follower counts come from the cache, filled by at most two queries
+        celebrities = await sync_to_async(lambda: celebrity_ids(follow_graph.following(user.id)))()
+        return cls(user, celebrities=sorted(celebrities))
+
+    async def aslice(self, stop):
+        """The first `stop` posts of the feed, read through the async ORM."""
+        limit = stop
+        while True:
+            timeline = timeline_posts(self.user).filter(self._before('post_id'))[:limit]
+            sources = [[entry.post async for entry in timeline]]
+            if self.celebrity_ids:
+                pulled = Post.objects.filter(self._before('id'), author_id__in=self.celebrity_ids).select_related('author')
+                sources.append([post async for post in pulled.order_by('-timestamp', '-id')[:limit]])
+
+            seen, posts = set(), []
+            for post in heapq.merge(*sources, key=_feed_key, reverse=True):
+                if _story_id(post) not in seen:
+                    seen.add(_story_id(post))
+                    posts.append(post)
+                    if len(posts) == stop:
+                        return posts
+            if all(len(source) < limit for source in sources):
+                return posts
+            limit *= 2
+
+    def count(self):
+        """Number of stories `merge` yields, in one query over both sources."""
+        stories = TimelineEntry.objects.filter(self._before('post_id'), user=self.user).values_list(
+            Coalesce('post__shared_post_id', 'post_id'),
+        )
+        if not self.celebrity_ids:
+            return stories.distinct().count()
+        pulled = Post.objects.filter(self._before('id'), author_id__in=self.celebrity_ids).values_list(
+            Coalesce('shared_post_id', 'id'),
+        )
+        # UNION drops stories found in both sources as well as repeats within one
+        return stories.union(pulled).count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop = item.start or 0, item.stop
+            if stop is None:
+                stop = self.count()
+            return self._first(stop)[start:]
+        return self[item:item + 1][0]
+
+    def _first(self, stop):
+        # Dropped duplicates can leave `stop` rows per source short of `stop` stories
+        limit = stop
+        while True:
+            counts = []
+            posts = list(islice(self.merge(limit, counts), stop))
+            if len(posts) == stop or all(count < limit for count in counts):
+                return posts
+            limit *= 2
@@ -0,0 +1,198 @@
+import uuid
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, ValidationError
+
+from social_media_api.imaging import probe_image
+from .models import MediaUpload
+
+
+# Which image field each upload target ends up in
+UPLOAD_TARGETS = {
+    MediaUpload.Target.POST_MEDIA: ('posts.Post', 'media'),
+    MediaUpload.Target.PROFILE_PICTURE: ('users.Profile', 'profile_picture'),
+}
+
+# Bytes read from the request and written to storage at a time
+BLOCK_SIZE = 64 * 1024
+
+
+def upload_max_bytes():
+    return getattr(settings, 'MEDIA_UPLOAD_MAX_BYTES', 20 * 1024 * 1024)
+
+
+def upload_chunk_max_bytes():
+    return getattr(settings, 'MEDIA_UPLOAD_CHUNK_MAX_BYTES', 8 * 1024 * 1024)
+
+
+def upload_max_pixels():
+    return getattr(settings, 'MEDIA_UPLOAD_MAX_PIXELS', 40_000_000)
+
+
+def upload_header_bytes():
+    return getattr(settings, 'MEDIA_UPLOAD_HEADER_BYTES', 256 * 1024)
+
+
+def upload_expiry():
+    return timedelta(seconds=getattr(settings, 'MEDIA_UPLOAD_EXPIRY', 24 * 60 * 60))
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "The upload is larger than allowed."
+    default_code = 'payload_too_large'
+
+
+class UploadConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The chunk does not start at the upload's current offset."
+    default_code = 'upload_conflict'
+
+
+class UploadRejected(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "The file is not an accepted image."
+    default_code = 'upload_rejected'
+
+
+def _storage_field(target):
+    label, field_name = UPLOAD_TARGETS[target]
+    return apps.get_model(label)._meta.get_field(field_name)
+
+
+# ============ Resumable Uploads =============
+
+def create_upload(user, target, filename, size):
+    """Start an upload of `size` bytes and reserve the storage name it will be written to.
+
+    Too large a size is refused here, before any of the file is sent.
+    """
+    if size > upload_max_bytes():
+        raise PayloadTooLarge(f"Uploads are limited to {upload_max_bytes()} bytes.")
+    field = _storage_field(target)
+    # Saving an empty file claims the name; chunks are then written into it in place
+    name = field.storage.save(field.generate_filename(None, filename), ContentFile(b''))
+    return MediaUpload.objects.create(
+        owner=user, target=target, name=name, size=size, expires_at=timezone.now() + upload_expiry(),
+    )
+
+
+def open_uploads(user):
+    return MediaUpload.objects.filter(owner=user, expires_at__gt=timezone.now())
+
+
+def discard_upload(upload):
+    _storage_field(upload.target).storage.delete(upload.name)
+    upload.delete()
+
+
+def write_chunk(upload, stream, offset, length):
+    """Append `length` bytes read from `stream` to the upload, starting at `offset`.
+
+    The body is copied to storage BLOCK_SIZE bytes at a time, so memory use
+    doesn't grow with the size of the file. The image header is checked as
+    soon as it has arrived. A file that isn't an accepted image, or is larger
+    than MEDIA_UPLOAD_MAX_PIXELS, is rejected and deleted without reading the
+    rest. If the client drops mid-chunk, the bytes stored so far still count,
+    and the client can resume from the offset a GET reports.
+
+    Needs a storage that keeps files at a local path, like FileSystemStorage.
+    """
+    if length > upload_chunk_max_bytes():
+        raise PayloadTooLarge(f"Chunks are limited to {upload_chunk_max_bytes()} bytes.")
+    lock = f'media-upload-lock:{upload.pk}'
+    if not cache.add(lock, True, timeout=60):
+        raise UploadConflict("Another chunk of this upload is still being written.")
+    try:
+        upload.refresh_from_db()
+        if offset != upload.offset:
+            raise UploadConflict(f"The upload is at offset {upload.offset}.")
+        if offset + length > upload.size:
+            raise PayloadTooLarge("The chunk runs past the size the upload was started with.")
+        try:
+            _copy_chunk(upload, stream, length)
+        except ValueError as error:
+            discard_upload(upload)
+            raise UploadRejected(str(error))
+    finally:
+        cache.delete(lock)
+    return upload
+
+
+def _copy_chunk(upload, stream, length):
+    storage = _storage_field(upload.target).storage
+    with open(storage.path(upload.name), 'r+b') as destination:
+        head = None
+        if upload.width is None:
+            # Earlier chunks weren't enough to read the header: start from what they stored
+            head = destination.read(min(upload.offset, upload_header_bytes()))
+        destination.seek(upload.offset)
+        destination.truncate()
+
+        try:
+            written = 0
+            while written < length:
+                block = stream.read(min(BLOCK_SIZE, length - written))
+                if not block:
+                    break  # The client sent less than it announced
+                destination.write(block)
+                written += len(block)
+                if head is not None:
+                    head = _probe(upload, head + block, upload.offset + written == upload.size)
+        finally:
+            upload.offset += written
+            MediaUpload.objects.filter(pk=upload.pk).update(
+                offset=upload.offset, format=upload.format, width=upload.width, height=upload.height,
+            )
+
+
+def _probe(upload, head, complete):
+    # The header bytes gathered so far, or None once the header has been read
+    header_limit = upload_header_bytes()
+    probed = probe_image(head[:header_limit], complete or len(head) >= header_limit)
+    if probed is None:
+        return head
+    upload.format, upload.width, upload.height = probed
+    if upload.width * upload.height > upload_max_pixels():
+        raise ValueError(f"Images are limited to {upload_max_pixels()} pixels.")
+    return None
+
+
+def claim_upload(upload):
+    """Hand a completed upload's file over to an image field; returns its storage name."""
+    deleted, _ = MediaUpload.objects.filter(pk=upload.pk).delete()
+    if not deleted:
+        raise ValidationError("This upload has already been used.")
+    return upload.name
+
+
+def completed_upload(user, upload_id, target):
+    try:
+        upload = open_uploads(user).filter(pk=uuid.UUID(str(upload_id)), target=target).first()
+    except ValueError:
+        upload = None
+    if upload is None:
+        raise ValidationError("Unknown or expired upload.")
+    if not upload.complete:
+        raise ValidationError(f"The upload is not complete: {upload.offset} of {upload.size} bytes received.")
+    return upload
+
+
+# ============ Completed Upload Field =============
+
+class CompletedUploadField(serializers.UUIDField):
+    """Write-only id of a finished upload for `target`, owned by the requesting user."""
+
+    def __init__(self, target, **kwargs):
+        self.target = target
+        kwargs.update(write_only=True, required=False)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return completed_upload(self.context['request'].user, super().to_internal_value(data), self.target)
@@ -1,5 +1,6 @@
 from django.urls import path
-from .views import PostListView, PostCreateView, PostRetrieveUpdateDestroyView, FeedView, LikePostView, UnlikePostView, CommentPostView, PostCommentsView, NotificationListView, SendMessageView, InboxView, SentMessagesView,MessageDetailView, DeleteMessageView
+from .stream import activity_stream
+from .views import PostListView, PostCreateView, PostRetrieveUpdateDestroyView, FeedView, LikePostView, UnlikePostView, CommentPostView, PostCommentsView, NotificationListView, SendMessageView, InboxView, SentMessagesView,MessageDetailView, DeleteMessageView, ConversationListView, ConversationMessagesView, NotificationMetricsView, UnreadNotificationCountView, MarkNotificationsReadView, PostCacheStatsView, BulkPostFetchView, BulkLikeView, BulkUnlikeView, MediaUploadCreateView, MediaUploadDetailView, RepostView
 
 urlpatterns = [
     path('', PostListView.as_view(), name='post-list'),
@@ -9,15 +10,32 @@ urlpatterns = [
 
     path('api/posts/like/<int:post_id>/', LikePostView.as_view(), name='like-post'),
     path('api/posts/unlike/<int:post_id>/', UnlikePostView.as_view(), name='unlike-post'),
+    path('api/posts/<int:post_id>/repost/', RepostView.as_view(), name='repost'),
     path('api/posts/<int:post_id>/comment/', CommentPostView.as_view(), name='create_comment'),
     path('api/posts/<int:post_id>/comments/<int:comment_id>/', CommentPostView.as_view(), name='edit_delete_comment'),
     path('api/posts/<int:post_id>/comments/', PostCommentsView.as_view(), name='comments'),
 
+    path('api/posts/bulk/', BulkPostFetchView.as_view(), name='bulk-posts'),
+    path('api/posts/bulk/like/', BulkLikeView.as_view(), name='bulk-like'),
+    path('api/posts/bulk/unlike/', BulkUnlikeView.as_view(), name='bulk-unlike'),
+
+    path('api/posts/uploads/', MediaUploadCreateView.as_view(), name='media-upload-create'),
+    path('api/posts/uploads/<uuid:upload_id>/', MediaUploadDetailView.as_view(), name='media-upload-detail'),
+
     path('api/posts/messages/send/', SendMessageView.as_view(), name='send-message'),
     path('api/posts/messages/sent/', SentMessagesView.as_view(), name='sent-messages'),
     path('api/posts/messages/inbox/', InboxView.as_view(), name='inbox'),
     path('api/posts/messages/<int:message_id>/detail/', MessageDetailView.as_view(), name='message_detail'),
     path('api/posts/messages/<int:message_id>/delete/', DeleteMessageView.as_view(), name='message_detail'),
+    path('api/posts/conversations/', ConversationListView.as_view(), name='conversation-list'),
+    path('api/posts/conversations/<int:conversation_id>/messages/', ConversationMessagesView.as_view(), name='conversation-messages'),
 
     path('api/posts/notifications/', NotificationListView.as_view(), name='notification-list'),
+    path('api/posts/notifications/unread-count/', UnreadNotificationCountView.as_view(), name='notification-unread-count'),
+    path('api/posts/notifications/mark-read/', MarkNotificationsReadView.as_view(), name='notification-mark-read'),
+    path('api/posts/notifications/metrics/', NotificationMetricsView.as_view(), name='notification-metrics'),
+
+    path('api/posts/stream/', activity_stream, name='activity-stream'),
+
+    path('api/posts/cache/stats/', PostCacheStatsView.as_view(), name='post-cache-stats'),
 ]
@@ -1,10 +1,52 @@
-from .models import Notification
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from .models import Comment, Like, Post
+from .cache import post_cache
+from .notifications import dispatcher
 
 def create_notification(user, sender, post, notification_type, message):
-    Notification.objects.create(
-        user=user,
-        sender=sender,
-        post=post,
-        notification_type=notification_type,
-        message=message
-    )
+    # Queued for the notification workers; never raises into the calling view
+    dispatcher.dispatch(user, sender, post, notification_type, message)
+
+
+def create_notifications(notifications):
+    # Several (user, sender, post, type, message) tuples; one batched write in sync mode
+    dispatcher.dispatch_many(notifications)
+
+
+def update_post_counter(post_id, field, delta):
+    update_post_counters([post_id], field, delta)
+
+
+def update_post_counters(post_ids, field, delta):
+    # Atomic in-database increment/decrement; never drops below zero if the counter drifted
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    Post.objects.filter(id__in=post_ids).update(**{field: Greatest(F(field) + delta, 0)})
+    post_cache.invalidate(post_ids)
+
+
+def _count_subquery(model, field='post'):
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+def reconcile_post_counters(posts):
+    # Recompute like/comment/repost counters for `posts` and rewrite only the rows that drifted
+    drifted = posts.annotate(
+        actual_likes=_count_subquery(Like),
+        actual_comments=_count_subquery(Comment),
+        actual_reposts=_count_subquery(Post, 'shared_post'),
+    ).filter(
+        ~Q(like_count=F('actual_likes')) | ~Q(comment_count=F('actual_comments')) | ~Q(repost_count=F('actual_reposts'))
+    ).values_list('id', flat=True)
+    drifted_ids = list(drifted)
+    if drifted_ids:
+        Post.objects.filter(id__in=drifted_ids).update(
+            like_count=_count_subquery(Like),
+            comment_count=_count_subquery(Comment),
+            repost_count=_count_subquery(Post, 'shared_post'),
+        )
+        post_cache.invalidate(drifted_ids)
+    return len(drifted_ids)
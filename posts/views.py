@@ -1,16 +1,26 @@
 from rest_framework import generics, permissions, status
-from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.exceptions import APIException, NotFound, UnsupportedMediaType, ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import Post, Like, Comment, Notification, DirectMessage
-from users.models import Follow
+from .models import Post, Like, Comment, Notification, DirectMessage, ConversationParticipant
 from django.contrib.auth.models import User
-from .serializers import PostSerializer, LikeSerializer, CommentSerializer, NotificationSerializer, DirectMessageSerializer, SentMessageSerializer, InboxMessageSerializer
+from .serializers import PostSerializer, LikeSerializer, CommentSerializer, NotificationSerializer, DirectMessageSerializer, SentMessageSerializer, InboxMessageSerializer, ConversationSerializer, MediaUploadCreateSerializer, MediaUploadSerializer
 from rest_framework.pagination import PageNumberPagination
-from .utils import create_notification
+from social_media_api.pagination import CursorOrPagePagination, KeysetPagination
+from social_media_api.throttling import SlidingWindowThrottle
+from social_media_api.conditional import ConditionalGetMixin, etag_for
+from social_media_api.bulk import BulkItemsMixin
+from social_media_api.media import media_processor
+from .reposts import AlreadyReposted, create_repost, delete_repost
+from .uploads import create_upload, discard_upload, open_uploads, write_chunk
+from .utils import create_notification, create_notifications, update_post_counter, update_post_counters
+from .timeline import HybridFeed, fan_out_post
+from .search import get_search_backend
+from .cache import FRAGMENT_SCHEMA, post_cache
+from .notifications import dispatcher
+from .conversations import send_direct_message, mark_conversation_read, message_read, delete_direct_message
 from django.utils import timezone
-from datetime import timedelta
-from django.db.models import Q
+from django.db import transaction
 
 
 
@@ -29,118 +39,166 @@ class CustomPagination(PageNumberPagination):
     max_page_size = 50
 
 
+class PostPagination(CursorOrPagePagination):
+    # `?cursor=` switches to keyset pagination on (timestamp, id)
+    page_pagination_class = CustomPagination
+
+
+class CommentPagination(CursorOrPagePagination):
+    # Unpaginated unless the client asks for a cursor
+    page_pagination_class = None
+
+
 # ============ Post CRUD Views =============
 
-class PostListView(generics.ListAPIView):
+def filter_posts(queryset, params):
+    # Author and published date filters, shared by the sync and async post lists
+    author = params.get('author', None)
+    published_after = params.get('published_after', None)
+    published_before = params.get('published_before', None)
+
+    # Filter by author
+    if author:
+        queryset = queryset.filter(author__username=author)
+
+    # Filter by published date range (relative to today)
+    if published_after:
+        try:
+            # Published after N days ago
+            days_after = int(published_after)
+            date_after = timezone.now() - timezone.timedelta(days=days_after)
+            queryset = queryset.filter(timestamp__gte=date_after)
+        except ValueError:
+            raise ValidationError("Invalid 'published_after'. Please provide an integer value for days.")
+
+    if published_before:
+        try:
+            # Published before N days ago
+            days_before = int(published_before)
+            date_before = timezone.now() - timezone.timedelta(days=days_before)
+            queryset = queryset.filter(timestamp__lte=date_before)
+        except ValueError:
+            raise ValidationError("Invalid 'published_before'. Please provide an integer value for days.")
+    return queryset
+
+
+class PostListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    pagination_class = CustomPagination
+    pagination_class = PostPagination
+    # Plus one for the originals of any reposts on the page (posts.reposts.load_originals)
+    query_budget = 4
+    # Same for every reader, so shared caches may keep it briefly
+    cache_control = {'public': True, 'max_age': 30}
+
+    def get_etag(self, request, *args, **kwargs):
+        # Any post write bumps the collection version; the path covers filters and page
+        return etag_for('posts', FRAGMENT_SCHEMA, post_cache.collection_version(), request.get_full_path())
 
     def get_queryset(self):
-        queryset = Post.objects.all()
+        queryset = Post.objects.select_related('author')
 
         # Get query parameters
         params = self.request.query_params
+        queryset = filter_posts(queryset, params)
 
-        # Filtering by multiple fields
-        author = params.get('author', None)
-        title = params.get('title', None)
-        published_after = params.get('published_after', None)
-        published_before = params.get('published_before', None)
-
-        # Search functionality (across multiple fields: title, content)
+        # Full-text search over the post content
         search = params.get('search', None)
 
-        # Filter by author
-        if author:
-            queryset = queryset.filter(author__username=author)
-
-        # Filter by title (partial match)
-        if title:
-            queryset = queryset.filter(title__icontains=title)
-
-        # Filter by published date range (relative to today)
-        if published_after:
-            try:
-                # Published after N days ago
-                days_after = int(published_after)
-                date_after = timezone.now() - timezone.timedelta(days=days_after)
-                queryset = queryset.filter(timestamp__gte=date_after)
-            except ValueError:
-                raise ValidationError("Invalid 'published_after'. Please provide an integer value for days.")
-
-        if published_before:
-            try:
-                # Published before N days ago
-                days_before = int(published_before)
-                date_before = timezone.now() - timezone.timedelta(days=days_before)
-                queryset = queryset.filter(timestamp__lte=date_before)
-            except ValueError:
-                raise ValidationError("Invalid 'published_before'. Please provide an integer value for days.")
-
-        # Search functionality across multiple fields
-        if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) | Q(content__icontains=search)
-            )
-
         # Ordering by fields passed in query parameters (supports multiple fields)
         ordering = params.get('ordering', None)
+        if (ordering or search) and self.paginator.is_cursor_request(self.request):
+            raise ValidationError("'ordering' and 'search' cannot be combined with 'cursor'; cursor pages are always newest first.")
+
+        # Ranked full-text search, applied on top of the author/date filters
+        if search:
+            queryset = get_search_backend().search(queryset, search)
+        elif not ordering:
+            # Newest first in page mode too, read from the (-timestamp, -id) index
+            queryset = queryset.order_by('-timestamp', '-id')
+
         if ordering:
             ordering_fields = ordering.split(',')
             # Validating the ordering fields
-            allowed_fields = ['timestamp', 'title', 'author__username', 'content']
+            allowed_fields = ['timestamp', 'author__username', 'content']
             for field in ordering_fields:
                 if field.lstrip('-') not in allowed_fields:
                     raise ValidationError(f"Invalid ordering field '{field}'. Allowed fields are {allowed_fields}.")
-            queryset = queryset.order_by(*ordering_fields)
+            # id breaks ties so rows don't move between pages
+            queryset = queryset.order_by(*ordering_fields, '-id')
         return queryset
     
     
 class PostCreateView(generics.CreateAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'post': 8}
 
     def perform_create(self, serializer):
         # Automatically set the author to the logged-in user
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        # Renditions are built in the background; the post reads 'pending' until then
+        if post.media:
+            media_processor.schedule(post, 'media')
+
+        # Push the new post into the home timeline of every follower
+        fan_out_post(post)
+        # New post: list ETags must change
+        post_cache.invalidate([post.id])
 
         
-class PostRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Post.objects.all()
+class PostRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Post.objects.select_related('author')
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # put/patch include reindexing the content when the inverted-index search backend is active;
+    # get includes looking up what a post reposts, once per post, and its original
+    query_budget = {'get': 4, 'put': 6, 'patch': 6, 'delete': 12}
+
+    def get_etag(self, request, pk, *args, **kwargs):
+        # The fragment cache's version tokens: bumped by edits, likes, comments and author renames.
+        # A repost embeds its original, so the original's token is part of the ETag too
+        post_ids = [post_id for post_id in (pk, post_cache.shared_post_id(pk)) if post_id is not None]
+        versions = post_cache.versions(post_ids)
+        return etag_for('post', FRAGMENT_SCHEMA, *post_ids, *(versions[post_id] for post_id in post_ids))
 
     def perform_update(self, serializer):
         # Ensure only the author can update their post
-        if self.request.user != serializer.instance.author:
+        if self.request.user.id != serializer.instance.author_id:
             raise PermissionError()
         serializer.save()
+        if 'media' in serializer.validated_data:
+            media_processor.schedule(serializer.instance, 'media')
+        post_cache.invalidate([serializer.instance.id])
 
     def perform_destroy(self, instance):
         # Ensure only the author can delete their post
-        if self.request.user != instance.author:
+        if self.request.user.id != instance.author_id:
             raise PermissionError()
-        instance.delete()
+        post_id = instance.id
+        if instance.shared_post_id is not None:
+            delete_repost(instance)
+        else:
+            instance.delete()
+        post_cache.invalidate([post_id])
 
 
 # ============ Feed and Pagination =============
 
 class FeedView(APIView):
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = CustomPagination
+    pagination_class = PostPagination
+    # Plus one for the originals of any reposts on the page (posts.reposts.load_originals)
+    query_budget = 7
 
     def get(self, request, *args, **kwargs):
-        # Get the list of users the current user is following
-        following_users = Follow.objects.filter(follower=request.user).values_list('following', flat=True)
-        
-        # Query posts from these users, ordered by timestamp
-        posts = Post.objects.filter(author__in=following_users).order_by('-timestamp')
+        # Pushed timeline merged with posts pulled from followed celebrity authors
+        feed = HybridFeed(request.user)
+
+        # Paginate the merged feed
+        paginator = self.pagination_class()
+        paginated_posts = paginator.paginate_queryset(feed, request)
 
-        # Paginate the posts
-        paginator = CustomPagination()
-        paginated_posts = paginator.paginate_queryset(posts, request)
-        
         # Serialize the paginated posts
         serializer = PostSerializer(paginated_posts, many=True)
         return paginator.get_paginated_response(serializer.data)
@@ -151,9 +209,13 @@ class FeedView(APIView):
 
 class LikePostView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'like'
+    # Includes the coalesced notification write, which only runs inline in sync dispatch mode
+    query_budget = {'post': 10}
 
     def post(self, request, post_id, *args, **kwargs):
-        post = Post.objects.filter(id=post_id).first()
+        post = Post.objects.select_related('author').filter(id=post_id).first()
         if post is None:
             return Response({"detail": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -161,7 +223,9 @@ class LikePostView(APIView):
         if Like.objects.filter(user=request.user, post=post).exists():
             return Response({"detail": "You have already liked this post."}, status=status.HTTP_400_BAD_REQUEST)
 
-        like = Like.objects.create(user=request.user, post=post)
+        with transaction.atomic():
+            like = Like.objects.create(user=request.user, post=post)
+            update_post_counter(post.id, 'like_count', 1)
         create_notification(
             user=post.author,
             sender=request.user,
@@ -173,6 +237,7 @@ class LikePostView(APIView):
 
 class UnlikePostView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'delete': 6}
 
     def delete(self, request, post_id, *args, **kwargs):
         post = Post.objects.filter(id=post_id).first()
@@ -181,19 +246,63 @@ class UnlikePostView(APIView):
 
         like = Like.objects.filter(user=request.user, post=post).first()
         if like:
-            like.delete()
+            with transaction.atomic():
+                like.delete()
+                update_post_counter(post.id, 'like_count', -1)
             return Response({"detail": "You have unliked this post."}, status=status.HTTP_200_OK)
         return Response({"detail": "You have not liked this post."}, status=status.HTTP_400_BAD_REQUEST)
 
 
+# ============ Repost Views =============
+
+class RepostView(APIView):
+    """POST reposts a post to the user's followers, with an optional `content` comment; DELETE undoes it.
+
+    Reposting a repost shares the original it points at, and each user can
+    repost an original once.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = {'post': 'repost'}
+    # post includes the timeline fan-out and the notification write, which only runs inline in sync
+    # dispatch mode; delete includes the cascade over the repost's likes, comments and timeline entries
+    query_budget = {'post': 14, 'delete': 13}
+
+    def post(self, request, post_id, *args, **kwargs):
+        post = Post.objects.filter(id=post_id).select_related('author').first()
+        if post is None:
+            return Response({"detail": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            repost = create_repost(request.user, post, request.data.get('content', ''))
+        except AlreadyReposted:
+            return Response({"detail": "You have already reposted this post."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(PostSerializer(repost, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, post_id, *args, **kwargs):
+        post = Post.objects.filter(id=post_id).only('id', 'shared_post_id').first()
+        if post is None:
+            return Response({"detail": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
+        original_id = post.shared_post_id or post.id
+        repost = Post.objects.filter(author=request.user, shared_post_id=original_id).first()
+        if repost is None:
+            return Response({"detail": "You have not reposted this post."}, status=status.HTTP_400_BAD_REQUEST)
+        delete_repost(repost)
+        post_cache.invalidate([repost.id])
+        return Response({"detail": "Your repost has been removed."}, status=status.HTTP_200_OK)
+
+
 # ============ Comment Views =============
 
 class CommentPostView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = {'post': 'comment'}
+    # POST includes the coalesced notification write, which only runs inline in sync dispatch mode
+    query_budget = {'post': 10, 'put': 5, 'delete': 7}
 
     # Create a comment
     def post(self, request, post_id, *args, **kwargs):
-        post = Post.objects.filter(id=post_id).first()
+        post = Post.objects.select_related('author').filter(id=post_id).first()
         if post is None:
             return Response({"detail": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -201,7 +310,9 @@ class CommentPostView(APIView):
         if not content:
             return Response({"detail": "Content is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        comment = Comment.objects.create(user=request.user, post=post, content=content)
+        with transaction.atomic():
+            comment = Comment.objects.create(user=request.user, post=post, content=content)
+            update_post_counter(post.id, 'comment_count', 1)
         create_notification(
             user=post.author,
             sender=request.user,
@@ -221,7 +332,7 @@ class CommentPostView(APIView):
         if comment is None:
             return Response({"detail": "Comment not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        if comment.user != request.user:
+        if comment.user_id != request.user.id:
             return Response({"detail": "You do not have permission to edit this comment."}, status=status.HTTP_403_FORBIDDEN)
 
         content = request.data.get("content", "").strip()
@@ -230,6 +341,8 @@ class CommentPostView(APIView):
 
         comment.content = content
         comment.save()
+        # The post's version also validates its comment list
+        post_cache.invalidate([post.id])
 
         return Response(CommentSerializer(comment).data, status=status.HTTP_200_OK)
 
@@ -243,26 +356,113 @@ class CommentPostView(APIView):
         if comment is None:
             return Response({"detail": "Comment not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        if comment.user != request.user:
+        if comment.user_id != request.user.id:
             return Response({"detail": "You do not have permission to delete this comment."}, status=status.HTTP_403_FORBIDDEN)
 
-        comment.delete()
+        with transaction.atomic():
+            comment.delete()
+            update_post_counter(post.id, 'comment_count', -1)
         return Response({"detail": "Comment deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
     
 
-class PostCommentsView(generics.ListAPIView):
+class PostCommentsView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = CommentSerializer
+    pagination_class = CommentPagination
+    query_budget = 2
+
+    def get_etag(self, request, post_id, *args, **kwargs):
+        # Adding, editing or deleting a comment bumps the post's version
+        return etag_for('comments', post_id, post_cache.version(post_id), request.get_full_path())
 
     def get_queryset(self):
         post_id = self.kwargs.get('post_id')
-        return Comment.objects.filter(post_id=post_id)
+        return Comment.objects.filter(post_id=post_id).select_related('user')
+
+
+# ============ Bulk Views =============
+# Batch versions of the like/unlike and post detail endpoints. Each takes up to
+# BULK_MAX_ITEMS ids and answers with one status per id, in request order.
+
+class BulkPostFetchView(BulkItemsMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    # Plus one for the originals of any reposts on the page (posts.reposts.load_originals)
+    query_budget = 3
+
+    def get(self, request, *args, **kwargs):
+        post_ids = self.get_items(request)
+        posts = Post.objects.select_related('author').in_bulk(post_ids)
+        rendered = dict(zip(posts, PostSerializer(list(posts.values()), many=True).data))
+        results = [
+            {"id": post_id, "status": "ok", "post": rendered[post_id]} if post_id in rendered
+            else {"id": post_id, "status": "not_found"}
+            for post_id in post_ids
+        ]
+        return Response({"results": results})
+
+
+class BulkLikeView(BulkItemsMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [SlidingWindowThrottle]
+    # Every post in the batch counts against the like limit
+    throttle_scope = 'like'
+    bulk_field = 'post_ids'
+    # Includes the batched notification write, which only runs inline in sync dispatch mode
+    query_budget = {'post': 10}
+
+    def post(self, request, *args, **kwargs):
+        post_ids = self.get_items(request)
+        posts = Post.objects.select_related('author').only('id', 'author__id', 'author__username').in_bulk(post_ids)
+        liked = set(Like.objects.filter(user=request.user, post_id__in=posts).values_list('post_id', flat=True))
+        new_ids = [post_id for post_id in post_ids if post_id in posts and post_id not in liked]
+
+        with transaction.atomic():
+            # A like racing in between is skipped here but still counted;
+            # reconcile_post_counters repairs that drift
+            Like.objects.bulk_create([Like(user=request.user, post_id=post_id) for post_id in new_ids], ignore_conflicts=True)
+            update_post_counters(new_ids, 'like_count', 1)
+        create_notifications([
+            (posts[post_id].author, request.user, posts[post_id], "like", f"{request.user.username} liked your post.")
+            for post_id in new_ids
+        ])
+
+        statuses = {post_id: "liked" for post_id in new_ids}
+        statuses.update({post_id: "already_liked" for post_id in liked})
+        return Response({"results": [
+            {"post_id": post_id, "status": statuses.get(post_id, "not_found")} for post_id in post_ids
+        ]})
+
+
+class BulkUnlikeView(BulkItemsMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    bulk_field = 'post_ids'
+    query_budget = {'post': 7}
+
+    def post(self, request, *args, **kwargs):
+        post_ids = self.get_items(request)
+        found = set(Post.objects.filter(id__in=post_ids).values_list('id', flat=True))
+        liked = list(Like.objects.filter(user=request.user, post_id__in=found).values_list('post_id', flat=True))
+
+        with transaction.atomic():
+            Like.objects.filter(user=request.user, post_id__in=liked).delete()
+            update_post_counters(liked, 'like_count', -1)
+
+        statuses = {post_id: "not_liked" for post_id in found}
+        statuses.update({post_id: "unliked" for post_id in liked})
+        return Response({"results": [
+            {"post_id": post_id, "status": statuses.get(post_id, "not_found")} for post_id in post_ids
+        ]})
 
 
 # ============ Direct Message Views =============
 
 class SendMessageView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    # Rate limited to THROTTLE_RATE_DIRECT_MESSAGE (5 per 30 minutes by default)
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'direct_message'
+    # The first message between two users also opens their conversation
+    query_budget = {'post': 15}
 
     def post(self, request, *args, **kwargs):
         recipient_username = request.data.get("recipient")
@@ -272,16 +472,6 @@ class SendMessageView(APIView):
         if not recipient_username or not content:
             return Response({"detail": "Recipient and content are required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Rate limiting: no more than 5 messages in 30 minutes
-        recent_messages = DirectMessage.objects.filter(
-            sender=request.user, timestamp__gte=timezone.now() - timedelta(minutes=30)
-        )
-        if recent_messages.count() >= 5:
-            return Response(
-                {"detail": "You have reached your message limit. Please try again later."},
-                status=status.HTTP_429_TOO_MANY_REQUESTS,
-            )
-
         recipient = User.objects.filter(username=recipient_username).first()
         if not recipient:
             return Response({"detail": "Recipient not found."}, status=status.HTTP_400_BAD_REQUEST)
@@ -295,8 +485,8 @@ class SendMessageView(APIView):
             if not post:
                 return Response({"detail": "Post not found."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create the direct message
-        message = DirectMessage.objects.create(sender=request.user, recipient=recipient, content=content)
+        # Create the direct message in the pair's conversation
+        message = send_direct_message(request.user, recipient, content)
 
         # Create a notification for the recipient
         create_notification(
@@ -312,11 +502,21 @@ class SendMessageView(APIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class MessagePagination(CursorOrPagePagination):
+    # Unpaginated as before unless the client asks for a cursor
+    page_pagination_class = None
+
+
 class InboxView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 2
 
     def get(self, request, *args, **kwargs):
-        messages = DirectMessage.objects.filter(recipient=request.user).order_by('-timestamp')
+        messages = DirectMessage.objects.filter(recipient=request.user).select_related('sender').order_by('-timestamp', '-id')
+        paginator = MessagePagination()
+        page = paginator.paginate_queryset(messages, request, view=self)
+        if page is not None:
+            return paginator.get_paginated_response(InboxMessageSerializer(page, many=True).data)
         serializer = InboxMessageSerializer(messages, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -324,31 +524,77 @@ class InboxView(APIView):
 # Sent Messages View (including recipient field)
 class SentMessagesView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 2
 
     def get(self, request, *args, **kwargs):
-        messages = DirectMessage.objects.filter(sender=request.user).order_by('-timestamp')
+        messages = DirectMessage.objects.filter(sender=request.user).select_related('recipient').order_by('-timestamp', '-id')
+        paginator = MessagePagination()
+        page = paginator.paginate_queryset(messages, request, view=self)
+        if page is not None:
+            return paginator.get_paginated_response(SentMessageSerializer(page, many=True).data)
         serializer = SentMessageSerializer(messages, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+# ============ Conversation Views =============
+
+class ConversationPagination(KeysetPagination):
+    ordering = ('last_message_at', 'id')
+
+
+class ConversationListView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 2
+
+    def get(self, request, *args, **kwargs):
+        # Chat list: newest conversation first, straight off (user, -last_message_at, -id)
+        conversations = ConversationParticipant.objects.filter(
+            user=request.user, last_message_at__isnull=False
+        ).select_related('conversation__user_low', 'conversation__user_high', 'conversation__last_message')
+        paginator = ConversationPagination()
+        page = paginator.paginate_queryset(conversations, request, view=self)
+        return paginator.get_paginated_response(ConversationSerializer(page, many=True).data)
+
+
+class ConversationMessagesView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': 7}
+
+    def get(self, request, conversation_id, *args, **kwargs):
+        participant = ConversationParticipant.objects.filter(conversation_id=conversation_id, user=request.user).first()
+        if participant is None:
+            return Response({"detail": "Conversation not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        # Opening the thread (first page) reads everything in it
+        paginator = KeysetPagination()
+        if not request.query_params.get(paginator.cursor_query_param):
+            mark_conversation_read(participant)
+
+        messages = DirectMessage.objects.filter(conversation_id=conversation_id).select_related('sender', 'recipient')
+        page = paginator.paginate_queryset(messages, request, view=self)
+        return paginator.get_paginated_response(DirectMessageSerializer(page, many=True).data)
+
+
 # Message Detail View
 class MessageDetailView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': 3}
 
     def get(self, request, message_id, *args, **kwargs):
-        message = DirectMessage.objects.filter(id=message_id, recipient=request.user).first()
+        message = DirectMessage.objects.filter(id=message_id, recipient=request.user).select_related('sender', 'recipient').first()
 
         if not message:
             return Response({"detail": "Message not found."}, status=status.HTTP_404_NOT_FOUND)
         
         # Ensure the requesting user is either the sender or the recipient of the message
-        if message.sender != request.user and message.recipient != request.user:
+        if message.sender_id != request.user.id and message.recipient_id != request.user.id:
             return Response({"detail": "You do not have permission to view this message."}, status=status.HTTP_403_FORBIDDEN)
 
         # Mark message as read
         if not message.is_read:
             message.is_read = True
             message.save()
+            message_read(message)
 
         # Serialize the message with full details
         serializer = DirectMessageSerializer(message)
@@ -358,6 +604,8 @@ class MessageDetailView(APIView):
 # Delete Message View
 class DeleteMessageView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    # Deleting a conversation's latest message also repoints it at the one before
+    query_budget = {'delete': 10}
 
     def delete(self, request, message_id, *args, **kwargs):
         message = DirectMessage.objects.filter(id=message_id).first()
@@ -366,20 +614,156 @@ class DeleteMessageView(APIView):
             return Response({"detail": "Message not found."}, status=status.HTTP_404_NOT_FOUND)
         
         # Ensure that the user is either the sender or recipient
-        if message.sender != request.user and message.recipient != request.user:
+        if message.sender_id != request.user.id and message.recipient_id != request.user.id:
             return Response({"detail": "You are not authorized to delete this message."}, status=status.HTTP_403_FORBIDDEN)
 
-        message.delete()
+        delete_direct_message(message)
         return Response({"detail": "Message deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
    
 
 # ============ Notification Views =============
 
+class NotificationPagination(CursorOrPagePagination):
+    # Unpaginated as before unless the client asks for a cursor
+    page_pagination_class = None
+
+
 class NotificationListView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
 
     def get(self, request, *args, **kwargs):
-        notifications = Notification.objects.filter(user=request.user).order_by('-timestamp')
-        serializer = NotificationSerializer(notifications, many=True)
+        notifications = Notification.objects.filter(user=request.user).select_related('sender')
+        # ?unread=true keeps to the (user, is_read, -timestamp) index
+        if request.query_params.get('unread', '').lower() in ('1', 'true', 'yes'):
+            notifications = notifications.filter(is_read=False)
+
+        paginator = NotificationPagination()
+        page = paginator.paginate_queryset(notifications, request, view=self)
+        if page is None:
+            page = list(notifications.order_by('-timestamp', '-id'))
+        context = {'actor_names': NotificationSerializer.actor_names(page)}
+        serializer = NotificationSerializer(page, many=True, context=context)
+        if paginator.delegate is not None:
+            return paginator.get_paginated_response(serializer.data)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class UnreadNotificationCountView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 2
+
+    def get(self, request, *args, **kwargs):
+        # Counted straight off the (user, is_read, ...) index
+        unread = Notification.objects.filter(user=request.user, is_read=False).count()
+        return Response({"unread_count": unread}, status=status.HTTP_200_OK)
+
+
+class MarkNotificationsReadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'post': 2}
+    max_ids = 500
+
+    def post(self, request, *args, **kwargs):
+        # {"ids": [1, 2, 3]} marks those notifications; no ids marks everything unread
+        ids = request.data.get("ids")
+        notifications = Notification.objects.filter(user=request.user, is_read=False)
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+                return Response({"detail": "ids must be a list of notification ids."}, status=status.HTTP_400_BAD_REQUEST)
+            if len(ids) > self.max_ids:
+                return Response({"detail": f"At most {self.max_ids} ids per request."}, status=status.HTTP_400_BAD_REQUEST)
+            notifications = notifications.filter(id__in=ids)
+
+        marked = notifications.update(is_read=True)
+        return Response({"marked_read": marked}, status=status.HTTP_200_OK)
+
+
+class NotificationMetricsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    query_budget = 2
+
+    def get(self, request, *args, **kwargs):
+        # Queue depth and batch sizes of this worker process's notification dispatcher
+        return Response(dispatcher.metrics(), status=status.HTTP_200_OK)
+
+
+# ============ Resumable Upload Views =============
+
+class MediaUploadCreateView(APIView):
+    """Start a chunked, resumable image upload for post media or a profile picture.
+
+    The body is JSON: target, filename and size in bytes. Sizes over
+    MEDIA_UPLOAD_MAX_BYTES are refused before any of the file is sent. The
+    chunks then go to the Location returned, and the finished upload's id is
+    passed as `media_upload` or `profile_picture_upload`.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'upload'
+    query_budget = {'post': 1}
+
+    def post(self, request, *args, **kwargs):
+        serializer = MediaUploadCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = create_upload(request.user, **serializer.validated_data)
+        return Response(MediaUploadSerializer(upload).data, status=status.HTTP_201_CREATED, headers={
+            'Location': request.build_absolute_uri(f'/api/posts/uploads/{upload.id}/'),
+            'Upload-Offset': str(upload.offset),
+        })
+
+
+class MediaUploadDetailView(APIView):
+    """GET (or HEAD) reports how much of an upload has arrived, PATCH adds a chunk, DELETE abandons it.
+
+    A chunk is the raw request body, sent as application/offset+octet-stream.
+    Its Upload-Offset header must match the upload's current offset. The body
+    is streamed to storage without going through DRF's parsers (see
+    posts.uploads.write_chunk). After an interrupted chunk, GET the upload and
+    carry on from the offset it reports.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    chunk_content_types = ['application/offset+octet-stream', 'application/octet-stream']
+    query_budget = {'get': 1, 'patch': 3, 'delete': 2}
+
+    def get_upload(self, request, upload_id):
+        upload = open_uploads(request.user).filter(pk=upload_id).first()
+        if upload is None:
+            raise NotFound("Unknown or expired upload.")
+        return upload
+
+    def upload_response(self, upload):
+        return Response(MediaUploadSerializer(upload).data, headers={
+            'Upload-Offset': str(upload.offset), 'Cache-Control': 'no-store',
+        })
+
+    def get(self, request, upload_id, *args, **kwargs):
+        return self.upload_response(self.get_upload(request, upload_id))
+
+    def patch(self, request, upload_id, *args, **kwargs):
+        if request.content_type.split(';')[0].strip() not in self.chunk_content_types:
+            raise UnsupportedMediaType(request.content_type)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            raise ValidationError("Chunks need an Upload-Offset header.")
+        upload = self.get_upload(request, upload_id)
+        # Read from the request stream; request.data would buffer the whole chunk first
+        return self.upload_response(write_chunk(upload, request.stream, offset, length))
+
+    def delete(self, request, upload_id, *args, **kwargs):
+        discard_upload(self.get_upload(request, upload_id))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# ============ Cache Stats View =============
+
+class PostCacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    query_budget = 1
+
+    def get(self, request, *args, **kwargs):
+        # Hit/miss counters of this worker process's post fragment cache
+        return Response(post_cache.stats(), status=status.HTTP_200_OK)
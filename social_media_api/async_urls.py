@@ -0,0 +1,17 @@
+from django.urls import path
+
+from posts.async_views import (
+    AsyncFeedView, AsyncPostListView, AsyncPostDetailView, AsyncPostCommentsView, AsyncNotificationListView,
+)
+from users.async_views import AsyncUserFollowersListView, AsyncUserFollowingListView
+
+# Async read endpoints, mounted under /api/async/ (see AsyncAPIView)
+urlpatterns = [
+    path('posts/', AsyncPostListView.as_view(), name='async-post-list'),
+    path('posts/feed/', AsyncFeedView.as_view(), name='async-feed'),
+    path('posts/<int:pk>/', AsyncPostDetailView.as_view(), name='async-post-detail'),
+    path('posts/<int:post_id>/comments/', AsyncPostCommentsView.as_view(), name='async-comments'),
+    path('notifications/', AsyncNotificationListView.as_view(), name='async-notification-list'),
+    path('users/followers/<str:username>/', AsyncUserFollowersListView.as_view(), name='async-user-followers'),
+    path('users/following/<str:username>/', AsyncUserFollowingListView.as_view(), name='async-user-following'),
+]
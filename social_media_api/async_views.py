@@ -0,0 +1,47 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import exceptions, permissions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# ============ Async API View =============
+
+class AsyncAPIView(View):
+    """Minimal async counterpart of DRF's APIView for read endpoints.
+
+    DRF 3.15 views are sync only. This view runs DRF's authentication classes
+    in a worker thread (they may hit the database), checks DRF permission
+    classes, and maps APIExceptions to JSON errors the way the sync views do.
+    The handler itself runs on the event loop and must use the async ORM
+    (`aget`, `async for`, ...). Handlers return plain data, or a
+    (data, status) tuple.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = [permissions.IsAuthenticated]
+    http_method_names = ['get']
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        self.request = request
+        try:
+            # Touching .user runs the authenticators
+            await sync_to_async(lambda: request.user)()
+            for permission in [permission() for permission in self.permission_classes]:
+                if not permission.has_permission(request, self):
+                    if request.successful_authenticator is None:
+                        raise exceptions.NotAuthenticated()
+                    raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            result = await handler(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return JsonResponse(detail, status=exc.status_code, encoder=JSONEncoder, safe=False)
+
+        data, status = result if isinstance(result, tuple) else (result, 200)
+        return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
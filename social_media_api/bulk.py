@@ -0,0 +1,53 @@
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+
+def bulk_max_items():
+    return getattr(settings, 'BULK_MAX_ITEMS', 100)
+
+
+# ============ Bulk Items Mixin =============
+
+class BulkItemsMixin:
+    """Reads the item list of a batch endpoint.
+
+    Items come from the `bulk_field` list in the request body or, for GET, from
+    a comma-separated query parameter of that name. They are cast with
+    `bulk_cast`, de-duplicated (first occurrence wins) and capped at
+    BULK_MAX_ITEMS. Each item counts against the view's throttle.
+    """
+    bulk_field = 'ids'
+    bulk_cast = int
+
+    def get_items(self, request):
+        if not hasattr(self, '_bulk_items'):
+            self._bulk_items = self._parse_items(request)
+        return self._bulk_items
+
+    def _parse_items(self, request):
+        field = self.bulk_field
+        if request.method == 'GET':
+            raw = [item for item in request.query_params.get(field, '').split(',') if item]
+        elif isinstance(request.data, dict):
+            raw = request.data.get(field)
+        else:
+            raise ValidationError({field: "Send an object with this field, not a bare list or value."})
+        if not isinstance(raw, list) or not raw:
+            raise ValidationError({field: "Provide a non-empty list."})
+        if len(raw) > bulk_max_items():
+            raise ValidationError({field: f"At most {bulk_max_items()} items per request."})
+        # int(True) is 1, so booleans would pass the cast as ids
+        if any(isinstance(item, bool) for item in raw):
+            raise ValidationError({field: "Contains an invalid item."})
+        try:
+            items = [self.bulk_cast(item) for item in raw]
+        except (TypeError, ValueError):
+            raise ValidationError({field: "Contains an invalid item."})
+        return list(dict.fromkeys(items))
+
+    def get_throttle_cost(self, request):
+        # Throttles run before the handler; a malformed list costs one and fails later
+        try:
+            return max(len(self.get_items(request)), 1)
+        except ValidationError:
+            return 1
@@ -0,0 +1,68 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def etag_for(*parts):
+    """A compact ETag value from version tokens, request paths and the like."""
+    return hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+class _ConditionalResponse(Exception):
+    # Carries the 304/412 out of APIView.initial() to handle_exception()
+    def __init__(self, response):
+        self.response = response
+
+
+# ============ Conditional GET Mixin =============
+
+class ConditionalGetMixin:
+    """Conditional GET for DRF views.
+
+    Views override `get_etag()` and/or `get_last_modified()`. These must
+    be cheap: a version token or a single aggregate, never the serialized
+    body. The validators are checked after authentication, permissions
+    and throttling. A matching If-None-Match or If-Modified-Since is
+    answered with 304 before the handler runs. Successful GET responses
+    carry the validators, plus the view's `cache_control` policy (keyword
+    arguments for `django.utils.cache.patch_cache_control`).
+    """
+    cache_control = {'private': True, 'no_cache': True}
+
+    def get_etag(self, request, *args, **kwargs):
+        return None
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._etag = self._last_modified = None
+        if request.method not in ('GET', 'HEAD'):
+            return
+
+        etag = self.get_etag(request, *args, **kwargs)
+        self._etag = quote_etag(etag) if etag else None
+        last_modified = self.get_last_modified(request, *args, **kwargs)
+        self._last_modified = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request._request, etag=self._etag, last_modified=self._last_modified)
+        if response is not None:
+            raise _ConditionalResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _ConditionalResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+            if getattr(self, '_etag', None):
+                response.headers.setdefault('ETag', self._etag)
+            if getattr(self, '_last_modified', None):
+                response.headers.setdefault('Last-Modified', http_date(self._last_modified))
+            if self.cache_control:
+                patch_cache_control(response, **self.cache_control)
+        return response
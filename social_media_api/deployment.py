@@ -0,0 +1,52 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .pubsub import broker_path
+
+logger = logging.getLogger(__name__)
+
+# Cache backends whose entries live in one worker process and are never seen by the others
+PER_PROCESS_CACHE_BACKENDS = frozenset({
+    'django.core.cache.backends.locmem.LocMemCache',
+})
+
+
+def worker_count():
+    """Worker processes serving requests: WEB_CONCURRENCY, which gunicorn reads and Heroku sets."""
+    return getattr(settings, 'WEB_CONCURRENCY', 1)
+
+
+def require_shared_cache(setting):
+    """Refuse to start several workers when the cache alias in `setting` is per-process.
+
+    For caches that hold version tokens or invalidated entries: a write in one
+    worker must reach the reads in every other worker, or they serve stale data
+    until the entries time out. Called from the apps' `ready()`.
+    """
+    alias = getattr(settings, setting, 'default')
+    backend = settings.CACHES[alias]['BACKEND']
+    if worker_count() > 1 and backend in PER_PROCESS_CACHE_BACKENDS:
+        raise ImproperlyConfigured(
+            f"{setting} names the '{alias}' cache, a {backend.rsplit('.', 1)[-1]} that every worker keeps "
+            f"to itself, but WEB_CONCURRENCY is {worker_count()}. Point it at a shared cache (set REDIS_URL) "
+            f"or run a single worker."
+        )
+
+
+def require_shared_broker():
+    """Warn when several workers run on a broker that only delivers within one process.
+
+    A stream client then misses every event published by a worker it isn't
+    connected to. The stream is an add-on to the REST endpoints, so this only
+    warns; set REDIS_URL to get `RedisBroker`. Called from the apps' `ready()`.
+    """
+    path = broker_path()
+    if worker_count() > 1 and import_string(path).per_process:
+        logger.warning(
+            "REALTIME_BROKER is %s, which only reaches clients of the worker that publishes, but "
+            "WEB_CONCURRENCY is %d; stream clients will miss events. Set REDIS_URL to use Redis pub/sub.",
+            path, worker_count(),
+        )
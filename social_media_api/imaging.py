@@ -0,0 +1,74 @@
+import io
+
+from PIL import Image, ImageOps
+
+
+# Pillow only, no Django: this runs in the media pipeline's worker processes
+
+# Formats accepted for upload, by the leading bytes that identify them
+SIGNATURES = {
+    'JPEG': (b'\xff\xd8\xff',),
+    'PNG': (b'\x89PNG\r\n\x1a\n',),
+    'GIF': (b'GIF87a', b'GIF89a'),
+    'WEBP': (b'RIFF',),
+}
+SIGNATURE_BYTES = 12
+
+
+def _has_signature(head):
+    if head.startswith(b'RIFF'):
+        return head[8:12] == b'WEBP'
+    return any(head.startswith(prefix) for prefixes in SIGNATURES.values() for prefix in prefixes)
+
+
+def probe_image(head, complete=False):
+    """(format, width, height) from the leading bytes of an upload, or None while more are needed.
+
+    Only the header is parsed, so no pixel data is decoded. Raises ValueError
+    for something that is not an accepted image. That can happen after the
+    first few bytes, or once `head` holds the whole file (`complete`) and
+    still doesn't parse.
+    """
+    if len(head) >= SIGNATURE_BYTES and not _has_signature(head):
+        raise ValueError("Not a JPEG, PNG, GIF or WebP image.")
+    try:
+        with Image.open(io.BytesIO(head)) as image:
+            if image.format not in SIGNATURES:
+                raise ValueError(f"{image.format} images are not accepted.")
+            return image.format, image.width, image.height
+    except Image.DecompressionBombError as error:
+        raise ValueError(str(error))
+    except (OSError, SyntaxError, EOFError):
+        # Usually a header cut off at a chunk boundary
+        if complete:
+            raise ValueError("The image header could not be read.")
+        return None
+
+
+def render_renditions(data, sizes, quality):
+    """WebP renditions of the encoded image `data`, one per {name: longest side in px} in `sizes`.
+
+    The EXIF orientation is applied, then all metadata (EXIF, ICC profile,
+    XMP) is left behind. Images are never upscaled. Each rendition is scaled
+    down from the next larger one, which is much cheaper than going back to
+    the original every time. Returns {name: (webp bytes, width, height)}.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale; stay at or above the largest rendition
+        largest = max(sizes.values())
+        original.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(original)
+
+    mode = 'RGBA' if image.has_transparency_data else 'RGB'
+    if image.mode != mode:
+        image = image.convert(mode)
+
+    renditions = {}
+    for name, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+        image = image.copy()
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        # The WebP encoder only writes metadata that is passed in explicitly
+        image.save(buffer, 'WEBP', quality=quality, method=4)
+        renditions[name] = (buffer.getvalue(), image.width, image.height)
+    return renditions
@@ -0,0 +1,200 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, models, transaction
+from django.dispatch import Signal
+from rest_framework import serializers
+
+from .imaging import render_renditions
+
+logger = logging.getLogger(__name__)
+
+
+# Image fields with renditions; each has `<field>_status` and `<field>_renditions` next to it
+MEDIA_FIELDS = [('posts.Post', 'media'), ('users.Profile', 'profile_picture')]
+
+# Sent with sender=model class, instance and field_name once an image's renditions are stored (or failed)
+renditions_ready = Signal()
+
+
+class MediaStatus(models.TextChoices):
+    NONE = 'none', 'No image'
+    PENDING = 'pending', 'Pending'
+    READY = 'ready', 'Ready'
+    FAILED = 'failed', 'Failed'
+
+
+def processing_mode():
+    return getattr(settings, 'MEDIA_PROCESSING_MODE', 'async')
+
+
+def rendition_sizes():
+    return getattr(settings, 'MEDIA_RENDITION_SIZES', {'thumb': 160, 'small': 480, 'large': 1080})
+
+
+def rendition_path(name, size_name):
+    # post_media/cat.jpg -> post_media/cat.small.webp; the storage adds a suffix on collisions
+    return f'{os.path.splitext(name)[0]}.{size_name}.webp'
+
+
+# ============ Media Processor =============
+
+class MediaProcessor:
+    """Builds resized, metadata-free WebP renditions of uploaded images off the request path.
+
+    `schedule()` marks the image pending. Once the transaction commits, a
+    thread reads the upload and has a process pool render it. Pillow work is
+    CPU bound and would hold the GIL in a thread. The thread then stores the
+    renditions next to the upload and marks the row ready, or failed. It
+    sends `renditions_ready` so caches holding the row can be dropped. An
+    image replaced in the meantime is left to its own job.
+
+    With MEDIA_PROCESSING_MODE = 'sync' the work runs inline, which is what
+    tests rely on. Jobs lost to a restart stay pending until
+    `manage.py process_media` picks them up.
+    """
+
+    def __init__(self):
+        self._threads = None
+        self._processes = None
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self):
+        return getattr(settings, 'MEDIA_WORKERS', 2)
+
+    def schedule(self, instance, field_name):
+        model = type(instance)
+        name = getattr(instance, field_name).name
+        status = MediaStatus.PENDING if name else MediaStatus.NONE
+        model.objects.filter(pk=instance.pk).update(**{f'{field_name}_status': status, f'{field_name}_renditions': {}})
+        setattr(instance, f'{field_name}_status', status)
+        setattr(instance, f'{field_name}_renditions', {})
+        if not name:
+            return
+
+        job = (model._meta.label, instance.pk, field_name, name)
+        if processing_mode() == 'sync':
+            for attribute, value in (self.process(*job) or {}).items():
+                setattr(instance, attribute, value)
+        else:
+            transaction.on_commit(lambda: self.submit(*job))
+
+    def process(self, label, pk, field_name, name):
+        """Render and store one image; returns the status/renditions changes written, if any."""
+        model = apps.get_model(label)
+        instance = model.objects.filter(pk=pk).first()
+        if instance is None or getattr(instance, field_name).name != name:
+            return  # Deleted or replaced since it was scheduled
+
+        field_file = getattr(instance, field_name)
+        try:
+            with field_file.open('rb') as upload:
+                data = upload.read()
+            renditions = {}
+            for size_name, (content, width, height) in self.render(data).items():
+                stored = field_file.storage.save(rendition_path(name, size_name), ContentFile(content))
+                renditions[size_name] = {'name': stored, 'width': width, 'height': height, 'bytes': len(content)}
+            status = MediaStatus.READY
+        except Exception:
+            logger.exception("Could not render %s %s.%s (%s)", label, pk, field_name, name)
+            renditions, status = {}, MediaStatus.FAILED
+
+        changes = {f'{field_name}_status': status, f'{field_name}_renditions': renditions}
+        if model.objects.filter(pk=pk, **{field_name: name}).update(**changes):
+            for attribute, value in changes.items():
+                setattr(instance, attribute, value)
+            renditions_ready.send(sender=model, instance=instance, field_name=field_name)
+            return changes
+
+    def render(self, data):
+        sizes, quality = rendition_sizes(), getattr(settings, 'MEDIA_WEBP_QUALITY', 80)
+        if processing_mode() == 'sync':
+            return render_renditions(data, sizes, quality)
+        return self._process_pool().submit(render_renditions, data, sizes, quality).result()
+
+    def submit(self, label, pk, field_name, name):
+        """Queue `process()` on the pipeline's threads."""
+        future = self._thread_pool().submit(self._run, (label, pk, field_name, name))
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+
+    def _run(self, job):
+        close_old_connections()
+        try:
+            self.process(*job)
+        finally:
+            close_old_connections()
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def _thread_pool(self):
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='media')
+            return self._threads
+
+    def _process_pool(self):
+        with self._lock:
+            if self._processes is None:
+                # spawn, not fork: forking a threaded server process can deadlock the child
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._processes
+
+    def flush(self, timeout=None):
+        """Block until every submitted job has finished; False on timeout."""
+        with self._lock:
+            futures = set(self._futures)
+        return not wait(futures, timeout=timeout).not_done
+
+    def shutdown(self):
+        with self._lock:
+            threads, processes, self._threads, self._processes = self._threads, self._processes, None, None
+        if threads is not None:
+            threads.shutdown(wait=False, cancel_futures=True)
+        if processes is not None:
+            processes.shutdown(wait=False, cancel_futures=True)
+
+
+media_processor = MediaProcessor()
+atexit.register(media_processor.shutdown)
+
+
+def rendition_urls(instance, field_name):
+    """{size name: URL} of an image's renditions; empty until they are ready."""
+    if getattr(instance, f'{field_name}_status') != MediaStatus.READY:
+        return {}
+    storage = getattr(instance, field_name).storage
+    return {size_name: storage.url(rendition['name'])
+            for size_name, rendition in getattr(instance, f'{field_name}_renditions').items()}
+
+
+# ============ Renditions Field =============
+
+class RenditionsField(serializers.Field):
+    """Read-only {size name: URL} of an image field's renditions, absolute when there is a request."""
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        urls = rendition_urls(instance, self.image_field)
+        request = self.context.get('request')
+        if request is not None:
+            urls = {size_name: request.build_absolute_uri(url) for size_name, url in urls.items()}
+        return urls
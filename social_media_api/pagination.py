@@ -0,0 +1,160 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# ============ Keyset (cursor) Pagination =============
+
+class KeysetPagination(BasePagination):
+    """Opaque cursor pagination keyed on a (datetime, id) pair, newest first.
+
+    Each page is a range scan that starts right after the last row of the previous
+    page, so it never runs OFFSET or COUNT(*) and page N costs the same as page 1.
+    Objects that are not querysets can take part by implementing `seek(position)`.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    # (datetime field, unique tie-breaker), both sorted descending
+    ordering = ('timestamp', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        rows = list(self.seek(queryset, position)[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Same page through the async ORM; non-queryset sources implement `aslice(stop)`
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        source = self.seek(queryset, position)
+        if hasattr(source, 'aslice'):
+            rows = await source.aslice(self.page_size + 1)
+        else:
+            rows = [row async for row in source[:self.page_size + 1]]
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ])
+
+    def seek(self, queryset, position):
+        if hasattr(queryset, 'seek'):
+            return queryset.seek(position)
+
+        queryset = queryset.order_by(*[f'-{field}' for field in self.ordering])
+        if position is None:
+            return queryset
+        timestamp_field, id_field = self.ordering
+        timestamp, pk = position
+        return queryset.filter(
+            Q(**{f'{timestamp_field}__lt': timestamp}) |
+            Q(**{timestamp_field: timestamp, f'{id_field}__lt': pk})
+        )
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_position(self, item):
+        return tuple(getattr(item, field) for field in self.ordering)
+
+    def encode_cursor(self, position):
+        timestamp, pk = position
+        raw = json.dumps([timestamp.isoformat(), pk]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            timestamp, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            timestamp = parse_datetime(timestamp)
+            if timestamp is None or not isinstance(pk, int):
+                raise ValueError
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, pk
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self.get_position(self.page[-1]))
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CursorOrPagePagination(BasePagination):
+    """Keyset pagination when the client sends `?cursor=` (empty for the first page),
+    otherwise the endpoint's historical page-number behaviour.
+
+    Leave `page_pagination_class` as None for endpoints that used to be unpaginated.
+    """
+    page_pagination_class = None
+    cursor_pagination_class = KeysetPagination
+
+    def is_cursor_request(self, request):
+        return self.cursor_pagination_class.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_cursor_request(request):
+            self.delegate = self.cursor_pagination_class()
+            page_class = self.page_pagination_class
+            if page_class is not None:
+                # Keep page sizes consistent between both modes
+                self.delegate.page_size = page_class.page_size or self.delegate.page_size
+                self.delegate.page_size_query_param = page_class.page_size_query_param
+                self.delegate.max_page_size = page_class.max_page_size or self.delegate.max_page_size
+        elif self.page_pagination_class is not None:
+            self.delegate = self.page_pagination_class()
+        else:
+            self.delegate = None
+            return None
+        return self.delegate.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.delegate.get_paginated_response(data)
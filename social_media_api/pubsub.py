@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+# ============ Subscriptions =============
+
+class Subscription:
+    """One listener's queue on one channel, consumed from its own event loop.
+
+    The queue is bounded: a listener that falls behind loses events, and the
+    next `get()` raises `Overflow` so the stream can tell the client to resync.
+    """
+
+    class Overflow(Exception):
+        pass
+
+    def __init__(self, broker, channel, loop, max_pending):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Always runs on self.loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """Next event, or None after `timeout` seconds without one."""
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            raise self.Overflow()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+# ============ Brokers =============
+
+class Broker:
+    """Fan-out of events to every subscriber of a channel.
+
+    `publish()` can be called from any thread, sync or async. `subscribe()` must
+    be called from the event loop that will consume the subscription.
+    """
+    # True if events only reach subscribers in the publishing process
+    per_process = False
+
+    def publish(self, channel, event):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InProcessBroker(Broker):
+    """Delivers only to subscribers in this process.
+
+    Fine for a single worker or for development. With several worker processes
+    use `RedisBroker`; the app warns at startup otherwise.
+    """
+    per_process = True
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    @property
+    def max_pending(self):
+        return getattr(settings, 'REALTIME_MAX_PENDING', 100)
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down without unsubscribing
+                self.unsubscribe(subscription)
+        return len(subscriptions)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._channels.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[subscription.channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._channels.values())
+
+
+class RedisBroker(InProcessBroker):
+    """Redis pub/sub, so an event reaches subscribers in every worker process.
+
+    `publish()` sends the event to Redis. One listener thread per process holds
+    a single pub/sub connection, subscribed to the channels that have local
+    subscribers, and hands each message to them as `InProcessBroker` would.
+    The redis client isn't thread-safe for pub/sub, so only the listener
+    thread touches that connection; it catches up with (un)subscribes between
+    reads, every `poll_interval` seconds at most.
+    """
+    per_process = False
+    poll_interval = 0.1
+
+    def __init__(self, url=None):
+        import redis
+
+        super().__init__()
+        self._redis = redis
+        self._client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def publish(self, channel, event):
+        return self._client.publish(channel, json.dumps(event))
+
+    def subscribe(self, channel):
+        subscription = super().subscribe(channel)
+        self._ensure_listener()
+        return subscription
+
+    def _ensure_listener(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='realtime-redis-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        subscribed = set()
+        while True:
+            try:
+                with self._lock:
+                    wanted = set(self._channels)
+                if wanted - subscribed:
+                    pubsub.subscribe(*(wanted - subscribed))
+                if subscribed - wanted:
+                    pubsub.unsubscribe(*(subscribed - wanted))
+                subscribed = wanted
+                message = pubsub.get_message(timeout=self.poll_interval)
+            except self._redis.RedisError:
+                # The client resubscribes on reconnect; events published meanwhile are lost
+                logger.exception("Real-time Redis listener lost its connection; retrying")
+                time.sleep(1)
+                continue
+            if message is None:
+                continue
+            try:
+                channel = message['channel'].decode()
+                super().publish(channel, json.loads(message['data']))
+            except Exception:
+                logger.exception("Could not deliver a real-time event from Redis")
+
+
+@lru_cache(maxsize=None)
+def _load_broker(path):
+    return import_string(path)()
+
+
+def broker_path():
+    return getattr(settings, 'REALTIME_BROKER', '') or 'social_media_api.pubsub.InProcessBroker'
+
+
+def get_broker():
+    """settings.REALTIME_BROKER: Redis pub/sub when REDIS_URL is set, otherwise in-process."""
+    return _load_broker(broker_path())
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def publish_to_user(user_id, event):
+    # Real-time delivery is best effort; the REST endpoints stay the source of truth
+    try:
+        get_broker().publish(user_channel(user_id), event)
+    except Exception:
+        logger.exception("Could not publish %s event to user %s", event.get('type'), user_id)
@@ -0,0 +1,137 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+# ============ Query Recording =============
+
+class QueryRecorder:
+    """Database execute wrapper that records every statement and its duration."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration_ms(self):
+        return sum(duration for _, duration in self.queries) * 1000
+
+    @staticmethod
+    def shape(sql):
+        # Parameters are already placeholders; only IN lists vary with the number of values
+        return _WHITESPACE.sub(' ', _IN_LIST.sub('IN (...)', sql)).strip()
+
+    def repeated_shapes(self, threshold=None):
+        """Query shapes executed at least `threshold` times - the signature of an N+1."""
+        if threshold is None:
+            threshold = getattr(settings, 'QUERY_REPEAT_THRESHOLD', 3)
+        shapes = Counter(self.shape(sql) for sql, _ in self.queries)
+        return {shape: total for shape, total in shapes.items() if total >= threshold}
+
+
+def get_query_budget(view_class, method):
+    """Read `query_budget` off a view: an int for every method or a dict keyed by lowercase method.
+
+    Budgets count every statement of the request, including one for authentication
+    and the savepoints of any atomic block.
+    """
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(method.lower())
+    return budget
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+# ============ Middleware =============
+
+class QueryBudgetMiddleware:
+    """Opt-in (settings.QUERY_INSPECTION) per-request SQL inspection.
+
+    Adds X-Query-Count / X-Query-Time-Ms headers, logs repeated query shapes and
+    flags views that run more queries than their declared `query_budget`. With
+    QUERY_BUDGET_STRICT the request fails instead, which is useful in development.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = None
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+
+        response['X-Query-Count'] = str(recorder.count)
+        response['X-Query-Time-Ms'] = f'{recorder.duration_ms:.2f}'
+
+        for shape, total in recorder.repeated_shapes().items():
+            logger.warning("Possible N+1 on %s %s: %d x %s", request.method, request.path, total, shape)
+
+        budget = request.query_budget
+        if budget is not None:
+            response['X-Query-Budget'] = str(budget)
+            if recorder.count > budget:
+                message = f"{request.method} {request.path} ran {recorder.count} queries (budget {budget})"
+                if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        request.query_budget = get_query_budget(view_class, request.method)
+
+
+# ============ Test Helper =============
+
+class QueryBudgetTestMixin:
+    """TestCase mixin that holds a request to its view's declared query budget."""
+
+    @contextmanager
+    def assertWithinQueryBudget(self, view_class, method='get', repeat_threshold=None):
+        budget = get_query_budget(view_class, method)
+        self.assertIsNotNone(budget, f"{view_class.__name__} declares no query budget for {method.upper()}")
+
+        recorder = QueryRecorder()
+        with recorder.record():
+            yield recorder
+
+        executed = '\n'.join(sql for sql, _ in recorder.queries)
+        self.assertLessEqual(
+            recorder.count, budget,
+            f"{view_class.__name__}.{method} ran {recorder.count} queries (budget {budget}):\n{executed}"
+        )
+        self.assertEqual(
+            recorder.repeated_shapes(repeat_threshold), {},
+            f"{view_class.__name__}.{method} repeats queries:\n{executed}"
+        )
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import dj_database_url
 from datetime import timedelta
 
@@ -34,9 +34,10 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
+    'rest_framework_simplejwt.token_blacklist',
     'users',
     'posts',
-    'followers',
+    'followers',  # Migrations only: drops the legacy Follower table (see followers/models.py)
 ]
 
 # Middleware
@@ -51,6 +52,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request SQL inspection: X-Query-Count headers, N+1 warnings and view query budgets
+QUERY_INSPECTION = config('QUERY_INSPECTION', default=False, cast=bool)
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=False, cast=bool)
+QUERY_REPEAT_THRESHOLD = config('QUERY_REPEAT_THRESHOLD', default=3, cast=int)
+if QUERY_INSPECTION:
+    MIDDLEWARE.insert(0, 'social_media_api.querybudget.QueryBudgetMiddleware')
+
 ROOT_URLCONF = 'social_media_api.urls'
 
 # Templates
@@ -78,6 +86,56 @@ DATABASES = {
     'default': dj_database_url.config(default=config('DATABASE_URL'))
 }
 
+# Worker processes gunicorn starts (see Procfile). Heroku sets WEB_CONCURRENCY per dyno size, so set it
+# to 1 explicitly until REALTIME_BROKER and the caches below are shared (see social_media_api.deployment)
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)
+
+# Cache
+# Redis when REDIS_URL is set. The in-memory fallback is private to each worker process, so it is
+# only fit for a single worker: caches that must be shared refuse to start on it when
+# WEB_CONCURRENCY > 1 (see social_media_api.deployment).
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'social-media-api',
+            'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=100000, cast=int)},
+        }
+    }
+
+# Serialized post fragments: per-process LRU in front of this cache, which holds the version tokens
+# and must be shared between workers
+POST_CACHE_ALIAS = 'default'
+POST_CACHE_TIMEOUT = config('POST_CACHE_TIMEOUT', default=3600, cast=int)
+POST_CACHE_LOCAL_SIZE = config('POST_CACHE_LOCAL_SIZE', default=1024, cast=int)
+# Version tokens written per multi-set when many posts are invalidated at once (e.g. a username change)
+POST_CACHE_INVALIDATE_BATCH = config('POST_CACHE_INVALIDATE_BATCH', default=1000, cast=int)
+
+# Most items one batch endpoint request may carry (bulk like/unlike/follow/fetch)
+BULK_MAX_ITEMS = config('BULK_MAX_ITEMS', default=100, cast=int)
+
+# Follow graph: per-user follower/following id arrays and counts, dropped on follow/unfollow.
+# Must be shared between workers, or the others keep the old arrays for FOLLOW_GRAPH_TIMEOUT
+FOLLOW_GRAPH_CACHE_ALIAS = 'default'
+FOLLOW_GRAPH_TIMEOUT = config('FOLLOW_GRAPH_TIMEOUT', default=86400, cast=int)
+
+# Public profile ETags: per-user version tokens, bumped on profile and follow changes.
+# Must be shared between workers, or the others keep validating old ETags for PROFILE_VERSION_TIMEOUT
+PROFILE_VERSION_CACHE_ALIAS = 'default'
+PROFILE_VERSION_TIMEOUT = config('PROFILE_VERSION_TIMEOUT', default=86400, cast=int)
+
+# "Who to follow": suggestions kept per user, and users scored per sparse matrix product
+RECOMMENDATIONS_PER_USER = config('RECOMMENDATIONS_PER_USER', default=50, cast=int)
+RECOMMENDATIONS_BATCH_SIZE = config('RECOMMENDATIONS_BATCH_SIZE', default=1000, cast=int)
+
 # Password Validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -97,20 +155,51 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Uploads (post media, profile pictures)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+# Renditions: {name: longest side in px}, rendered to WebP without metadata (see social_media_api.media)
+MEDIA_RENDITION_SIZES = {'thumb': 160, 'small': 480, 'large': 1080}
+MEDIA_WEBP_QUALITY = config('MEDIA_WEBP_QUALITY', default=80, cast=int)
+# 'async' renders in a background process pool after the request, 'sync' renders inline (tests)
+MEDIA_PROCESSING_MODE = config('MEDIA_PROCESSING_MODE', default='async')
+MEDIA_WORKERS = config('MEDIA_WORKERS', default=2, cast=int)
+# Resumable uploads (posts.uploads): file and chunk size limits, pixel limit, how much of the file may
+# hold the image header, and how long an unfinished upload is kept (seconds)
+MEDIA_UPLOAD_MAX_BYTES = config('MEDIA_UPLOAD_MAX_BYTES', default=20 * 1024 * 1024, cast=int)
+MEDIA_UPLOAD_CHUNK_MAX_BYTES = config('MEDIA_UPLOAD_CHUNK_MAX_BYTES', default=8 * 1024 * 1024, cast=int)
+MEDIA_UPLOAD_MAX_PIXELS = config('MEDIA_UPLOAD_MAX_PIXELS', default=40_000_000, cast=int)
+MEDIA_UPLOAD_HEADER_BYTES = 256 * 1024
+MEDIA_UPLOAD_EXPIRY = config('MEDIA_UPLOAD_EXPIRY', default=24 * 60 * 60, cast=int)
+
 # Default Primary Key Field Type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Django REST Framework
 REST_FRAMEWORK = {
+    # JWT first: API clients are identified from token claims without a user query (see users.authentication).
+    # No BasicAuthentication: it would hash a password on every request.
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'users.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Limits for views using social_media_api.throttling.SlidingWindowThrottle, e.g. '5/30m'
+    'DEFAULT_THROTTLE_RATES': {
+        'direct_message': config('THROTTLE_RATE_DIRECT_MESSAGE', default='5/30m'),
+        'like': config('THROTTLE_RATE_LIKE', default='300/h'),
+        'repost': config('THROTTLE_RATE_REPOST', default='100/h'),
+        'comment': config('THROTTLE_RATE_COMMENT', default='60/h'),
+        'follow': config('THROTTLE_RATE_FOLLOW', default='100/h'),
+        'login': config('THROTTLE_RATE_LOGIN', default='10/5m'),
+        'register': config('THROTTLE_RATE_REGISTER', default='5/h'),
+        'upload': config('THROTTLE_RATE_UPLOAD', default='60/h'),
+    },
 }
+# Cache holding the throttle counters; startup refuses a per-process cache when WEB_CONCURRENCY > 1
+THROTTLE_CACHE_ALIAS = 'default'
 
 # JWT Settings
 SIMPLE_JWT = {
@@ -119,11 +208,55 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
 }
+# Seconds a worker trusts a "not revoked" answer for an access token's session before asking the blacklist again
+JWT_REVOCATION_CACHE_TTL = config('JWT_REVOCATION_CACHE_TTL', default=30, cast=int)
+JWT_REVOCATION_CACHE_SIZE = config('JWT_REVOCATION_CACHE_SIZE', default=10000, cast=int)
+
+# Home timeline (fan-out on write)
+TIMELINE_MAX_LENGTH = config('TIMELINE_MAX_LENGTH', default=800, cast=int)
+TIMELINE_FANOUT_BATCH_SIZE = config('TIMELINE_FANOUT_BATCH_SIZE', default=1000, cast=int)
+# Authors with more followers than this are pulled into feeds at read time instead of pushed
+FEED_CELEBRITY_FOLLOWER_THRESHOLD = config('FEED_CELEBRITY_FOLLOWER_THRESHOLD', default=10000, cast=int)
+
+# Post search: dotted path to a posts.search.SearchBackend (default picks Postgres FTS when available)
+POST_SEARCH_BACKEND = config('POST_SEARCH_BACKEND', default='')
+
+# Notifications: 'async' queues them for background worker threads, 'sync' writes inline (tests)
+NOTIFICATION_DISPATCH_MODE = config('NOTIFICATION_DISPATCH_MODE', default='async')
+NOTIFICATION_WORKERS = config('NOTIFICATION_WORKERS', default=2, cast=int)
+NOTIFICATION_QUEUE_SIZE = config('NOTIFICATION_QUEUE_SIZE', default=10000, cast=int)
+NOTIFICATION_BATCH_SIZE = config('NOTIFICATION_BATCH_SIZE', default=500, cast=int)
+NOTIFICATION_BATCH_WAIT_MS = config('NOTIFICATION_BATCH_WAIT_MS', default=50, cast=int)
+# Failed replays of one outbox row before drain_notification_outbox dead-letters it
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = config('NOTIFICATION_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+# Unread notifications of these types on the same post merge into one row for this many seconds
+NOTIFICATION_COALESCE_TYPES = config('NOTIFICATION_COALESCE_TYPES', default='like,comment,repost', cast=Csv())
+NOTIFICATION_COALESCE_WINDOW = config('NOTIFICATION_COALESCE_WINDOW', default=86400, cast=int)
+NOTIFICATION_SAMPLE_ACTORS = config('NOTIFICATION_SAMPLE_ACTORS', default=3, cast=int)
+
+# Real-time stream (/api/posts/stream/): dotted path to a social_media_api.pubsub.Broker.
+# Redis pub/sub when REDIS_URL is set. The in-process fallback only reaches clients of the
+# publishing worker, so startup warns when it runs with WEB_CONCURRENCY > 1.
+REALTIME_BROKER = config(
+    'REALTIME_BROKER',
+    default='social_media_api.pubsub.RedisBroker' if REDIS_URL else 'social_media_api.pubsub.InProcessBroker',
+)
+REALTIME_HEARTBEAT_SECONDS = config('REALTIME_HEARTBEAT_SECONDS', default=15, cast=int)
+REALTIME_MAX_PENDING = config('REALTIME_MAX_PENDING', default=100, cast=int)
 
 # Authentication
+# One backend: it also serves `username=` logins (admin), so a login runs one lookup and one hash
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',  
-    'users.authentication.UsernameOrEmailBackend',  
+    'users.authentication.UsernameOrEmailBackend',
+]
+# PBKDF2 work factor (Django's default); stored hashes are rehashed to it on the next login
+PASSWORD_HASH_ITERATIONS = config('PASSWORD_HASH_ITERATIONS', default=870000, cast=int)
+PASSWORD_HASHERS = [
+    'users.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
 ]
 
 
@@ -0,0 +1,109 @@
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+_RATE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])[a-z]*\s*$')
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'5/30m' -> (5, 1800). The period multiplier is optional, so DRF-style '100/hour' works too."""
+    match = _RATE.match(rate or '')
+    if match is None:
+        raise ImproperlyConfigured(f"Invalid throttle rate {rate!r}; expected e.g. '5/30m' or '100/hour'")
+    requests, multiplier, unit = match.groups()
+    return int(requests), int(multiplier or 1) * _UNITS[unit]
+
+
+# ============ Sliding Window Throttle =============
+
+class SlidingWindowThrottle(BaseThrottle):
+    """Sliding-window counter kept in the shared cache.
+
+    Each (scope, client) pair has one counter per fixed window. A request is
+    allowed while `previous * (share of the previous window still in view) +
+    current` stays under the limit. The counters are bumped with `cache.add` and
+    `cache.incr`, which are atomic on Redis and Memcached, so every worker
+    process enforces the same limit.
+
+    Views opt in with `throttle_scope`, either a string or a dict keyed by
+    lowercase HTTP method (like `query_budget`). A view may define
+    `get_throttle_cost(request)` so one request counts as several actions
+    (e.g. a batch of likes). Rates come from
+    REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'][scope]. The cache is selected
+    by settings.THROTTLE_CACHE_ALIAS.
+    """
+    cache_format = 'throttle:{scope}:{ident}:{window}'
+    timer = time.time
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if isinstance(scope, dict):
+            return scope.get(request.method.lower())
+        return scope
+
+    def get_rate(self, scope):
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[scope]
+        except KeyError:
+            raise ImproperlyConfigured(f"No throttle rate set for scope {scope!r}")
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user-{request.user.pk}'
+        return f'ip-{super().get_ident(request)}'
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        if self.scope is None:
+            return True
+        rate = self.get_rate(self.scope)
+        if rate is None:
+            return True
+        self.limit, self.period = parse_rate(rate)
+
+        now = self.timer()
+        window = int(now // self.period)
+        self.elapsed = (now % self.period) / self.period
+        ident = self.get_ident(request)
+        key = self.cache_format.format(scope=self.scope, ident=ident, window=window)
+        previous_key = self.cache_format.format(scope=self.scope, ident=ident, window=window - 1)
+
+        cost = view.get_throttle_cost(request) if hasattr(view, 'get_throttle_cost') else 1
+
+        # Both windows must outlive the one after them
+        self.cache.add(key, 0, timeout=self.period * 2)
+        try:
+            self.current = self.cache.incr(key, cost)
+        except ValueError:
+            # Evicted between add and incr
+            self.cache.add(key, cost, timeout=self.period * 2)
+            self.current = cost
+        self.previous = self.cache.get(previous_key, 0)
+
+        if self.previous * (1 - self.elapsed) + self.current <= self.limit:
+            return True
+        # Rejected requests don't use up the allowance
+        try:
+            self.cache.decr(key, cost)
+        except ValueError:
+            pass
+        self.current -= cost
+        return False
+
+    def wait(self):
+        remaining = (1 - self.elapsed) * self.period
+        room = self.limit - self.current - 1
+        if self.previous and room >= 0:
+            # The previous window's weight only has to fall by enough to fit one more request
+            return max((1 - self.elapsed - room / self.previous) * self.period, 0)
+        return remaining
@@ -14,11 +14,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('users.urls')),
+    path('api/async/', include('social_media_api.async_urls')),
     path('', include('posts.urls')),
 ]
+# Uploads are served by Django only with DEBUG on; production serves MEDIA_ROOT from the web server or a CDN
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
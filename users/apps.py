@@ -7,3 +7,8 @@ class UsersConfig(AppConfig):
 
     def ready(self):
         import users.signals
+        from social_media_api.deployment import require_shared_cache
+
+        # Invalidations and version bumps must reach every worker
+        require_shared_cache('FOLLOW_GRAPH_CACHE_ALIAS')
+        require_shared_cache('PROFILE_VERSION_CACHE_ALIAS')
@@ -0,0 +1,35 @@
+from django.contrib.auth.models import User
+from rest_framework.exceptions import NotFound
+
+from social_media_api.async_views import AsyncAPIView
+from social_media_api.pagination import KeysetPagination
+from .models import Follow
+
+
+# ============ Follow List Views =============
+
+class AsyncFollowListView(AsyncAPIView):
+    # `direction` picks the side of the Follow row that is listed
+    direction = None
+    query_budget = 3
+
+    async def get(self, request, username):
+        user = await User.objects.filter(username=username).afirst()
+        if user is None:
+            raise NotFound("User not found.")
+
+        if self.direction == 'followers':
+            follows, listed = Follow.objects.filter(following=user).select_related('follower'), 'follower'
+        else:
+            follows, listed = Follow.objects.filter(follower=user).select_related('following'), 'following'
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(follows, request)
+        return paginator.get_paginated_data([{"username": getattr(follow, listed).username} for follow in page])
+
+
+class AsyncUserFollowersListView(AsyncFollowListView):
+    direction = 'followers'
+
+
+class AsyncUserFollowingListView(AsyncFollowListView):
+    direction = 'following'
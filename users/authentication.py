@@ -1,18 +1,80 @@
 from django.contrib.auth.models import User
-from django.contrib.auth.backends import BaseBackend
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
 
-class UsernameOrEmailBackend(BaseBackend):
-    def authenticate(self, request, username_or_email=None, password=None):
-        if not username_or_email or not password:
+from .models import ClaimsUser
+from .tokens import IS_ACTIVE_CLAIM, SESSION_CLAIM, USERNAME_CLAIM, revocations
+
+
+# ============ Username or Email Backend =============
+
+class UsernameOrEmailBackend(ModelBackend):
+    """Logs in with a username or an email address, matched case-insensitively.
+
+    The account is found with one query on the LOWER(username) and
+    LOWER(email) indexes (users migration 0007). An exact username match
+    wins over a case-insensitive one, which wins over an email match. A miss
+    still hashes the password once, like ModelBackend, so the response time
+    doesn't reveal whether an account exists. check_password() rehashes the
+    stored password when the hasher's parameters have changed (see
+    users.hashers). Also accepts `username=` for the admin login.
+    """
+
+    def authenticate(self, request, username_or_email=None, password=None, username=None, **kwargs):
+        identifier = username_or_email or username
+        if not identifier or not password:
             return None  # Return None if any required value is missing
 
-        if '@' in username_or_email:
-            # Email-based authentication
-            user = User.objects.filter(email=username_or_email).first()
-        else:
-            # Username-based authentication
-            user = User.objects.filter(username=username_or_email).first()
+        user = self.get_credential_user(identifier)
+        if user is None:
+            User().set_password(password)
+            return None
 
-        if user and user.check_password(password):
+        if user.check_password(password) and self.user_can_authenticate(user):
             return user
         return None
+
+    def get_credential_user(self, identifier):
+        key = identifier.lower()
+        matches = (
+            User.objects
+            .alias(username_key=Lower('username'), email_key=Lower('email'))
+            .filter(Q(username_key=key) | Q(email_key=key))
+            .order_by('id')
+        )
+        # Exact username first, then a case-insensitive username, then an email
+        return min(matches, key=lambda user: (user.username != identifier, user.username.lower() != key), default=None)
+
+
+# ============ Claims JWT Authentication =============
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWT authentication that doesn't load the user row.
+
+    request.user is a ClaimsUser built from the token's id, username and
+    is_active claims. The rest of the row is loaded only if a view reads it.
+    Access tokens from users.tokens.ClaimsRefreshToken are rejected once
+    their refresh token is blacklisted. That check is served from the
+    revocation cache. Tokens issued without the claims fall back to the
+    usual per-request lookup.
+    """
+
+    def get_user(self, validated_token):
+        if USERNAME_CLAIM not in validated_token or IS_ACTIVE_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        if not validated_token[IS_ACTIVE_CLAIM]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        session = validated_token.get(SESSION_CLAIM)
+        if session and revocations.is_revoked(session):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+        return ClaimsUser.from_claims(
+            validated_token[api_settings.USER_ID_CLAIM], validated_token[USERNAME_CLAIM], validated_token[IS_ACTIVE_CLAIM],
+        )
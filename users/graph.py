@@ -0,0 +1,175 @@
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Follow
+
+
+FOLLOWERS = 'followers'
+FOLLOWING = 'following'
+
+# direction -> (column holding the listed ids, column holding the user's own id)
+_COLUMNS = {
+    FOLLOWERS: ('follower_id', 'following_id'),
+    FOLLOWING: ('following_id', 'follower_id'),
+}
+
+
+# ============ Id sets =============
+
+class IdSet:
+    """Immutable, sorted array of user ids (8 bytes per id) with set operations.
+
+    Membership is a binary search, so it stays cheap without unpacking a large
+    follower list into a Python set. Intersections walk the smaller side.
+    """
+    __slots__ = ('ids',)
+
+    def __init__(self, ids=()):
+        self.ids = ids if isinstance(ids, array) else array('q', sorted(ids))
+
+    @classmethod
+    def from_bytes(cls, data):
+        ids = array('q')
+        ids.frombytes(data)
+        return cls(ids)
+
+    def to_bytes(self):
+        return self.ids.tobytes()
+
+    def __contains__(self, user_id):
+        position = bisect_left(self.ids, user_id)
+        return position < len(self.ids) and self.ids[position] == user_id
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __eq__(self, other):
+        return isinstance(other, IdSet) and self.ids == other.ids
+
+    def __repr__(self):
+        return f'IdSet({list(self.ids)!r})'
+
+    def intersection(self, other):
+        small, large = (self, other) if len(self) <= len(other) else (other, self)
+        return IdSet(array('q', (user_id for user_id in small if user_id in large)))
+
+    def difference(self, other):
+        return IdSet(array('q', (user_id for user_id in self if user_id not in other)))
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    def __sub__(self, other):
+        return self.difference(other)
+
+
+# ============ Follow graph cache =============
+
+class FollowGraph:
+    """Cached adjacency lists of the Follow table.
+
+    Each user's follower and following ids are stored in the cache as packed
+    sorted arrays, loaded with one query on a miss. Counts are cached on their
+    own, so counting a celebrity's followers never fetches the list. Saving or
+    deleting a Follow row drops the affected entries (see users.signals). Bulk
+    writes bypass signals and must call `invalidate_many` themselves.
+
+    Drops only reach other workers if FOLLOW_GRAPH_CACHE_ALIAS is shared; a
+    per-process cache is refused at startup when there are several. Writes
+    still decide whether an edge exists from the Follow table, not from here.
+    """
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'FOLLOW_GRAPH_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'FOLLOW_GRAPH_TIMEOUT', 86400)
+
+    @staticmethod
+    def _ids_key(user_id, direction):
+        return f'graph:{direction}:{user_id}'
+
+    @staticmethod
+    def _count_key(user_id, direction):
+        return f'graph:{direction}:count:{user_id}'
+
+    def ids(self, user_id, direction):
+        data = self.cache.get(self._ids_key(user_id, direction))
+        if data is not None:
+            return IdSet.from_bytes(data)
+
+        listed, own = _COLUMNS[direction]
+        ids = IdSet(array('q', Follow.objects.filter(**{own: user_id}).order_by(listed).values_list(listed, flat=True)))
+        self.cache.set_many({
+            self._ids_key(user_id, direction): ids.to_bytes(),
+            self._count_key(user_id, direction): len(ids),
+        }, self.timeout)
+        return ids
+
+    def followers(self, user_id):
+        return self.ids(user_id, FOLLOWERS)
+
+    def following(self, user_id):
+        return self.ids(user_id, FOLLOWING)
+
+    def counts(self, user_ids, direction):
+        """{user id: count} for `user_ids`, from the cache plus one grouped query for misses."""
+        user_ids = list(user_ids)
+        keys = {self._count_key(user_id, direction): user_id for user_id in user_ids}
+        counts = {keys[key]: value for key, value in self.cache.get_many(keys.keys()).items()}
+
+        missing = [user_id for user_id in user_ids if user_id not in counts]
+        if missing:
+            _, own = _COLUMNS[direction]
+            fresh = dict.fromkeys(missing, 0)
+            rows = Follow.objects.filter(**{f'{own}__in': missing}).values(own).annotate(total=Count('id'))
+            fresh.update({row[own]: row['total'] for row in rows})
+            self.cache.set_many({self._count_key(user_id, direction): total for user_id, total in fresh.items()}, self.timeout)
+            counts.update(fresh)
+        return counts
+
+    def follower_counts(self, user_ids):
+        return self.counts(user_ids, FOLLOWERS)
+
+    def following_counts(self, user_ids):
+        return self.counts(user_ids, FOLLOWING)
+
+    def is_following(self, follower_id, following_id):
+        return following_id in self.following(follower_id)
+
+    def mutuals(self, user_id):
+        """Users that `user_id` follows and who follow them back."""
+        return self.following(user_id) & self.followers(user_id)
+
+    def followed_by_following(self, viewer_id, user_id):
+        """Users the viewer follows who also follow `user_id`."""
+        return self.following(viewer_id) & self.followers(user_id)
+
+    def invalidate(self, follower_id, following_id):
+        """Drop the entries a follow or unfollow changes, now and again on commit.
+
+        The second drop closes the window where another request reloads the
+        pre-commit rows in between.
+        """
+        self.invalidate_many(follower_id, [following_id])
+
+    def invalidate_many(self, follower_id, following_ids):
+        # For writes that bypass the Follow signals, such as bulk_create
+        keys = [self._ids_key(follower_id, FOLLOWING), self._count_key(follower_id, FOLLOWING)]
+        for following_id in following_ids:
+            keys += [self._ids_key(following_id, FOLLOWERS), self._count_key(following_id, FOLLOWERS)]
+        self.cache.delete_many(keys)
+        transaction.on_commit(lambda: self.cache.delete_many(keys))
+
+
+follow_graph = FollowGraph()
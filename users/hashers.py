@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with its work factor taken from PASSWORD_HASH_ITERATIONS.
+
+    Uses the stock `pbkdf2_sha256` algorithm name, so existing hashes verify
+    unchanged. A hash made with another iteration count is rehashed on the
+    user's next successful login, through must_update() in
+    User.check_password().
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
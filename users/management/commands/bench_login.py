@@ -0,0 +1,88 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from users.authentication import UsernameOrEmailBackend
+from users.serializers import LoginSerializer
+
+
+PASSWORD = 'bench-password'
+
+# name -> (credential sent, password); {username} and {email} are filled in from the bench user
+SCENARIOS = {
+    'username': ('{username}', PASSWORD),
+    'email (any case)': ('{email}', PASSWORD),
+    'wrong password': ('{username}', 'not-the-password'),
+    'unknown user': ('nobody-{username}', PASSWORD),
+}
+
+
+class Command(BaseCommand):
+    help = ("Measure login throughput of one worker through LoginSerializer (lookup, password hash and token "
+            "minting) at one or more PBKDF2 iteration counts, and time the credential lookup alone.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help="Logins per scenario and iteration count.")
+        parser.add_argument('--iterations', default=str(settings.PASSWORD_HASH_ITERATIONS),
+                            help="Comma separated PBKDF2 iteration counts to compare.")
+        parser.add_argument('--users', type=int, default=50000, help="Accounts in auth_user (seeded if fewer).")
+        parser.add_argument('--lookups', type=int, default=2000)
+        parser.add_argument('--username', default='bench_login')
+
+    def handle(self, *args, **options):
+        user = self.seed(options['username'], options['users'])
+        identifiers = {'username': user.username, 'email': user.email.upper()}
+
+        self.stdout.write(f"{'iterations':>10} {'scenario':>17} {'logins/s':>9} {'ms/login':>9} {'queries':>8}")
+        for iterations in [int(value) for value in options['iterations'].split(',')]:
+            with override_settings(PASSWORD_HASH_ITERATIONS=iterations):
+                # Hash the password at this cost up front rather than on the first login
+                User.objects.filter(pk=user.pk).update(password=make_password(PASSWORD))
+                for name, (identifier, password) in SCENARIOS.items():
+                    self.run_scenario(iterations, name, identifier.format(**identifiers), password, options['logins'])
+        OutstandingToken.objects.filter(user=user).delete()
+
+        self.stdout.write("")
+        self.stdout.write(f"{'lookup':>28} {'us/lookup':>10}")
+        # The newest account, so the unindexed lookup can't stop early
+        newest = User.objects.order_by('-id').first()
+        backend = UsernameOrEmailBackend()
+        self.time_lookup('LOWER() indexes', lambda: backend.get_credential_user(newest.email.upper()), options['lookups'])
+        self.time_lookup('email = (no index)', lambda: User.objects.filter(email=newest.email).first(), options['lookups'])
+
+    def seed(self, username, total):
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            user = User.objects.create_user(username, email=f'{username}@example.com', password=PASSWORD)
+        existing = User.objects.count()
+        if total > existing:
+            # One shared hash: the filler accounts only need to make the table realistically large
+            password = make_password(None)
+            User.objects.bulk_create([
+                User(username=f'{username}_filler{i}', email=f'{username}_filler{i}@example.com', password=password)
+                for i in range(existing, total)
+            ], batch_size=5000)
+        return user
+
+    def run_scenario(self, iterations, name, identifier, password, logins):
+        queries = []
+        with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+            started = time.perf_counter()
+            for _ in range(logins):
+                LoginSerializer(data={'username_or_email': identifier, 'password': password}, context={}).is_valid()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f"{iterations:>10} {name:>17} {logins / elapsed:>9.1f} {elapsed / logins * 1000:>9.1f} "
+                          f"{len(queries) / logins:>8.1f}")
+
+    def time_lookup(self, name, lookup, count):
+        lookup()
+        started = time.perf_counter()
+        for _ in range(count):
+            lookup()
+        self.stdout.write(f"{name:>28} {(time.perf_counter() - started) / count * 1e6:>10.1f}")
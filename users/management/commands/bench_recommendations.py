@@ -0,0 +1,87 @@
+import resource
+import time
+from collections import Counter
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from users.recommendations import build_adjacency, score_rows
+
+
+class Command(BaseCommand):
+    help = ("Score \"who to follow\" candidates on a synthetic power-law follow graph held in memory and "
+            "compare the sparse-matrix engine with a per-user Python loop.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500000)
+        parser.add_argument('--edges', type=int, default=5000000)
+        parser.add_argument('--popularity-exponent', type=float, default=1.0,
+                            help="Zipf exponent of who gets followed (higher: more concentrated on celebrities).")
+        parser.add_argument('--activity-exponent', type=float, default=0.5,
+                            help="Zipf exponent of who does the following.")
+        parser.add_argument('--score-users', type=int, help="Score only this many random users (default: all).")
+        parser.add_argument('--naive-users', type=int, default=2000, help="Users scored by the per-user baseline.")
+        parser.add_argument('--per-user', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        self.rng = np.random.default_rng(options['seed'])
+        n = options['users']
+
+        started = time.perf_counter()
+        edges = np.column_stack([
+            self.powerlaw_sample(n, options['edges'], options['activity_exponent']),
+            self.powerlaw_sample(n, options['edges'], options['popularity_exponent']),
+        ])
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        generated = time.perf_counter() - started
+
+        started = time.perf_counter()
+        ids, adjacency = build_adjacency(edges)
+        built = time.perf_counter() - started
+        in_degree = np.asarray(adjacency.sum(axis=0)).ravel()
+        self.stdout.write(f"graph            {len(ids)} users, {adjacency.nnz} edges (generated in {generated:.1f}s)")
+        self.stdout.write(f"in-degree        median {np.median(in_degree):.0f}  p99 {np.percentile(in_degree, 99):.0f}  "
+                          f"max {in_degree.max()}")
+        self.stdout.write(f"adjacency build  {built:.2f}s")
+
+        rows = np.arange(len(ids))
+        if options['score_users']:
+            rows = np.sort(self.rng.choice(rows, size=min(options['score_users'], len(rows)), replace=False))
+
+        started = time.perf_counter()
+        suggestions = 0
+        for start in range(0, len(rows), options['batch_size']):
+            users, _, _ = score_rows(adjacency, rows[start:start + options['batch_size']], options['per_user'])
+            suggestions += len(users)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"sparse engine    {len(rows)} users in {elapsed:.2f}s "
+                          f"({len(rows) / elapsed:,.0f} users/s, {suggestions} suggestions)")
+
+        sample = self.rng.choice(len(ids), size=min(options['naive_users'], len(ids)), replace=False)
+        started = time.perf_counter()
+        for row in sample:
+            self.naive_scores(adjacency, row, options['per_user'])
+        naive = time.perf_counter() - started
+        self.stdout.write(f"per-user loop    {len(sample)} users in {naive:.2f}s "
+                          f"({len(sample) / naive:,.0f} users/s; all users would take ~{naive / len(sample) * len(rows):.0f}s)")
+        self.stdout.write(f"peak RSS         {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+    def powerlaw_sample(self, n, size, exponent):
+        # Rank-based Zipf weights over a shuffled population, so activity and popularity aren't correlated
+        weights = np.arange(1, n + 1, dtype=np.float64) ** -exponent
+        weights /= weights.sum()
+        return self.rng.permutation(n)[self.rng.choice(n, size=size, p=weights)]
+
+    @staticmethod
+    def naive_scores(adjacency, row, per_user):
+        # What a per-user implementation does: walk each followee's following list and count
+        indptr, indices = adjacency.indptr, adjacency.indices
+        followed = set(indices[indptr[row]:indptr[row + 1]].tolist())
+        counts = Counter()
+        for friend in followed:
+            counts.update(indices[indptr[friend]:indptr[friend + 1]].tolist())
+        for excluded in followed | {row}:
+            counts.pop(excluded, None)
+        return counts.most_common(per_user)
@@ -0,0 +1,37 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.recommendations import compute_suggestions, recently_changed_users
+
+
+class Command(BaseCommand):
+    help = "Recompute \"who to follow\" suggestions from the Follow graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help="Only recompute these users (default: everyone).")
+        parser.add_argument('--since-minutes', type=int,
+                            help="Incremental run: only users who followed someone in the last N minutes.")
+        parser.add_argument('--per-user', type=int, help="Suggestions kept per user (default RECOMMENDATIONS_PER_USER).")
+        parser.add_argument('--batch-size', type=int, help="Users scored per sparse product (default RECOMMENDATIONS_BATCH_SIZE).")
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+            missing = set(options['usernames']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+            user_ids = list(users.values_list('id', flat=True))
+        elif options['since_minutes'] is not None:
+            user_ids = list(recently_changed_users(timezone.now() - timedelta(minutes=options['since_minutes'])))
+
+        started = time.perf_counter()
+        written = compute_suggestions(user_ids, per_user=options['per_user'], batch_size=options['batch_size'])
+        scope = 'all users' if user_ids is None else f'{len(user_ids)} users'
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} suggestions for {scope} in {time.perf_counter() - started:.1f}s."
+        ))
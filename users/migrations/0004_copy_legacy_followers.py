@@ -0,0 +1,41 @@
+from django.db import migrations, transaction
+
+
+BATCH_SIZE = 5000
+
+
+def copy_followers(apps, schema_editor):
+    # Short per-batch transactions keyed on the primary key: the legacy table is only
+    # read and users_follow only sees small inserts, so neither is locked for long
+    Follower = apps.get_model('followers', 'Follower')
+    Follow = apps.get_model('users', 'Follow')
+    db = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        batch = list(
+            Follower.objects.using(db).filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'follower_id', 'user_id')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        with transaction.atomic(using=db):
+            Follow.objects.using(db).bulk_create(
+                [Follow(follower_id=follower_id, following_id=user_id)
+                 for _, follower_id, user_id in batch if follower_id != user_id],
+                ignore_conflicts=True,
+            )
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('users', '0003_follow_suggestions'),
+        ('followers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_followers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+SINGLE_COLUMN_INDEXES = {
+    'follower_id': 'users_follo_followe_3a2483_idx',
+    'following_id': 'users_follo_followi_e01def_idx',
+}
+
+
+def _concurrently(schema_editor):
+    # Postgres can build and drop indexes without blocking writes (outside a transaction)
+    return 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+
+
+def drop_single_column_indexes(apps, schema_editor):
+    # Both the Meta indexes and the implicit ForeignKey indexes on follower_id and
+    # following_id, whatever their generated names; composite and unique ones stay
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, 'users_follow')
+    for name, info in constraints.items():
+        if info['index'] and not info['unique'] and not info['primary_key'] and info['columns'] in (['follower_id'], ['following_id']):
+            schema_editor.execute(f'DROP INDEX {_concurrently(schema_editor)}{schema_editor.quote_name(name)}')
+
+
+def create_single_column_indexes(apps, schema_editor):
+    for column, name in SINGLE_COLUMN_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX {_concurrently(schema_editor)}{schema_editor.quote_name(name)} '
+            f'ON users_follow ({schema_editor.quote_name(column)})'
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('users', '0004_copy_legacy_followers'),
+        # The legacy model owned the `followers`/`following` related names
+        ('followers', '0002_delete_follower'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(model_name='follow', name='users_follo_followe_3a2483_idx'),
+                migrations.RemoveIndex(model_name='follow', name='users_follo_followi_e01def_idx'),
+                migrations.AlterField(
+                    model_name='follow',
+                    name='follower',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.AlterField(
+                    model_name='follow',
+                    name='following',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='followers', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(drop_single_column_indexes, create_single_column_indexes),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+# auth_user belongs to django.contrib.auth, so these live here rather than in a model's Meta.indexes
+CREDENTIAL_INDEXES = {
+    'users_auth_user_username_lower_idx': 'username',
+    'users_auth_user_email_lower_idx': 'email',
+}
+
+
+def _concurrently(schema_editor):
+    # Postgres can build and drop indexes without blocking writes (outside a transaction)
+    return 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+
+
+def create_credential_indexes(apps, schema_editor):
+    # Match the LOWER(...) expressions users.authentication.UsernameOrEmailBackend filters on
+    for name, column in CREDENTIAL_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX {_concurrently(schema_editor)}{schema_editor.quote_name(name)} '
+            f'ON auth_user (LOWER({schema_editor.quote_name(column)}))'
+        )
+
+
+def drop_credential_indexes(apps, schema_editor):
+    for name in CREDENTIAL_INDEXES:
+        schema_editor.execute(f'DROP INDEX {_concurrently(schema_editor)}{schema_editor.quote_name(name)}')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0006_claims_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_credential_indexes, drop_credential_indexes),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 03:23
+
+from django.db import migrations, models
+
+
+def mark_existing_profile_picture_pending(apps, schema_editor):
+    # Existing uploads get renditions from `manage.py process_media`
+    Profile = apps.get_model('users', 'Profile')
+    Profile.objects.exclude(profile_picture__isnull=True).exclude(profile_picture='').update(profile_picture_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_credential_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='profile_picture_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='profile_picture_status',
+            field=models.CharField(choices=[('none', 'No image'), ('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', max_length=10),
+        ),
+        migrations.RunPython(mark_existing_profile_picture_pending, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, router
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from social_media_api.media import MediaStatus
 
 
 # ============ Profile Model =============
@@ -9,6 +12,9 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(blank=True, null=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    # Resized WebP copies of `profile_picture`, built by social_media_api.media.media_processor
+    profile_picture_status = models.CharField(max_length=10, choices=MediaStatus.choices, default=MediaStatus.NONE)
+    profile_picture_renditions = models.JSONField(default=dict, blank=True)
 
     class Meta:
         indexes = [
@@ -21,18 +27,63 @@ class Profile(models.Model):
         return f'{self.user.username} Profile'
 
 
+# ============ Claims User =============
+class ClaimsUser(User):
+    """A User built from access-token claims instead of a query (see users.authentication).
+
+    Only id, username and is_active are set. Reading any other field loads the
+    rest of the row in one query, the first time it is needed.
+    """
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, user_id, username, is_active):
+        return cls.from_db(router.db_for_read(User), ['id', 'username', 'is_active'], [user_id, username, is_active])
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # A deferred field is loaded on its own by default; load them all together instead
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+
 # ============ Follow Model =============
 class Follow(models.Model):
-    follower = models.ForeignKey(User, related_name='followed_by', on_delete=models.CASCADE)
-    following = models.ForeignKey(User, related_name='follows', on_delete=models.CASCADE)
+    # user.following / user.followers are the user's outgoing / incoming edges.
+    # No single-column FK indexes: (follower, following) and (following, -timestamp, -id) lead with them.
+    follower = models.ForeignKey(User, related_name='following', on_delete=models.CASCADE, db_index=False)
+    following = models.ForeignKey(User, related_name='followers', on_delete=models.CASCADE, db_index=False)
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('follower', 'following')  # Prevent duplicate follow relationships
         indexes = [
-            models.Index(fields=['follower']),
-            models.Index(fields=['following']),
+            # The follower/following lists order by (-timestamp, -id) in page and cursor mode alike
+            models.Index(fields=['follower', '-timestamp', '-id'], name='users_follow_follower_ts_idx'),
+            models.Index(fields=['following', '-timestamp', '-id'], name='users_follow_following_ts_idx'),
         ]
 
     def __str__(self):
         return f"{self.follower.username} follows {self.following.username}"
+
+
+# ============ Follow Suggestion Model =============
+class FollowSuggestion(models.Model):
+    """A precomputed "who to follow" candidate, written by users.recommendations."""
+    user = models.ForeignKey(User, related_name='follow_suggestions', on_delete=models.CASCADE)
+    suggested = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    # How many of the people `user` follows already follow `suggested`
+    score = models.PositiveIntegerField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('user', 'suggested')
+        indexes = [
+            models.Index(fields=['user', '-score', 'suggested'], name='users_suggestion_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested.username} for {self.user.username} ({self.score})"
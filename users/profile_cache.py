@@ -0,0 +1,44 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+# ============ Profile versions =============
+# An opaque per-user token that changes whenever anything a profile response shows
+# may have changed (profile fields, username, follow edges). Public profile ETags are
+# built from it, so a revalidation costs a username lookup and one cache read.
+# Bumps only reach other workers through a shared cache: with a per-process one they would
+# keep answering 304 for a changed profile, so startup refuses that when there are several.
+
+def _cache():
+    return caches[getattr(settings, 'PROFILE_VERSION_CACHE_ALIAS', 'default')]
+
+
+def _version_key(user_id):
+    return f'profile:{user_id}:version'
+
+
+def profile_version(user_id):
+    key = _version_key(user_id)
+    version = _cache().get(key)
+    if version is None:
+        # add() so concurrent first readers agree on one token
+        _cache().add(key, uuid.uuid4().hex, getattr(settings, 'PROFILE_VERSION_TIMEOUT', 86400))
+        version = _cache().get(key)
+    return version
+
+
+def bump_profile_versions(user_ids):
+    """Invalidate the profiles of `user_ids` now and again once the current transaction commits."""
+    user_ids = list(user_ids)
+    _bump(user_ids)
+    transaction.on_commit(lambda: _bump(user_ids))
+
+
+def _bump(user_ids):
+    _cache().set_many(
+        {_version_key(user_id): uuid.uuid4().hex for user_id in user_ids},
+        getattr(settings, 'PROFILE_VERSION_TIMEOUT', 86400),
+    )
@@ -0,0 +1,114 @@
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Follow, FollowSuggestion
+
+
+# ============ Recommendation settings =============
+
+def suggestions_per_user():
+    return getattr(settings, 'RECOMMENDATIONS_PER_USER', 50)
+
+
+def recommendation_batch_size():
+    return getattr(settings, 'RECOMMENDATIONS_BATCH_SIZE', 1000)
+
+
+# ============ Adjacency =============
+
+def build_adjacency(edges):
+    """(sorted user ids, CSR adjacency) for an (n, 2) array of (follower id, following id) edges.
+
+    Row/column i stands for ids[i]; A[i, j] == 1 when ids[i] follows ids[j].
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    ids, index = np.unique(edges, return_inverse=True)
+    index = index.reshape(-1, 2)
+    adjacency = sparse.csr_matrix(
+        (np.ones(len(index), dtype=np.int32), (index[:, 0], index[:, 1])),
+        shape=(len(ids), len(ids)),
+    )
+    # Duplicate edges would otherwise count twice
+    adjacency.sum_duplicates()
+    adjacency.data[:] = 1
+    return ids, adjacency
+
+
+def load_adjacency():
+    """The whole Follow table as an adjacency matrix, streamed in one pass without model instances."""
+    pairs = Follow.objects.order_by().values_list('follower_id', 'following_id').iterator(chunk_size=20000)
+    return build_adjacency(np.fromiter(chain.from_iterable(pairs), dtype=np.int64))
+
+
+# ============ Scoring =============
+
+def score_rows(adjacency, rows, per_user):
+    """Top `per_user` friends-of-friends of each user in `rows` (row indices).
+
+    A candidate's score is the number of people the user follows who follow
+    the candidate: row r of A[rows] @ A. The user and anyone they already
+    follow are dropped. Returns aligned arrays (row index, candidate index,
+    score), best first within each row, ties broken by the lower index.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    followed = adjacency[rows]
+    paths = (followed @ adjacency).tocsr()
+
+    itself = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (np.arange(len(rows)), rows)), shape=followed.shape)
+    paths = paths - paths.multiply((followed + itself) > 0)
+    paths.eliminate_zeros()
+    paths.sort_indices()
+
+    # Sort every entry by (row, -score, candidate); an entry's rank is its offset from the row start
+    row_of = np.repeat(np.arange(len(rows)), np.diff(paths.indptr))
+    order = np.lexsort((paths.indices, -paths.data, row_of))
+    rank = np.arange(len(order)) - paths.indptr[row_of[order]]
+    keep = order[rank < per_user]
+    return rows[row_of[keep]], paths.indices[keep], paths.data[keep]
+
+
+# ============ Persistence =============
+
+def compute_suggestions(user_ids=None, per_user=None, batch_size=None):
+    """Recompute FollowSuggestion rows for `user_ids` (default: everyone in the graph).
+
+    The adjacency is loaded once; users are then scored `batch_size` at a time
+    and each batch replaces its users' rows in one transaction, so readers
+    never see a half-written list. Returns the number of rows written.
+    """
+    per_user = per_user or suggestions_per_user()
+    batch_size = batch_size or recommendation_batch_size()
+    ids, adjacency = load_adjacency()
+
+    if user_ids is None:
+        rows = np.arange(len(ids))
+    else:
+        wanted = np.unique(np.asarray(list(user_ids), dtype=np.int64))
+        # Users outside the graph have nothing to suggest; just clear them
+        FollowSuggestion.objects.filter(user_id__in=wanted[~np.isin(wanted, ids)].tolist()).delete()
+        rows = np.searchsorted(ids, wanted[np.isin(wanted, ids)])
+
+    written = 0
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        users, candidates, scores = score_rows(adjacency, batch, per_user)
+        now = timezone.now()
+        suggestions = [
+            FollowSuggestion(user_id=user_id, suggested_id=suggested_id, score=score, computed_at=now)
+            for user_id, suggested_id, score in zip(ids[users].tolist(), ids[candidates].tolist(), scores.tolist())
+        ]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=ids[batch].tolist()).delete()
+            FollowSuggestion.objects.bulk_create(suggestions, batch_size=5000)
+        written += len(suggestions)
+    return written
+
+
+def recently_changed_users(since):
+    """Users who followed someone after `since`; the candidates for an incremental run."""
+    return Follow.objects.filter(timestamp__gte=since).values_list('follower_id', flat=True).distinct()
@@ -1,8 +1,11 @@
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import serializers
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from .models import Profile, Follow
+from .tokens import ClaimsRefreshToken
+from social_media_api.media import RenditionsField
 
 
 # ============ User Serializer =============
@@ -55,7 +58,7 @@ class LoginSerializer(serializers.Serializer):
         if user is None:
             raise serializers.ValidationError({"error": "Invalid credentials. Please check your email and password."})
 
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         return {
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -63,41 +66,87 @@ class LoginSerializer(serializers.Serializer):
 
 
 # ============ Profile Serializer =============
+PROFILE_SAMPLE_DEFAULT = 10
+PROFILE_SAMPLE_MAX = 50
+
+
+def profile_sample_limit(request):
+    """`?limit=` for the follower/following samples, bounded to PROFILE_SAMPLE_MAX."""
+    raw = request.query_params.get('limit', PROFILE_SAMPLE_DEFAULT) if request else PROFILE_SAMPLE_DEFAULT
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        raise serializers.ValidationError({'limit': 'Must be an integer.'})
+    return min(max(limit, 0), PROFILE_SAMPLE_MAX)
+
+
+def _edge_count(column):
+    # Correlated COUNT subquery; joining both edge sets in one query would multiply rows
+    edges = Follow.objects.filter(**{column: OuterRef('user_id')}).order_by().values(column).annotate(total=Count('id'))
+    return Coalesce(Subquery(edges.values('total')), 0)
+
+
+def profile_queryset(limit=PROFILE_SAMPLE_DEFAULT):
+    """Profiles ready for ProfileSerializer in three queries, whatever the follower count.
+
+    Counts are annotated, and the newest `limit` followers and followings are
+    prefetched (one windowed query each) with only the columns that are shown.
+    """
+    newest_first = ('-timestamp', '-id')
+    return (
+        Profile.objects.select_related('user')
+        .only('id', 'bio', 'profile_picture', 'profile_picture_status', 'profile_picture_renditions',
+              'user__id', 'user__username', 'user__email')
+        .annotate(follower_count=_edge_count('following'), following_count=_edge_count('follower'))
+        .prefetch_related(
+            Prefetch(
+                'user__followers',
+                queryset=Follow.objects.select_related('follower').only('following', 'follower__username').order_by(*newest_first)[:limit],
+                to_attr='follower_sample',
+            ),
+            Prefetch(
+                'user__following',
+                queryset=Follow.objects.select_related('following').only('follower', 'following__username').order_by(*newest_first)[:limit],
+                to_attr='following_sample',
+            ),
+        )
+    )
+
+
 class ProfileSerializer(serializers.ModelSerializer):
+    """Serializes profiles fetched with `profile_queryset`; it reads their annotations and samples."""
     username = serializers.CharField(source='user.username')
     email = serializers.EmailField(source='user.email')
 
     bio = serializers.CharField(default='', allow_blank=True)
     profile_picture = serializers.ImageField(default=None)
+    profile_picture_status = serializers.CharField(read_only=True)
+    # {size name: URL} once profile_picture_status is 'ready'
+    profile_picture_renditions = RenditionsField('profile_picture')
 
-    follower_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
+    follower_count = serializers.IntegerField(read_only=True)
+    following_count = serializers.IntegerField(read_only=True)
 
     followers = serializers.SerializerMethodField()
     following = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
-        fields = ['username', 'email', 'bio', 'profile_picture', 
+        fields = ['username', 'email', 'bio', 'profile_picture', 'profile_picture_status', 'profile_picture_renditions',
                   'follower_count', 'following_count', 'followers', 'following']
 
-    def get_follower_count(self, obj):
-        return Follow.objects.filter(following=obj.user).count()
-
-    def get_following_count(self, obj):
-        return Follow.objects.filter(follower=obj.user).count()
-
     def get_followers(self, obj):
-        request = self.context.get('request')
-        limit = int(request.query_params.get('limit', 10)) if request else 10
-        followers = Follow.objects.filter(following=obj.user)[:limit]
-        return [follower.follower.username for follower in followers]
+        return [follow.follower.username for follow in obj.user.follower_sample]
 
     def get_following(self, obj):
-        request = self.context.get('request')
-        limit = int(request.query_params.get('limit', 10)) if request else 10
-        following = Follow.objects.filter(follower=obj.user)[:limit]
-        return [followed.following.username for followed in following]
+        return [follow.following.username for follow in obj.user.following_sample]
+
+
+class PublicProfileSerializer(ProfileSerializer):
+    # Anyone can read it, so no email
+    class Meta(ProfileSerializer.Meta):
+        fields = ['username', 'bio', 'profile_picture', 'profile_picture_status', 'profile_picture_renditions',
+                  'follower_count', 'following_count', 'followers', 'following']
 
 
 # ============ Follow Serializer =============
@@ -1,13 +1,44 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
+from social_media_api.media import renditions_ready
+from .models import ClaimsUser, Profile, Follow
+from .graph import follow_graph
+from .profile_cache import bump_profile_versions
+from .tokens import revoke_user_tokens
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
 
+# request.user is a ClaimsUser under JWT auth; its signals carry the proxy as sender
 @receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
 def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
+def revoke_inactive_user_tokens(sender, instance, **kwargs):
+    # Access tokens carry is_active, so disabling an account has to revoke them
+    if not instance.is_active:
+        revoke_user_tokens(instance.pk)
+
+@receiver(pre_delete, sender=User)
+@receiver(pre_delete, sender=ClaimsUser)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(renditions_ready, sender=Profile)
+def invalidate_profile(sender, instance, **kwargs):
+    bump_profile_versions([instance.user_id])
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_graph(sender, instance, **kwargs):
+    follow_graph.invalidate(instance.follower_id, instance.following_id)
+    # Both profiles show the edge in their counts and samples
+    bump_profile_versions([instance.follower_id, instance.following_id])
@@ -1,3 +1,377 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from posts.models import Post, TimelineEntry
+from social_media_api.querybudget import QueryBudgetTestMixin
+from .authentication import ClaimsJWTAuthentication
+from .models import ClaimsUser, Follow, FollowSuggestion
+from .views import (
+    RegisterUserView, LoginView, AutoRefreshView, UserProfileView, PublicProfileView, FollowUserView, UnfollowUserView,
+    UserFollowersListView, UserFollowingListView, MutualFollowsView, FollowedByFollowingView,
+    FollowSuggestionsView, BulkFollowView,
+)
+from .serializers import PROFILE_SAMPLE_MAX, profile_queryset, profile_sample_limit
+from .recommendations import build_adjacency, compute_suggestions, score_rows
+from .graph import IdSet, follow_graph
+from .tokens import ClaimsRefreshToken, revocations
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UsersQueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+    # Every list is seeded with several rows so an N+1 shows up as a repeated query
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', email='reader@example.com', password='pass')
+        self.others = [User.objects.create_user(f'user{i}', password='pass') for i in range(5)]
+        for other in self.others:
+            Follow.objects.create(follower=self.user, following=other)
+            Follow.objects.create(follower=other, following=self.user)
+        self.newcomer = User.objects.create_user('newcomer', password='pass')
+        for i in range(3):
+            Post.objects.create(author=self.newcomer, content=f'post {i}')
+        self.client.force_authenticate(self.user)
+
+    def test_register(self):
+        self.client.force_authenticate(None)
+        with self.assertWithinQueryBudget(RegisterUserView, 'post'):
+            response = self.client.post('/api/users/register/', {
+                'username': 'fresh', 'email': 'fresh@example.com', 'password': 'pass',
+            })
+        self.assertEqual(response.status_code, 201)
+
+    def test_login(self):
+        self.client.force_authenticate(None)
+        with self.assertWithinQueryBudget(LoginView, 'post'):
+            response = self.client.post('/api/users/login/', {'username_or_email': 'reader', 'password': 'pass'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile(self):
+        with self.assertWithinQueryBudget(UserProfileView, 'get'):
+            response = self.client.get('/api/users/me/profile/')
+        self.assertEqual(response.data['follower_count'], 5)
+        self.assertEqual(len(response.data['followers']), 5)
+
+    def test_profile_queryset_counts_follow_edges(self):
+        Follow.objects.create(follower=self.user, following=self.newcomer)
+        profile = profile_queryset().get(user=self.newcomer)
+        self.assertEqual((profile.follower_count, profile.following_count), (1, 0))
+
+    def test_profile_queries_do_not_grow_with_followers(self):
+        with self.assertNumQueries(3):
+            self.client.get('/api/users/me/profile/')
+        for i in range(20):
+            Follow.objects.create(follower=User.objects.create_user(f'fan{i}', password='pass'), following=self.user)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/users/me/profile/', {'limit': 1000})
+        self.assertEqual(response.data['follower_count'], 25)
+        self.assertEqual(len(response.data['followers']), 25)
+        self.assertEqual(response.data['followers'][0], 'fan19')
+        request = Request(APIRequestFactory().get('/', {'limit': 1000}))
+        self.assertEqual(profile_sample_limit(request), PROFILE_SAMPLE_MAX)
+        self.assertEqual(self.client.get('/api/users/me/profile/', {'limit': 'many'}).status_code, 400)
+
+    def test_public_profile(self):
+        self.client.force_authenticate(None)
+        with self.assertWithinQueryBudget(PublicProfileView):
+            response = self.client.get('/api/users/reader/profile/', {'limit': 2})
+        self.assertNotIn('email', response.data)
+        self.assertEqual(response.data['following_count'], 5)
+        self.assertEqual(len(response.data['following']), 2)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/reader/profile/', {'limit': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # A new follower changes the profile, so the old ETag no longer matches
+        Follow.objects.create(follower=self.newcomer, following=self.user)
+        response = self.client.get('/api/users/reader/profile/', {'limit': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['follower_count'], 6)
+        self.assertEqual(self.client.get('/api/users/nobody/profile/').status_code, 404)
+
+    def test_profile_update(self):
+        with self.assertWithinQueryBudget(UserProfileView, 'patch'):
+            response = self.client.patch('/api/users/me/profile/', {'bio': 'hello'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_and_unfollow(self):
+        with self.assertWithinQueryBudget(FollowUserView, 'post'):
+            response = self.client.post('/api/users/follow/newcomer/')
+        self.assertEqual(response.status_code, 201)
+        with self.assertWithinQueryBudget(UnfollowUserView, 'delete'):
+            response = self.client.delete('/api/users/unfollow/newcomer/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_lists(self):
+        with self.assertWithinQueryBudget(UserFollowersListView):
+            response = self.client.get('/api/users/followers/reader/')
+        self.assertEqual(response.data['count'], 5)
+        with self.assertWithinQueryBudget(UserFollowingListView):
+            response = self.client.get('/api/users/following/reader/', {'cursor': ''})
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_follow_list_cursor_round_trip(self):
+        newest_first = [other.username for other in reversed(self.others)]
+        page_mode = self.client.get('/api/users/followers/reader/').data['results']
+        self.assertEqual([row['username'] for row in page_mode], newest_first)
+
+        usernames = []
+        response = self.client.get('/api/users/followers/reader/', {'cursor': '', 'page_size': 2})
+        while True:
+            usernames += [row['username'] for row in response.data['results']]
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(usernames, newest_first)
+
+        response = self.client.get('/api/users/following/reader/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_follow(self):
+        fresh = User.objects.create_user('fresh', password='pass')
+        with self.assertWithinQueryBudget(BulkFollowView, 'post'):
+            response = self.client.post('/api/users/bulk/follow/', {
+                'usernames': ['newcomer', 'user0', 'reader', 'ghost', 'fresh', 'newcomer'],
+            }, format='json')
+        self.assertEqual([(item['username'], item['status']) for item in response.data['results']], [
+            ('newcomer', 'followed'), ('user0', 'already_following'), ('reader', 'self'),
+            ('ghost', 'not_found'), ('fresh', 'followed'),
+        ])
+        self.assertTrue(follow_graph.is_following(self.user.id, fresh.id))
+        self.assertEqual(follow_graph.follower_counts([self.newcomer.id])[self.newcomer.id], 1)
+        # The newcomer's posts were backfilled into the timeline
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user, author=self.newcomer).count(), 3)
+
+    def test_mutual_lists(self):
+        with self.assertWithinQueryBudget(MutualFollowsView):
+            response = self.client.get('/api/users/mutuals/reader/')
+        self.assertEqual(response.data['count'], 5)
+        with self.assertWithinQueryBudget(FollowedByFollowingView):
+            response = self.client.get('/api/users/followed-by/user0/')
+        self.assertEqual(response.data, {'count': 0, 'results': []})
+
+    def test_suggestions(self):
+        for other in self.others:
+            FollowSuggestion.objects.create(user=self.user, suggested=other, score=1)
+        FollowSuggestion.objects.create(user=self.user, suggested=self.newcomer, score=2)
+        with self.assertWithinQueryBudget(FollowSuggestionsView):
+            response = self.client.get('/api/users/suggestions/')
+        # Users already followed are skipped even if their rows are stale
+        self.assertEqual(response.data, [{'username': 'newcomer', 'mutual_count': 2}])
+
+
+class FollowGraphTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob, self.carol, self.dave = [
+            User.objects.create_user(name, password='pass') for name in ('alice', 'bob', 'carol', 'dave')
+        ]
+        for follower, following in [(self.alice, self.bob), (self.bob, self.alice), (self.alice, self.carol),
+                                    (self.carol, self.dave), (self.bob, self.dave)]:
+            Follow.objects.create(follower=follower, following=following)
+
+    def test_id_set_operations(self):
+        left, right = IdSet([5, 1, 3, 9]), IdSet([3, 4, 9])
+        self.assertIn(9, left)
+        self.assertNotIn(4, left)
+        self.assertEqual(list(left & right), [3, 9])
+        self.assertEqual(list(left - right), [1, 5])
+        self.assertEqual(IdSet.from_bytes(left.to_bytes()), left)
+
+    def test_sets_are_cached(self):
+        self.assertEqual(list(follow_graph.following(self.alice.id)), sorted([self.bob.id, self.carol.id]))
+        with self.assertNumQueries(0):
+            self.assertTrue(follow_graph.is_following(self.alice.id, self.bob.id))
+            self.assertEqual(follow_graph.following_counts([self.alice.id]), {self.alice.id: 2})
+
+    def test_counts_fill_misses_with_one_query(self):
+        with self.assertNumQueries(1):
+            counts = follow_graph.follower_counts([self.alice.id, self.dave.id, self.carol.id])
+        self.assertEqual(counts, {self.alice.id: 1, self.dave.id: 2, self.carol.id: 1})
+
+    def test_set_operations(self):
+        self.assertEqual(list(follow_graph.mutuals(self.alice.id)), [self.bob.id])
+        # alice follows bob and carol; both of them follow dave
+        self.assertEqual(list(follow_graph.followed_by_following(self.alice.id, self.dave.id)),
+                         sorted([self.bob.id, self.carol.id]))
+
+    def test_follow_and_unfollow_invalidate(self):
+        self.client.force_authenticate(self.dave)
+        self.assertEqual(follow_graph.follower_counts([self.alice.id])[self.alice.id], 1)
+        self.assertFalse(follow_graph.is_following(self.dave.id, self.alice.id))
+
+        self.client.post('/api/users/follow/alice/')
+        self.assertTrue(follow_graph.is_following(self.dave.id, self.alice.id))
+        self.assertEqual(follow_graph.follower_counts([self.alice.id])[self.alice.id], 2)
+        self.assertEqual(self.client.get('/api/users/followed-by/bob/').data['results'], ['alice'])
+
+        self.client.delete('/api/users/unfollow/alice/')
+        self.assertFalse(follow_graph.is_following(self.dave.id, self.alice.id))
+        self.assertEqual(follow_graph.follower_counts([self.alice.id])[self.alice.id], 1)
+        response = self.client.delete('/api/users/unfollow/alice/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_follow_and_unfollow_check_the_table_not_the_cache(self):
+        # As another worker's stale copy of the graph would have it
+        following_key = follow_graph._ids_key(self.dave.id, 'following')
+        self.client.force_authenticate(self.dave)
+        follow_graph.cache.set(following_key, IdSet([self.alice.id]).to_bytes())
+        self.assertEqual(self.client.post('/api/users/follow/alice/').status_code, 201)
+        follow_graph.cache.set(following_key, IdSet().to_bytes())
+        self.assertEqual(self.client.delete('/api/users/unfollow/alice/').status_code, 200)
+        self.assertFalse(Follow.objects.filter(follower=self.dave, following=self.alice).exists())
+
+
+class FollowSuggestionTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.users = {name: User.objects.create_user(name, password='pass') for name in 'abcdef'}
+        # a follows b and c; b and c both follow d, c also follows e; e follows a
+        for follower, following in ['ab', 'ac', 'bd', 'cd', 'ce', 'ea']:
+            Follow.objects.create(follower=self.users[follower], following=self.users[following])
+
+    def test_score_rows_ranks_by_mutual_connections(self):
+        ids, adjacency = build_adjacency([(1, 2), (1, 3), (2, 4), (3, 4), (3, 5), (5, 1), (2, 1)])
+        users, candidates, scores = score_rows(adjacency, [0], per_user=10)
+        # 1 follows 2 and 3: 4 is followed by both, 5 by one; 1 itself is excluded
+        self.assertEqual(ids[candidates].tolist(), [4, 5])
+        self.assertEqual(scores.tolist(), [2, 1])
+        self.assertEqual(ids[users].tolist(), [1, 1])
+        _, candidates, _ = score_rows(adjacency, [0], per_user=1)
+        self.assertEqual(ids[candidates].tolist(), [4])
+
+    def test_compute_and_serve(self):
+        written = compute_suggestions(batch_size=2)
+        self.assertEqual(written, FollowSuggestion.objects.count())
+        self.client.force_authenticate(self.users['a'])
+        response = self.client.get('/api/users/suggestions/')
+        self.assertEqual(response.data, [{'username': 'd', 'mutual_count': 2}, {'username': 'e', 'mutual_count': 1}])
+
+        # Recomputing one user replaces only their rows
+        Follow.objects.create(follower=self.users['a'], following=self.users['d'])
+        compute_suggestions([self.users['a'].id, self.users['f'].id])
+        self.assertEqual(
+            list(FollowSuggestion.objects.filter(user=self.users['a']).values_list('suggested__username', flat=True)),
+            ['e'],
+        )
+        self.assertTrue(FollowSuggestion.objects.filter(user=self.users['e']).exists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ClaimsJWTAuthenticationTests(QueryBudgetTestMixin, APITestCase):
+
+    def setUp(self):
+        revocations.clear()
+        self.user = User.objects.create_user('jwt', email='jwt@example.com', password='pass')
+        self.refresh = ClaimsRefreshToken.for_user(self.user)
+        self.authentication = ClaimsJWTAuthentication()
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.authentication.authenticate(Request(request))
+
+    def test_user_comes_from_claims(self):
+        access = self.refresh.access_token
+        # The first request checks the blacklist; later ones are answered from memory
+        with self.assertNumQueries(1):
+            self.authenticate(access)
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(access)
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual((user.pk, user.username, user.is_authenticated), (self.user.pk, 'jwt', True))
+        self.assertEqual(user, self.user)
+        # The rest of the row loads once, on first use
+        with self.assertNumQueries(1):
+            self.assertEqual((user.email, user.is_staff), ('jwt@example.com', False))
+
+    def test_tokens_without_claims_load_the_user(self):
+        user, _ = self.authenticate(RefreshToken.for_user(self.user).access_token)
+        self.assertNotIsInstance(user, ClaimsUser)
+        self.assertEqual(user, self.user)
+
+    def test_logout_revokes_access_tokens(self):
+        access = self.refresh.access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get('/api/users/me/profile/').status_code, 200)
+        response = self.client.post('/api/users/logout/', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/users/me/profile/').status_code, 401)
+
+        # Other workers find out from the blacklist once their cached answer expires
+        revocations.clear()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(access)
+
+    def test_deactivating_revokes_access_tokens(self):
+        access = self.refresh.access_token
+        self.authenticate(access)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(access)
+
+    def test_refresh_picks_up_a_new_username(self):
+        User.objects.filter(pk=self.user.pk).update(username='renamed')
+        with self.assertWithinQueryBudget(AutoRefreshView, 'post'):
+            response = self.client.post('/api/users/token/refresh/', {'refresh': str(self.refresh)})
+        user, _ = self.authenticate(response.data['access'])
+        self.assertEqual(user.username, 'renamed')
+
+
+@override_settings(PASSWORD_HASHERS=['users.hashers.ConfigurablePBKDF2PasswordHasher'], PASSWORD_HASH_ITERATIONS=1000)
+class CredentialLoginTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('Carol', email='Carol@Example.com', password='pass')
+
+    def test_username_or_email_in_any_case(self):
+        for identifier in ('Carol', 'carol', 'CAROL@example.COM'):
+            self.assertEqual(authenticate(username_or_email=identifier, password='pass'), self.user)
+        self.assertEqual(authenticate(username='carol', password='pass'), self.user)
+        self.assertIsNone(authenticate(username_or_email='carol', password='wrong'))
+
+    def test_exact_username_wins(self):
+        other = User.objects.create_user('carol', password='other')
+        with self.assertNumQueries(1):
+            self.assertEqual(authenticate(username_or_email='carol', password='other'), other)
+        self.assertEqual(authenticate(username_or_email='Carol', password='pass'), self.user)
+
+    def test_unknown_user_still_hashes(self):
+        with mock.patch.object(User, 'set_password') as set_password:
+            self.assertIsNone(authenticate(username_or_email='nobody', password='pass'))
+        set_password.assert_called_once_with('pass')
+
+    def test_rehash_when_iterations_change(self):
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(authenticate(username_or_email='carol', password='pass'), self.user)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+
+class SharedCacheConfigurationTests(SimpleTestCase):
+
+    def test_graph_and_profile_caches_must_be_shared_by_several_workers(self):
+        caches = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'social-media-api'},
+            'shared': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379'},
+        }
+        config = apps.get_app_config('users')
+        with override_settings(WEB_CONCURRENCY=2, CACHES=caches, FOLLOW_GRAPH_CACHE_ALIAS='shared'):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'PROFILE_VERSION_CACHE_ALIAS'):
+                config.ready()
+            with override_settings(PROFILE_VERSION_CACHE_ALIAS='shared'):
+                config.ready()
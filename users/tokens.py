@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+# Claims users.authentication.ClaimsJWTAuthentication builds request.user from
+USERNAME_CLAIM = 'username'
+IS_ACTIVE_CLAIM = 'is_active'
+# jti of the refresh token an access token was minted from
+SESSION_CLAIM = 'sid'
+
+
+# ============ Tokens =============
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token whose access tokens identify the user without a query.
+
+    The username and is_active claims are copied into every access token, and
+    each access token names its refresh token in `sid`. Logging out blacklists
+    that refresh token, which revokes the access tokens minted from it.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[USERNAME_CLAIM] = user.username
+        token[IS_ACTIVE_CLAIM] = user.is_active
+        return token
+
+    def refresh_claims(self):
+        """Reload the user claims from the database before minting a new access token.
+
+        Refresh tokens live for days. Without this, a renamed user's access
+        tokens would keep the old username until the next login.
+        """
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: self[api_settings.USER_ID_CLAIM]}).only(
+            'username', 'is_active').first()
+        if user is None or not user.is_active:
+            raise TokenError(_("User is inactive or deleted"))
+        self[USERNAME_CLAIM] = user.username
+        self[IS_ACTIVE_CLAIM] = user.is_active
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        access[SESSION_CLAIM] = self[api_settings.JTI_CLAIM]
+        return access
+
+
+# ============ Revocation cache =============
+
+def revocation_cache_ttl():
+    return getattr(settings, 'JWT_REVOCATION_CACHE_TTL', 30)
+
+
+def revocation_cache_size():
+    return getattr(settings, 'JWT_REVOCATION_CACHE_SIZE', 10000)
+
+
+class RevocationCache:
+    """Per-process cache of whether a refresh token (by jti) is blacklisted.
+
+    The first check of a session costs one query. Later checks are answered
+    from memory. A blacklisted token never comes back, so a "revoked" answer
+    is kept. A "not revoked" answer expires after JWT_REVOCATION_CACHE_TTL
+    seconds. A logout on another worker therefore takes effect here within
+    that time. The least recently used entries are evicted beyond
+    JWT_REVOCATION_CACHE_SIZE.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(jti)
+            if entry is not None:
+                revoked, expires_at = entry
+                if revoked or expires_at > now:
+                    self._entries.move_to_end(jti)
+                    return revoked
+
+        revoked = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        self._remember(jti, revoked, now)
+        return revoked
+
+    def revoke(self, jti):
+        # Called on logout so this worker stops accepting the session at once
+        self._remember(jti, True, time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, jti, revoked, now):
+        with self._lock:
+            self._entries[jti] = (revoked, now + revocation_cache_ttl())
+            self._entries.move_to_end(jti)
+            while len(self._entries) > revocation_cache_size():
+                self._entries.popitem(last=False)
+
+
+revocations = RevocationCache()
+
+
+def revoke_user_tokens(user_id):
+    """Blacklist every outstanding refresh token of a user, e.g. when the account is disabled or deleted."""
+    tokens = list(OutstandingToken.objects.filter(user_id=user_id, blacklistedtoken__isnull=True))
+    BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens], ignore_conflicts=True)
+    for token in tokens:
+        revocations.revoke(token.jti)
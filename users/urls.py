@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import RegisterUserView, LoginView, AutoRefreshView, LogoutView, UserProfileView, FollowUserView, UnfollowUserView, UserFollowersListView, UserFollowingListView
+from .views import RegisterUserView, LoginView, AutoRefreshView, LogoutView, UserProfileView, PublicProfileView, FollowUserView, UnfollowUserView, BulkFollowView, UserFollowersListView, UserFollowingListView, MutualFollowsView, FollowedByFollowingView, FollowSuggestionsView
 
 
 urlpatterns = [
@@ -11,12 +11,19 @@ urlpatterns = [
 
     # User Profile
     path('me/profile/', UserProfileView.as_view(), name='profile'),
+    path('<str:username>/profile/', PublicProfileView.as_view(), name='public_profile'),
 
     # Follow/Unfollow
     path('follow/<str:username>/', FollowUserView.as_view(), name='follow_user'),
     path('unfollow/<str:username>/', UnfollowUserView.as_view(), name='unfollow_user'),
+    path('bulk/follow/', BulkFollowView.as_view(), name='bulk_follow'),
 
     # Followers/Following
     path('followers/<str:username>/', UserFollowersListView.as_view(), name='user_followers'),
     path('following/<str:username>/', UserFollowingListView.as_view(), name='user_following'),
+    path('mutuals/<str:username>/', MutualFollowsView.as_view(), name='mutual_follows'),
+    path('followed-by/<str:username>/', FollowedByFollowingView.as_view(), name='followed_by_following'),
+
+    # Who to follow
+    path('suggestions/', FollowSuggestionsView.as_view(), name='follow_suggestions'),
 ]
@@ -4,12 +4,28 @@ from django.core.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.pagination import PageNumberPagination
+from social_media_api.pagination import CursorOrPagePagination
+from social_media_api.throttling import SlidingWindowThrottle
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.views import TokenRefreshView
-from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Profile, Follow
-from .serializers import UserRegistrationSerializer, LoginSerializer, ProfileSerializer
-from django.db.models import Count
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .models import Profile, Follow, FollowSuggestion
+from .serializers import (
+    UserRegistrationSerializer, LoginSerializer, ProfileSerializer, PublicProfileSerializer,
+    profile_queryset, profile_sample_limit,
+)
+from .graph import follow_graph
+from .tokens import ClaimsRefreshToken, revocations
+from .profile_cache import profile_version, bump_profile_versions
+from django.db.models import Q
+from social_media_api.conditional import ConditionalGetMixin, etag_for
+from social_media_api.bulk import BulkItemsMixin
+from social_media_api.media import media_processor
+from django.db import transaction
+from posts.timeline import backfill_timeline, backfill_timeline_from, prune_timeline
+from posts.cache import post_cache
+from posts.models import Post, MediaUpload
+from posts.uploads import claim_upload, completed_upload
 import logging
 import traceback
 
@@ -19,9 +35,17 @@ logger = logging.getLogger(__name__)
 class StandardPagination(PageNumberPagination):
     page_size = 10
 
+
+class FollowPagination(CursorOrPagePagination):
+    # `?cursor=` switches to keyset pagination on (timestamp, id)
+    page_pagination_class = StandardPagination
+
 # ============ Register User View ============
 class RegisterUserView(generics.CreateAPIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'register'
+    query_budget = {'post': 8}
 
     def post(self, request):
         serializer = UserRegistrationSerializer(data=request.data)
@@ -35,6 +59,9 @@ class RegisterUserView(generics.CreateAPIView):
 # ============ Login and Token Views ============
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'login'
+    query_budget = {'post': 3}
 
     def post(self, request):
         try:
@@ -49,7 +76,9 @@ class LoginView(APIView):
             return Response({'error': 'Internal Server Error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class AutoRefreshView(TokenRefreshView):
-    permission_classes = [permissions.IsAuthenticated]
+    # The refresh token is the credential; TokenRefreshView runs no authenticators
+    permission_classes = [permissions.AllowAny]
+    query_budget = {'post': 2}
 
     def post(self, request, *args, **kwargs):
         refresh_token = request.data.get('refresh')
@@ -57,7 +86,8 @@ class AutoRefreshView(TokenRefreshView):
             return Response({"detail": "Refresh token is required."}, status=400)
 
         try:
-            refresh = RefreshToken(refresh_token)
+            refresh = ClaimsRefreshToken(refresh_token)
+            refresh.refresh_claims()
             access_token = str(refresh.access_token)
             return Response({'access': access_token})
         except Exception as e:
@@ -67,12 +97,15 @@ class AutoRefreshView(TokenRefreshView):
 # ============ Logout View ============
 class LogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'post': 4}
 
     def post(self, request, *args, **kwargs):
         try:
             refresh_token = request.data.get("refresh")
-            token = RefreshToken(refresh_token)
+            token = ClaimsRefreshToken(refresh_token)
             token.blacklist()
+            # Access tokens minted from it are rejected by this worker at once, others within the cache TTL
+            revocations.revoke(token[jwt_settings.JTI_CLAIM])
             return Response({"detail": "Successfully logged out."}, status=200)
         except Exception as e:
             logger.error(f"Logout error: {str(e)}\n{traceback.format_exc()}")
@@ -83,12 +116,11 @@ class LogoutView(APIView):
 class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = ProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': 4, 'put': 14, 'patch': 14, 'delete': 6}
 
     def get_queryset(self):
-        return Profile.objects.filter(user=self.request.user).annotate(
-            follower_count=Count('user__followers'),
-            following_count=Count('user__following')
-        )
+        # Counts annotated and samples prefetched: a constant number of queries per profile
+        return profile_queryset(profile_sample_limit(self.request)).filter(user=self.request.user)
 
     def get_object(self):
         try:
@@ -99,7 +131,10 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
             raise Http404("User has no profile.")
 
     def get(self, request, *args, **kwargs):
-        profile = self.get_object()
+        profile = self.get_queryset().first()
+        if profile is None:
+            logger.error(f"Profile not found for user: {request.user.id}")
+            raise Http404("User has no profile.")
         serializer = ProfileSerializer(profile)
         return Response(serializer.data)
 
@@ -112,14 +147,18 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 
         user = profile.user
         data = request.data
-        update_fields = ['username', 'email', 'bio', 'profile_picture']
+        update_fields = ['username', 'email', 'bio', 'profile_picture', 'profile_picture_upload']
 
         if not any(field in data for field in update_fields):
             return Response({"detail": "No fields to update."}, status=status.HTTP_400_BAD_REQUEST)
 
         for field in update_fields:
             if field in data:
-                if field in ['username', 'email']:
+                if field == 'profile_picture_upload':
+                    # A finished resumable upload becomes the picture without copying the file
+                    upload = completed_upload(request.user, data[field], MediaUpload.Target.PROFILE_PICTURE)
+                    profile.profile_picture = claim_upload(upload)
+                elif field in ['username', 'email']:
                     setattr(user, field, data[field])
                     try:
                         user.full_clean()  # Ensures validation for fields like username and email
@@ -130,8 +169,18 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 
         user.save()
         profile.save()
-
-        serializer = self.get_serializer(profile)
+        if 'profile_picture' in data or 'profile_picture_upload' in data:
+            media_processor.schedule(profile, 'profile_picture')
+
+        # Cached post fragments embed the author's username, as do comment lists and the
+        # follow lists and profiles of everyone connected to the user
+        if 'username' in data:
+            post_cache.invalidate(
+                Post.objects.filter(Q(author=user) | Q(comments__user=user)).values_list('id', flat=True).distinct().iterator()
+            )
+            bump_profile_versions(set(follow_graph.followers(user.id)) | set(follow_graph.following(user.id)))
+
+        serializer = self.get_serializer(self.get_queryset().get())
         logger.info(f"User {request.user.id} updated their profile: {data}")
         return Response({
             "detail": "Profile updated successfully.",
@@ -151,10 +200,42 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         return Response({"detail": "Profile deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
     
 
+class PublicProfileView(ConditionalGetMixin, APIView):
+    """Anyone's profile by username, without the email.
+
+    The ETag is built from the user's profile version (users.profile_cache),
+    so a revalidation is answered with 304 after one query.
+    """
+    permission_classes = [permissions.AllowAny]
+    # Username lookup, profile and two sample prefetches, plus the user when a token is sent
+    query_budget = 5
+    cache_control = {'public': True, 'no_cache': True}
+
+    def get_etag(self, request, username, *args, **kwargs):
+        self.limit = profile_sample_limit(request)
+        self.user_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+        if self.user_id is None:
+            return None
+        # Read the version before the data: a change in between only makes the next check miss
+        return etag_for('profile', self.user_id, profile_version(self.user_id), self.limit)
+
+    def get(self, request, username, *args, **kwargs):
+        if self.user_id is None:
+            return Response({"detail": "User not found."}, status=404)
+
+        profile = profile_queryset(self.limit).filter(user_id=self.user_id).first()
+        if profile is None:
+            return Response({"detail": "User has no profile."}, status=404)
+        return Response(PublicProfileSerializer(profile).data)
+
+
 # ============ Follow and Unfollow Views ============
 
 class FollowUserView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'follow'
+    query_budget = {'post': 10}
 
     def post(self, request, username, *args, **kwargs):
         user_to_follow = User.objects.filter(username=username).first()
@@ -164,13 +245,17 @@ class FollowUserView(APIView):
         if user_to_follow == request.user:
             return Response({"detail": "You cannot follow yourself."}, status=400)
 
+        # Whether the edge exists is answered by the Follow table, never the graph cache
         follow, created = Follow.objects.get_or_create(follower=request.user, following=user_to_follow)
         if created:
+            # Bring the followed user's recent posts into the follower's timeline
+            backfill_timeline(request.user, user_to_follow)
             return Response({"detail": f"You are now following {username}."}, status=201)
         return Response({"detail": f"You are already following {username}."}, status=200)
 
 class UnfollowUserView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'delete': 6}
 
     def delete(self, request, username, *args, **kwargs):
         user_to_unfollow = User.objects.filter(username=username).first()
@@ -180,32 +265,152 @@ class UnfollowUserView(APIView):
         follow = Follow.objects.filter(follower=request.user, following=user_to_unfollow).first()
         if follow:
             follow.delete()
+            prune_timeline(request.user, user_to_unfollow)
             return Response({"detail": f"You have unfollowed {username}."}, status=200)
         return Response({"detail": "You are not following this user."}, status=400)
 
+class BulkFollowView(BulkItemsMixin, APIView):
+    """Follow up to BULK_MAX_ITEMS users by username, with one status per username."""
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'follow'
+    bulk_field = 'usernames'
+    bulk_cast = str
+    query_budget = {'post': 12}
+
+    def post(self, request, *args, **kwargs):
+        usernames = self.get_items(request)
+        users = User.objects.only('id', 'username').in_bulk(usernames, field_name='username')
+        following = set(Follow.objects.filter(
+            follower=request.user, following__in=[user.id for user in users.values()],
+        ).values_list('following_id', flat=True))
+        new = [users[name] for name in usernames
+               if name in users and users[name].id != request.user.id and users[name].id not in following]
+
+        with transaction.atomic():
+            Follow.objects.bulk_create([Follow(follower=request.user, following=user) for user in new], ignore_conflicts=True)
+            backfill_timeline_from(request.user, new)
+        # bulk_create skips the Follow signals that keep these current
+        follow_graph.invalidate_many(request.user.id, [user.id for user in new])
+        bump_profile_versions([request.user.id] + [user.id for user in new])
+
+        def status_of(name):
+            if name not in users:
+                return "not_found"
+            if users[name].id == request.user.id:
+                return "self"
+            return "already_following" if users[name].id in following else "followed"
+
+        return Response({"results": [{"username": name, "status": status_of(name)} for name in usernames]})
+
+
 # ============ Follower/Following Count and List Views ============
-class UserFollowersListView(APIView):
+class FollowListView(ConditionalGetMixin, APIView):
+    """Base for the follower/following lists; validated by the listed user's profile version."""
+    query_budget = 4
+
+    def get_etag(self, request, username, *args, **kwargs):
+        self.listed_user = User.objects.filter(username=username).first()
+        if self.listed_user is None:
+            return None
+        # Follows in either direction and renames of listed users bump the version
+        return etag_for('follows', self.listed_user.id, profile_version(self.listed_user.id), request.get_full_path())
+
+
+class UserFollowersListView(FollowListView):
     def get(self, request, username, *args, **kwargs):
-        user = User.objects.filter(username=username).first()
+        user = self.listed_user
         if user is None:
             return Response({"detail": "User not found."}, status=404)
 
-        followers = Follow.objects.filter(following=user).select_related('follower')
-        paginator = StandardPagination()
+        # Newest first in both modes, read from the (following, -timestamp, -id) index
+        followers = Follow.objects.filter(following=user).select_related('follower').order_by('-timestamp', '-id')
+        paginator = FollowPagination()
         paginated_followers = paginator.paginate_queryset(followers, request)
         followers_list = [{"username": follow.follower.username} for follow in paginated_followers]
 
         return paginator.get_paginated_response(followers_list)
 
-class UserFollowingListView(APIView):
+class UserFollowingListView(FollowListView):
     def get(self, request, username, *args, **kwargs):
-        user = User.objects.filter(username=username).first()
+        user = self.listed_user
         if user is None:
             return Response({"detail": "User not found."}, status=404)
 
-        following = Follow.objects.filter(follower=user).select_related('following')
-        paginator = StandardPagination()
+        # Newest first in both modes, read from the (follower, -timestamp, -id) index
+        following = Follow.objects.filter(follower=user).select_related('following').order_by('-timestamp', '-id')
+        paginator = FollowPagination()
         paginated_following = paginator.paginate_queryset(following, request)
         following_list = [{"username": follow.following.username} for follow in paginated_following]
 
         return paginator.get_paginated_response(following_list)
+
+
+# ============ Mutual Follow Views ============
+class FollowGraphListView(APIView):
+    """Base for lists computed from the follow graph: {"count": n, "results": [usernames]}.
+
+    `?limit=` (default 10, at most 100) caps how many usernames are returned.
+    """
+    # Two of these only run when the graph cache is cold
+    query_budget = 4
+
+    def get_ids(self, request, user):
+        raise NotImplementedError
+
+    def get(self, request, username, *args, **kwargs):
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            return Response({"detail": "User not found."}, status=404)
+
+        ids = self.get_ids(request, user)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 0), 100)
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=400)
+        page = list(ids)[:limit]
+        names = dict(User.objects.filter(id__in=page).values_list('id', 'username'))
+        return Response({"count": len(ids), "results": [names[user_id] for user_id in page if user_id in names]})
+
+
+class MutualFollowsView(FollowGraphListView):
+    # Users who follow `username` and are followed back by them
+    def get_ids(self, request, user):
+        return follow_graph.mutuals(user.id)
+
+
+class FollowedByFollowingView(FollowGraphListView):
+    # People the requesting user follows who also follow `username`
+    def get_ids(self, request, user):
+        return follow_graph.followed_by_following(request.user.id, user.id)
+
+
+# ============ Follow Suggestions View ============
+class FollowSuggestionsView(APIView):
+    """The requesting user's precomputed "who to follow" list, best first.
+
+    Rows come from `compute_follow_suggestions`; anyone followed since the last
+    run is skipped using the follow graph. `?limit=` defaults to 10, at most 50.
+    """
+    query_budget = 3
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 0), 50)
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=400)
+
+        following = follow_graph.following(request.user.id)
+        suggestions = (
+            FollowSuggestion.objects.filter(user=request.user)
+            .select_related('suggested').only('score', 'suggested__username')
+            .order_by('-score', 'suggested_id')
+        )
+        results = []
+        # Over-fetch a little so a few stale rows don't shorten the list
+        for suggestion in suggestions[:limit + 10]:
+            if len(results) == limit:
+                break
+            if suggestion.suggested_id not in following:
+                results.append({"username": suggestion.suggested.username, "mutual_count": suggestion.score})
+        return Response(results)